@@ -0,0 +1,228 @@
+"""
+Deterministic alert thresholds from the master schema, evaluated locally.
+
+Each rule reads named metrics (see `READINGS`) and fires an alert shaped
+like the LLM's (`parameter`, `value`, `guideline_ref`) plus `severity`,
+`threshold` and `source: "rule"`. Rules the master schema lists under one
+use case (post-op, oncology, maternal, substance use) only run for
+patients in that use case (see `profile_schema`); SpO₂ and weight gain run
+for everyone. `evaluate_batch` works column-wise so a care-team sweep runs
+every rule over all patients in one pass per rule.
+"""
+import re
+
+SEVERITY_RANK = {'moderate': 1, 'high': 2, 'critical': 3}
+
+# metric -> profile keys / LOINC codes it may appear under in PatientProfile.data
+PROFILE_ALIASES = {
+    'spo2': (('spo2', 'oxygen_saturation'), ('59408-5', '2708-6')),
+    'sbp': (('sbp', 'systolic_bp', 'systolic'), ('8480-6',)),
+    'dbp': (('dbp', 'diastolic_bp', 'diastolic'), ('8462-4',)),
+    'bp': (('bp', 'blood_pressure'), ()),
+    'temp': (('temp', 'temperature', 'body_temperature'), ('8310-5',)),
+    'fetal_hr': (('fetal_hr', 'fhr', 'fetal_heart_rate'), ('56085-1',)),
+    'tac': (('tac', 'transdermal_alcohol', 'transdermal_etoh'), ()),
+    'a1c': (('a1c', 'hba1c', 'hemoglobin_a1c'), ('4548-4',)),
+    'anc': (('anc', 'absolute_neutrophil_count'), ('751-8',)),
+}
+
+# metrics every rule may read; a batch column exists for each
+READINGS = ('spo2', 'sbp', 'dbp', 'temp_c', 'fetal_hr', 'tac', 'a1c', 'anc', 'weight_gain_3d')
+
+
+def _normalize_key(key):
+    return re.sub(r"[^a-z0-9]+", "_", str(key).lower().replace('₂', '2')).strip('_')
+
+
+# READINGS name -> PROFILE_ALIASES metric, where they differ
+_READING_METRICS = {'temp_c': 'temp'}
+
+
+class AlertRule:
+    def __init__(self, parameter, inputs, test, threshold, severity, guideline_ref, value=None,
+                 use_cases=None, aliases=()):
+        self.parameter = parameter
+        self.inputs = inputs
+        self.test = test
+        self.threshold = threshold
+        self.severity = severity
+        self.guideline_ref = guideline_ref
+        self.value = value or (lambda *vals: vals[0])
+        self.use_cases = frozenset(use_cases) if use_cases else None  # None: every patient
+        # parameter names an LLM alert about the same thing may use
+        self.names = {_normalize_key(parameter), *aliases}.union(
+            *(PROFILE_ALIASES.get(_READING_METRICS.get(name, name), ((), ()))[0] for name in inputs))
+
+    def applies(self, use_cases):
+        return self.use_cases is None or not self.use_cases.isdisjoint(use_cases or ())
+
+    def alert(self, vals):
+        return {
+            'parameter': self.parameter,
+            'value': self.value(*vals),
+            'threshold': self.threshold,
+            'severity': self.severity,
+            'guideline_ref': self.guideline_ref,
+            'source': 'rule',
+        }
+
+
+RULES = [
+    AlertRule('SpO₂', ('spo2',), lambda v: v < 88, '< 88%', 'critical', 'GOLD 2023'),
+    AlertRule('Weight gain (3 days)', ('weight_gain_3d',), lambda v: v > 2, '↑ > 2 kg / 3 d',
+              'moderate', 'AHA 2022', value=lambda v: f"+{v:.1f} kg", aliases=('weight_gain', 'weight')),
+    AlertRule('A1c', ('a1c',), lambda v: v > 9, '> 9%', 'moderate', 'ADA 2025', use_cases=('chronic',)),
+    AlertRule('Temperature', ('temp_c',), lambda v: v > 38.5, '> 38.5 °C', 'high', 'ERAS 2025',
+              use_cases=('post_op',)),
+    AlertRule('Systolic BP', ('sbp',), lambda v: v < 90, '< 90 mmHg', 'critical', 'ERAS 2025',
+              use_cases=('post_op',)),
+    AlertRule('Febrile neutropenia', ('temp_c', 'anc'), lambda t, anc: t >= 38 and anc < 500,
+              'Temp ≥ 38 °C + ANC < 500', 'critical', 'ASCO 2024',
+              value=lambda t, anc: f"{t} °C, ANC {anc}", use_cases=('oncology',)),
+    AlertRule('Blood pressure', ('sbp', 'dbp'), lambda s, d: s >= 140 or d >= 90, '≥ 140/90',
+              'high', 'ACOG/AHRQ Maternal RPM 2025', value=lambda s, d: f"{s:g}/{d:g}",
+              use_cases=('maternal',), aliases=('bp',)),
+    AlertRule('Fetal heart rate', ('fetal_hr',), lambda v: v < 110 or v > 160, '< 110 or > 160 bpm',
+              'critical', 'ACOG/AHRQ Maternal RPM 2025', use_cases=('maternal',)),
+    AlertRule('Transdermal alcohol (TAC)', ('tac',), lambda v: v >= 0.02, '≥ 0.02%', 'high',
+              'SOBRsafe EtOH Validation', use_cases=('substance',)),
+]
+
+
+# a number that is not part of a label: "SpO2 86" -> 86, "HbA1c 9.5%" -> 9.5,
+# "101F" -> 101 (units may follow directly, letters may not precede)
+_VALUE = re.compile(r"(?<![A-Za-z\d.])-?\d+(?:\.\d+)?")
+
+
+def _number(value):
+    if isinstance(value, dict):
+        value = value.get('value')
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _VALUE.search(str(value))
+    return float(match.group()) if match else None
+
+
+def _index_profile(data):
+    """Flatten the sections of a parsed profile into {normalized key / LOINC: value}."""
+    found = {}
+    if not isinstance(data, dict):
+        return found
+    for section in data.values():
+        if not isinstance(section, dict):
+            continue
+        for key, value in section.items():
+            found.setdefault(_normalize_key(key), value)
+            if isinstance(value, dict) and value.get('loinc'):
+                found.setdefault(str(value['loinc']), value)
+    return found
+
+
+def profile_metric(index, metric):
+    keys, loincs = PROFILE_ALIASES[metric]
+    for key in keys + loincs:
+        if key in index:
+            return index[key]
+    return None
+
+
+def parse_bp(value):
+    if isinstance(value, dict):
+        value = value.get('value')
+    match = re.match(r"\s*(\d+(?:\.\d+)?)\s*/\s*(\d+(?:\.\d+)?)", str(value or ''))
+    return (float(match.group(1)), float(match.group(2))) if match else (None, None)
+
+
+def to_celsius(temp):
+    # device feeds and narratives mix units; no plausible body temperature
+    # in °C is above 45, so treat larger values as °F
+    if temp is None:
+        return None
+    return round((temp - 32) * 5 / 9, 1) if temp > 45 else temp
+
+
+def patient_readings(vitals=None, profile_data=None, weight_gain_3d=None, profile_values=None):
+    """
+    Metric values for one patient: the latest device `Vitals` row wins,
+    parsed profile data fills the gaps. Missing metrics are None and any
+    rule that needs them is skipped. `profile_values` (from
+    `profile_readings`) can stand in for `profile_data`.
+    """
+    index = _index_profile(profile_data)
+
+    def pick(column, metric):
+        value = _number(getattr(vitals, column, None)) if vitals is not None else None
+        return value if value is not None else _number(profile_metric(index, metric))
+
+    sbp, dbp = parse_bp(getattr(vitals, 'bp', None) if vitals is not None else None)
+    if sbp is None:
+        sbp, dbp = parse_bp(profile_metric(index, 'bp'))
+    if sbp is None:
+        sbp = _number(profile_metric(index, 'sbp'))
+        dbp = _number(profile_metric(index, 'dbp'))
+
+    readings = {
+        'spo2': pick('spo2', 'spo2'),
+        'sbp': sbp,
+        'dbp': dbp,
+        'temp_c': to_celsius(pick('temp', 'temp')),
+        'fetal_hr': pick('fetal_hr', 'fetal_hr'),
+        'tac': pick('transdermal_alcohol', 'tac'),
+        'a1c': _number(profile_metric(index, 'a1c')),
+        'anc': _number(profile_metric(index, 'anc')),
+        'weight_gain_3d': weight_gain_3d,
+    }
+    for name, value in (profile_values or {}).items():
+        if readings.get(name) is None:
+            readings[name] = value
+    return readings
+
+
+def profile_readings(profile_data):
+    """The rule inputs a parsed profile provides, small enough to store per patient."""
+    return {name: value for name, value in patient_readings(None, profile_data).items()
+            if value is not None}
+
+
+def evaluate_batch(columns, use_cases, rules=RULES):
+    """
+    Evaluate every rule over column-oriented readings
+    (`{metric: [value per patient]}`, all the same length) and return one
+    alert list per patient, most severe first. `use_cases` has each
+    patient's use-case keys; scoped rules skip patients outside theirs.
+    """
+    size = len(columns[READINGS[0]])
+    results = [[] for _ in range(size)]
+    for rule in rules:
+        cols = [columns[name] for name in rule.inputs]
+        for i, vals in enumerate(zip(*cols)):
+            if None not in vals and rule.applies(use_cases[i]) and rule.test(*vals):
+                results[i].append(rule.alert(vals))
+    for alerts in results:
+        alerts.sort(key=lambda a: -SEVERITY_RANK[a['severity']])
+    return results
+
+
+def evaluate(readings, use_cases=(), rules=RULES):
+    return evaluate_batch({name: [readings.get(name)] for name in READINGS}, [use_cases], rules)[0]
+
+
+def checked_rules(readings, use_cases=(), rules=RULES):
+    """Rules that applied to this patient and had all their inputs, whether or not they fired."""
+    return [rule for rule in rules
+            if rule.applies(use_cases) and all(readings.get(name) is not None for name in rule.inputs)]
+
+
+def merge_alerts(rule_alerts, llm_alerts, checked=()):
+    """
+    Rule alerts first, then LLM alerts about anything no `checked` rule
+    (see `checked_rules`) measured; a rule that ran and stayed quiet
+    overrides the model too.
+    """
+    covered = {_normalize_key(a['parameter']) for a in rule_alerts}
+    covered.update(*(rule.names for rule in checked))
+    extra = [a for a in (llm_alerts or [])
+             if not (isinstance(a, dict) and _normalize_key(a.get('parameter', '')) in covered)]
+    return rule_alerts + extra
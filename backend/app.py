@@ -1,62 +1,241 @@
 from gevent import monkey
 monkey.patch_all()
 
-from flask import Flask, request, jsonify, abort, url_for
+from flask import Flask, Response, g, request, jsonify, abort, url_for
 from flask_cors import CORS, cross_origin
 from dotenv import load_dotenv
-import requests
 import os
-import re
-import traceback
-import psutil
-import json5 as json
+from datetime import datetime
+import json
 from markdown import markdown
 
-from models import db, bcrypt, User, Vitals, CareChatMessage, PatientProfile, PatientChatMessage
+from models import (db, bcrypt, User, Vitals, VitalsReading, CareChatMessage, PatientProfile, PatientChatMessage,
+                    PatientSummary)
+from db_config import engine_options
+from migrations import run_migrations
+from sonar_client import SonarClient
+from sonar_stub import StubSonarClient
+from model_router import ModelRouter, latest_user_text
+from response_cache import MemoryCache, ResponseCache, cache_key
+from text_sanitizer import ResponseSanitizer, sanitize_response, strip_think
+from jobs import create_job_queue, dedup_key
+from user_resolver import UserResolver
+from pagination import paginate_messages, page_response, encode_cursor
+from pubsub import Hub, create_broker
+from alert_rules import READINGS, SEVERITY_RANK, evaluate_batch
+from vitals_store import METRICS, VitalsStore, from_epoch, parse_duration, to_epoch
+from vitals_ingest import IngestTooLarge, InvalidBody, ingest
+from prompts import (ProfileContextCache, PATIENT_CONTEXT, PARSE_PROFILE, SONAR_CHAT,
+                     BORED_CHAT, NURSE_CHAT)
+from conversation import ConversationContext, count_tokens
+from json_extract import JSONExtractor
+from profile_patch import ProfilePatcher, format_updates, full_provenance
+from profile_schema import fill_missing_fields, validate
+from metrics import AppMetrics
+from app_logging import configure_logging, dump, get_logger, identify
+from auth import PasswordHasher, SessionTokens
+from worklist import worklist_page
+from patient_summary import PatientSummaries, summary_alerts, summary_readings
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
 
 load_dotenv()
 
 
 
 def clean_response(raw_text):
-    # Remove <think> blocks
-    clean_text = re.sub(r"<think>.*?</think>", "", raw_text, flags=re.DOTALL)
-    # Remove markdown code blocks
-    clean_text = re.sub(r"```json|```", "", clean_text)
-    # Remove other markdown formatting
-    clean_text = re.sub(r"\*\*(.*?)\*\*", r"\1", clean_text)
-    clean_text = re.sub(r"\*(.*?)\*", r"\1", clean_text)
-    # Remove excessive newlines
-    clean_text = re.sub(r"\n{2,}", "\n", clean_text)
-    return clean_text.strip()
+    # Drop <think> blocks, code fences and **/* emphasis, collapse blank
+    # lines and trim -- one streaming pass, see text_sanitizer.py
+    return sanitize_response(raw_text)
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'connect_args': {'sslmode': 'require'}
-}
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-print("Connected to DB:", app.config['SQLALCHEMY_DATABASE_URI'])
+# JSON lines written off the event loop; prompt/response dumps only for debug-sampled requests
+log_handler = configure_logging(app)
+log = get_logger('app')
+
+log.info("Connected to DB: %s",
+         make_url(app.config['SQLALCHEMY_DATABASE_URI']).render_as_string(hide_password=True))
 
 db.init_app(app)
 bcrypt.init_app(app)
 
+# request latency, SQL and Sonar timings, served at /metrics
+metrics = AppMetrics()
+metrics.init_app(app)
+
+# bcrypt on native threads so logins don't stall the worker; signed bearer
+# tokens so later requests are authenticated without a DB lookup (admin and
+# care-team routes add one, for the user's token version)
+passwords = PasswordHasher(threads=int(os.getenv('BCRYPT_THREADS', 0)) or None)
+# (a random per-process key is only allowed for the single-process dev server;
+# gunicorn workers would each make their own and reject each other's tokens)
+sessions = SessionTokens.from_env(
+    require_secret=not (__name__ == '__main__' or os.getenv('FLASK_DEBUG') == '1'),
+    version_of=lambda user_id: db.session.query(User.token_version).filter_by(id=user_id).scalar())
+sessions.init_app(app)
+if sessions.ephemeral:
+    log.warning("SESSION_SECRET not set; session tokens are only valid in this process until it restarts")
+
 with app.app_context():
     db.create_all()
+    run_migrations(db)
     if not User.query.filter_by(username='rootadmin').first():
         root = User(name='Root Admin', username='rootadmin', role='admin')
         root.set_password('admin123')
         db.session.add(root)
-        db.session.commit()
-        print("✅ Root admin created with username='rootadmin' and password='admin123'")
+        try:
+            db.session.commit()
+            log.warning("Root admin created with the default password; change it")
+        except IntegrityError:
+            db.session.rollback()  # another worker created it at the same time
 
 
 
 CORS(app)
 
 SONAR_API_KEY = os.getenv("SONAR_API_KEY")
-print("Loaded SONAR_API_KEY:", SONAR_API_KEY)
+log.info("SONAR_API_KEY %s", "loaded" if SONAR_API_KEY else "missing")
+
+# one pooled, keep-alive client shared by every Sonar call in this process;
+# SONAR_STUB=1 answers from canned completions without any network
+sonar = StubSonarClient() if os.getenv('SONAR_STUB') == '1' else SonarClient.from_env()
+sonar.observer = metrics.observe_sonar
+
+# picks the model per route and request (fast for small talk, reasoning for
+# parsing and validation) and keeps per-route latency and cost totals
+router = ModelRouter.from_env(sonar)
+
+# parse_profile_text results keyed on (model, normalized input text)
+profile_cache = ResponseCache.from_env()
+
+# username -> (user, profile) snapshots for read-heavy routes
+users = UserResolver(MemoryCache(
+    max_entries=int(os.getenv('USER_CACHE_SIZE', 1024)),
+    ttl=int(os.getenv('USER_CACHE_TTL', 30)),
+))
+
+# serialized profile JSON for chat prompts, one entry per saved profile version
+prompt_contexts = ProfileContextCache(MemoryCache(
+    max_entries=int(os.getenv('PROMPT_CACHE_SIZE', 1024)),
+    ttl=int(os.getenv('PROMPT_CACHE_TTL', 3600)),
+))
+
+# pulls the profile object out of Sonar's answer; counts fallback parses
+extractor = JSONExtractor()
+
+# nurse updates patch the stored profile instead of re-parsing the whole
+# narrative; REPROCESS_MODE=full restores the old behaviour
+patcher = ProfilePatcher(extractor, derive=fill_missing_fields)
+REPROCESS_MODE = os.getenv('REPROCESS_MODE', 'incremental')
+
+# recent chat turns within a token budget, older ones summarized
+conversation = ConversationContext(
+    window_tokens=int(os.getenv('CHAT_WINDOW_TOKENS', 1500)),
+    summary_tokens=int(os.getenv('CHAT_SUMMARY_TOKENS', 400)),
+)
+
+# in-memory per-patient vitals series backed by the vitals_reading table
+vitals_store = VitalsStore(
+    capacity=int(os.getenv('VITALS_BUFFER_SIZE', 4096)),
+    preload_days=int(os.getenv('VITALS_PRELOAD_DAYS', 30)),
+)
+
+# compact per-patient state (alerts, counts, latest vitals) updated with
+# each profile, vitals and chat write, for the worklist and alert views
+summaries = PatientSummaries(weight_gains=lambda ids: vitals_store.weight_rises(days=3, user_ids=ids))
+with app.app_context():
+    try:
+        created = summaries.backfill()
+    except IntegrityError:
+        db.session.rollback()  # another worker built them at the same time
+        created = 0
+    if created:
+        log.info("Built %d patient summaries", created)
+
+# live patient-chat / alert events for /events/<username> subscribers
+hub = Hub(max_pending=int(os.getenv('PUBSUB_MAX_PENDING', 100)))
+broker = create_broker(hub)
+
+
+def patient_channel(username):
+    return f"patient:{username}"
+
+
+# profile parsing / reprocessing runs here instead of on the request worker;
+# jobs live in the database so any worker process can run and report them
+# (`JOB_QUEUE=memory` keeps them in process, as the dev server does)
+job_queue = create_job_queue(
+    os.getenv('JOB_QUEUE', 'memory' if __name__ == '__main__' else 'database'),
+    workers=int(os.getenv('JOB_WORKERS', 4)),
+    max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', 3)),
+    context=app.app_context,
+)
+
+
+def wants_stream(data):
+    return bool(data.get('stream')) or 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def sse_event(payload, event=None):
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(payload)}\n\n"
+
+
+def chat_context(user, messages, channel):
+    """
+    Prompt text for the chat so far: a rolling summary of the stored
+    `channel` chat and older turns, then the recent turns that fit the
+    window. Returns `(text, usage)`; add `prompt_tokens` once the prompt
+    is built.
+    """
+    stored = conversation.stored_summary(user.id, channel)
+    return conversation.build(messages, stored)
+
+
+def stream_sonar_answer(route, prompt, usage=None, extra=None, model=None):
+    """
+    Relay a Sonar completion to the client as server-sent events.
+
+    Deltas are cleaned as they stream (`<think>` blocks dropped, markdown
+    stripped), so the first `delta` event goes out with the upstream's first
+    answer token. A final `done` event carries the full cleaned answer and
+    citations (same shape as the non-streaming JSON response); failures
+    arrive as an `error` event. `extra` fields that need no model call go
+    out first as a `context` event and are repeated in `done`. The model
+    is routed for `route` unless given.
+    """
+    def generate():
+        sanitizer = ResponseSanitizer()
+        parts, citations = [], []
+        if extra:
+            yield sse_event(extra, event='context')
+        try:
+            for chunk in router.stream_chat(route, prompt, model):
+                citations = chunk.get('citations') or citations
+                delta = (chunk['choices'][0].get('delta') or {}).get('content') or ''
+                visible = sanitizer.feed(delta)
+                if visible:
+                    parts.append(visible)
+                    yield sse_event({'delta': visible})
+            tail = sanitizer.finish()
+            if tail:
+                parts.append(tail)
+                yield sse_event({'delta': tail})
+            done = {'answer': ''.join(parts), 'citations': citations}
+            if usage is not None:
+                done['usage'] = usage
+            done.update(extra or {})
+            yield sse_event(done, event='done')
+        except Exception as e:
+            log.exception("%s stream failed", route)
+            yield sse_event({'error': str(e)}, event='error')
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/triage', methods=['POST'])
 def triage():
@@ -73,43 +252,21 @@ def triage():
     )
 
     try:
-        response = requests.post(
-            "https://api.perplexity.ai/chat/completions",
-            headers={
-                "Authorization": f"Bearer {SONAR_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "sonar-reasoning",
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ]
-            }
-        )
-
-        # Debugging info
-        print("Status Code:", response.status_code)
-        print("Raw Response Text:", response.text)
-
-        resp_json = response.json()
-        print("Parsed JSON:", resp_json)
+        resp_json = router.chat('triage', prompt, text=symptoms)
+        dump(log, "triage.response", response=resp_json)
 
         raw_answer = resp_json['choices'][0]['message']['content']
-        print("Extracted Answer:", raw_answer)
 
         answer = clean_response(raw_answer)
         sources = resp_json.get('citations', [])
-        return jsonify({"answer": answer, "citations": sources}), response.status_code
+        return jsonify({"answer": answer, "citations": sources}), 200
 
     except Exception as e:
-        import traceback
-        print("ERROR:", e)
-        traceback.print_exc()
+        log.exception("triage failed")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/register', methods=['POST'])
 def register():
-    print("✅ /register endpoint was hit!")
     data = request.get_json()
     name = data.get('name')
     username = data.get('username')
@@ -122,12 +279,13 @@ def register():
     if User.query.filter_by(username=username).first():
         return jsonify({'error': 'Username already taken'}), 409
 
-    user = User(name=name, username=username, role=role)
-    user.set_password(password)
+    user = User(name=name, username=username, role=role, password_hash=passwords.hash(password))
 
     db.session.add(user)
+    db.session.flush()
+    summaries.row(user.id)
     db.session.commit()
-    print("Register endpoint hit")
+    log.info("Registered new patient account")
 
     return jsonify({'message': 'User registered successfully'}), 201
 
@@ -142,7 +300,7 @@ def login():
 
     user = User.query.filter_by(username=username).first()
 
-    if not user or not user.check_password(password):
+    if not user or not passwords.check(user.password_hash, password):
         return jsonify({'error': 'Invalid credentials'}), 401
 
     return jsonify({
@@ -152,17 +310,20 @@ def login():
             'name': user.name,
             'username': user.username,
             'role': user.role
-        }
+        },
+        'token': sessions.issue(user),
+        'expires_in': sessions.ttl
     }), 200
 
+@app.route('/session', methods=['GET'])
+@sessions.required()
+def get_session():
+    # checked from the token alone, no DB lookup
+    return jsonify({'user': g.session._asdict()}), 200
+
 @app.route('/users', methods=['GET'])
+@sessions.required('admin')
 def get_users():
-    auth_username = request.args.get('admin')  # rootadmin verification
-    admin_user = User.query.filter_by(username=auth_username).first()
-
-    if not admin_user or admin_user.role != 'admin':
-        return jsonify({'error': 'Unauthorized'}), 403
-
     users = User.query.all()
     user_list = [
         {
@@ -176,27 +337,26 @@ def get_users():
 
 
 @app.route('/update-role', methods=['POST'])
+@sessions.required('admin')
 def update_user_role():
     data = request.get_json()
-    admin_username = data.get('admin')
     target_username = data.get('username')
     new_role = data.get('role')
 
-    admin_user = User.query.filter_by(username=admin_username).first()
     target_user = User.query.filter_by(username=target_username).first()
 
-    if not admin_user or admin_user.role != 'admin':
-        return jsonify({'error': 'Unauthorized'}), 403
-
     if not target_user:
         return jsonify({'error': 'User not found'}), 404
 
     # Only rootadmin can change admin roles
-    if target_user.role == 'admin' and admin_user.username != 'rootadmin':
+    if target_user.role == 'admin' and g.session.username != 'rootadmin':
         return jsonify({'error': 'Only rootadmin can change other admin roles'}), 403
 
-    target_user.role = new_role
+    if new_role != target_user.role:
+        target_user.role = new_role
+        target_user.token_version = (target_user.token_version or 0) + 1  # revoke their sessions
     db.session.commit()
+    users.invalidate(target_username)
     return jsonify({'message': f"{target_username}'s role updated to {new_role}"}), 200
 
 @app.route('/sonar-chat', methods=['POST'])
@@ -211,14 +371,11 @@ def sonar_chat():
     if not messages:
         return jsonify({'error': 'No messages provided'}), 400
 
-    # lookup user
-    user = User.query.filter_by(username=username).first()
+    # lookup user + stored profile JSON
+    user, profile = users.resolve(username)
     if not user:
         return jsonify({'error': 'User not found'}), 404
-
-    # 2️⃣ Fetch the stored profile JSON
-    profile = PatientProfile.query.filter_by(user_id=user.id).first()
-    profile_data = profile.data if profile else {}
+    identify(user.username, user.name)
 
     ''''# 3️⃣ Build the brief human summary + inline full‐JSON block
     demo       = profile_data.get('demographics', {})
@@ -247,59 +404,34 @@ def sonar_chat():
     meds_str = ", ".join(meds_list) or "None"'''
 
     # assemble full JSON block + human summary
-    patient_context = (
-      "Here is your FULL PROFILE (JSON):\n"
-      "```json\n"
-      f"{json.dumps(profile_data, indent=2)}\n"
-      "```\n\n"
-      f"- Name: {user.name}\n"
-    )
+    patient_context = PATIENT_CONTEXT.render(
+        profile_json=prompt_contexts.profile_json(profile), name=user.name)
 
-    # 4️⃣ Flatten chat history
-    convo = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    # 4️⃣ Recent chat within the token budget, older turns summarized
+    convo, usage = chat_context(user, messages, 'patient')
 
     # 5️⃣ Build your final prompt
-    full_prompt = f"""
-You are SonarCare, a patient‐facing clinical assistant.  You have the patient’s full JSON profile above.
-Use only trusted, up‐to‐date medical guidelines and case studies that physicians rely on.
-Answer in clear, empathetic language (3–4 sentences) and always include a **Sources:** section at the end.
+    full_prompt = SONAR_CHAT.render(patient_context=patient_context, convo=convo)
+    usage['prompt_tokens'] = count_tokens(full_prompt)
 
----
-{patient_context}
+    dump(log, "sonar_chat.prompt", prompt=full_prompt, usage=usage)
 
-**Chat so far:**  
-{convo}
+    # 6️⃣ Simple questions go to the fast model, red flags to the reasoning one
+    model = router.choose('sonar-chat', latest_user_text(messages))
 
-**Your response:**
-"""
-
-    # debug print
-    print("📨 Prompt to SonarCare:\n", full_prompt)
+    if wants_stream(data):
+        return stream_sonar_answer('sonar-chat', full_prompt, usage, model=model)
 
     try:
-        resp = requests.post(
-          "https://api.perplexity.ai/chat/completions",
-          headers={
-            "Authorization": f"Bearer {SONAR_API_KEY}",
-            "Content-Type":  "application/json"
-          },
-          json={
-            "model":    "sonar-reasoning",
-            "messages": [{"role": "user", "content": full_prompt}]
-          }
-        )
-        resp.raise_for_status()
-
-        raw = resp.json()
-        # print entire raw so you can debug in your terminal
-        print("📬 Raw SonarCare response:\n", json.dumps(raw, indent=2))
+        raw = router.chat('sonar-chat', full_prompt, model)
+        dump(log, "sonar_chat.response", response=raw)
 
         answer   = clean_response(raw['choices'][0]['message']['content'])
         cites    = raw.get('citations', [])
-        return jsonify({'answer': answer, 'citations': cites}), 200
+        return jsonify({'answer': answer, 'citations': cites, 'usage': usage}), 200
 
     except Exception as e:
-        import traceback; traceback.print_exc()
+        log.exception("sonar-chat failed")
         return jsonify({'error': str(e)}), 500
 
 
@@ -317,32 +449,129 @@ def update_vitals():
     if not user.vitals:
         user.vitals = Vitals(user_id=user.id)
 
+    # the Vitals row keeps the latest values; every update is also kept
+    # as a history row
+    now = datetime.utcnow()
     user.vitals.bp = data.get('bp')
     user.vitals.hr = data.get('hr')
     user.vitals.weight = data.get('weight')
     user.vitals.temp = data.get('temp')
+    user.vitals.recorded_at = now
+    db.session.add(VitalsReading(
+        user_id=user.id,
+        recorded_at=now,
+        bp=data.get('bp'),
+        hr=data.get('hr'),
+        weight=data.get('weight'),
+        temp=data.get('temp')
+    ))
+    vitals_store.mark_stale(user.id)
+    summaries.vitals_changed([user.id])
     db.session.commit()
 
     return jsonify({'message': 'Vitals updated successfully'}), 200
 
+@app.route('/vitals/ingest', methods=['POST'])
+def ingest_vitals():
+    # NDJSON (or a JSON array) of readings for any number of patients
+    try:
+        rows, errors = ingest(request.get_data(), request.content_type or '',
+                              max_records=int(os.getenv('VITALS_INGEST_MAX', 50000)))
+        # readings (COPY included) and summaries commit together, or not at all
+        user_ids = {row['user_id'] for row in rows}
+        summaries.vitals_changed(user_ids)
+        db.session.commit()
+    except IngestTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except InvalidBody as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        log.exception("vitals ingest failed")
+        return jsonify({'error': str(e)}), 500
+
+    for user_id in user_ids:
+        vitals_store.mark_stale(user_id)
+    return jsonify({'accepted': len(rows), 'rejected': len(errors), 'errors': errors}), 200
+
+
 @app.route('/vitals/<username>', methods=['GET'])
 def get_vitals(username):
-    user = User.query.filter_by(username=username).first()
+    user = users.user(username)
     if not user or user.role != 'patient':
         return jsonify({'error': 'Vitals are only available for patients.'}), 403
 
-    if not user.vitals:
+    vitals = Vitals.query.filter_by(user_id=user.id).first()
+    if not vitals:
         return jsonify({'message': 'No vitals recorded for this patient.'}), 200
 
     return jsonify({
-        'bp': user.vitals.bp,
-        'hr': user.vitals.hr,
-        'weight': user.vitals.weight,
-        'temp': user.vitals.temp,
-        'recorded_at': user.vitals.recorded_at.isoformat()
+        'bp': vitals.bp,
+        'hr': vitals.hr,
+        'weight': vitals.weight,
+        'temp': vitals.temp,
+        'recorded_at': vitals.recorded_at.isoformat()
     }), 200
 
 
+def history_range(args):
+    start = args.get('start')
+    end   = args.get('end')
+    return (to_epoch(datetime.fromisoformat(start)) if start else None,
+            to_epoch(datetime.fromisoformat(end)) if end else None)
+
+
+@app.route('/vitals/<username>/history', methods=['GET'])
+def get_vitals_history(username):
+    # ?metrics=weight,spo2&start=<iso>&end=<iso>[&bucket=1h]
+    user = users.user(username)
+    if not user or user.role != 'patient':
+        return jsonify({'error': 'Vitals are only available for patients.'}), 403
+
+    metrics = [m for m in request.args.get('metrics', 'sbp,dbp,hr,weight,temp').split(',') if m]
+    unknown = [m for m in metrics if m not in METRICS]
+    if unknown:
+        return jsonify({'error': f"Unknown metrics: {', '.join(unknown)}"}), 400
+    try:
+        start, end = history_range(request.args)
+        bucket = parse_duration(request.args['bucket']) if request.args.get('bucket') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    series = vitals_store.buffer(user.id)
+    result = {}
+    for m in metrics:
+        if bucket:
+            result[m] = [dict(p, t=from_epoch(p['t']).isoformat())
+                         for p in series.downsample(m, bucket, start, end)]
+        else:
+            result[m] = [{'t': from_epoch(t).isoformat(), 'value': v}
+                         for t, v in series.points(m, start, end)]
+    return jsonify({'series': result}), 200
+
+
+@app.route('/vitals/<username>/aggregates', methods=['GET'])
+def get_vitals_aggregates(username):
+    # rolling-window stats per metric, e.g. ?window=3d&metrics=weight
+    user = users.user(username)
+    if not user or user.role != 'patient':
+        return jsonify({'error': 'Vitals are only available for patients.'}), 403
+
+    metrics = [m for m in request.args.get('metrics', ','.join(METRICS)).split(',') if m]
+    unknown = [m for m in metrics if m not in METRICS]
+    if unknown:
+        return jsonify({'error': f"Unknown metrics: {', '.join(unknown)}"}), 400
+    try:
+        window = parse_duration(request.args.get('window', '3d'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    series = vitals_store.buffer(user.id)
+    stats = {m: series.window(m, window) for m in metrics}
+    return jsonify({'window_seconds': window,
+                    'aggregates': {m: s for m, s in stats.items() if s['count']}}), 200
+
+
 @app.route('/bored-chat', methods=['POST'])
 def bored_chat():
     data     = request.get_json(force=True)
@@ -355,66 +584,39 @@ def bored_chat():
     if not messages:
         return jsonify({'error': 'No messages provided'}), 400
 
-    # 2️⃣ Lookup user
-    user = User.query.filter_by(username=username).first()
+    # 2️⃣ Lookup user + 3️⃣ profile JSON
+    user, profile = users.resolve(username)
     if not user:
         return jsonify({'error': 'User not found'}), 404
-
-    # 3️⃣ Fetch profile JSON
-    profile = PatientProfile.query.filter_by(user_id=user.id).first()
-    profile_data = profile.data if profile else {}
+    identify(user.username, user.name)
 
     # 4️⃣ Assemble patient context with raw JSON
-    patient_context = (
-        "Here is your FULL PROFILE (JSON):\n"
-        "```json\n"
-        f"{json.dumps(profile_data, indent=2)}\n"
-        "```\n\n"
-        f"- Name: {user.name}\n"
-    )
+    patient_context = PATIENT_CONTEXT.render(
+        profile_json=prompt_contexts.profile_json(profile), name=user.name)
 
-    # 5️⃣ Flatten chat history
-    convo = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    # 5️⃣ Recent chat within the token budget, older turns summarized
+    convo, usage = chat_context(user, messages, 'patient')
 
     # 6️⃣ Friendly final prompt for bored patients
-    full_prompt = f"""
-You are a friendly AI assistant for bored patients. When patients are bored or anxious, you teach them fun, useful, or health-related facts in simple terms.
-Keep the conversation appropriate.
+    full_prompt = BORED_CHAT.render(patient_context=patient_context, convo=convo)
+    usage['prompt_tokens'] = count_tokens(full_prompt)
 
-{patient_context}
+    dump(log, "bored_chat.prompt", prompt=full_prompt, usage=usage)
 
-**Chat so far:**  
-{convo}
-
-**Your response (keep it friendly and under 5 sentences, cite sources if needed):**
-"""
-
-    print("📨 Prompt to Sonar (bored mode):\n", full_prompt)
+    if wants_stream(data):
+        return stream_sonar_answer('bored-chat', full_prompt, usage)
 
     try:
-        response = requests.post(
-            "https://api.perplexity.ai/chat/completions",
-            headers={
-                "Authorization": f"Bearer {os.getenv('SONAR_API_KEY')}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "sonar-reasoning",
-                "messages": [{"role": "user", "content": full_prompt}]
-            }
-        )
-        response.raise_for_status()
-        raw = response.json()
-        print("📬 Raw Bored Chat Response:", json.dumps(raw, indent=2))
+        raw = router.chat('bored-chat', full_prompt)
+        dump(log, "bored_chat.response", response=raw)
 
         content = raw['choices'][0]['message']['content']
         clean = clean_response(content)
         sources = raw.get('citations', [])
-        return jsonify({'answer': clean, 'citations': sources}), 200
+        return jsonify({'answer': clean, 'citations': sources, 'usage': usage}), 200
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        log.exception("bored-chat failed")
         return jsonify({'error': str(e)}), 500
 
 
@@ -430,7 +632,7 @@ def save_care_chat_message():
     if not all([username, sender, content]):
         return jsonify({'error': 'Missing required fields'}), 400
 
-    user = User.query.filter_by(username=username).first()
+    user = users.user(username)
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
@@ -442,6 +644,8 @@ def save_care_chat_message():
     )
 
     db.session.add(message)
+    db.session.flush()
+    summaries.message_added(user.id, message.timestamp, 'care')
     db.session.commit()
     return jsonify({'message': 'Message saved'}), 201
 
@@ -449,19 +653,20 @@ def save_care_chat_message():
 
 @app.route('/care-chat/<username>', methods=['GET'])
 def get_care_chat_messages(username):
-    user = User.query.filter_by(username=username).first()
+    user = users.user(username)
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    messages = CareChatMessage.query.filter_by(user_id=user.id).order_by(CareChatMessage.timestamp).all()
-    result = [
-        {
-            'sender': msg.sender,
-            'content': msg.content,
-            'timestamp': msg.timestamp.isoformat()
-        } for msg in messages
-    ]
-    return jsonify({'messages': result}), 200
+    try:
+        messages, has_more = paginate_messages(CareChatMessage, user.id, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(page_response(messages, has_more, lambda msg: {
+        'sender': msg.sender,
+        'content': msg.content,
+        'timestamp': msg.timestamp.isoformat()
+    })), 200
 
 
 @app.route('/patients', methods=['GET'])
@@ -473,150 +678,119 @@ def get_patients():
     ])
 
 
+@app.route('/worklist', methods=['GET'])
+@sessions.required('care_team', 'admin')
+def get_worklist():
+    # every patient's alert / missing-field / chat state from their summary
+    # rows in one query, instead of one /profile call per patient
+    try:
+        page, total = worklist_page(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'patients': page, 'total': total}), 200
+
+
 def parse_profile_text(input_text: str, username: str = None):
     if not input_text:
         raise ValueError("Missing input text")
 
-    prompt = f"""
-    You are a clinical AI assistant designed to extract structured patient data from free-text clinical summaries and updates. You must extract relevant information and validate it against condition-specific monitoring schemas.
-
-    Use the following **master schema** derived from 2025 clinical guidelines (AHA, ADA, GINA, GOLD, etc.). For each use case, there are:
-    - Core vital/biometric requirements (with LOINC references)
-    - Mandatory patient-history elements
-    - Recommended alert/trigger thresholds
-    - Primary guideline source citations
-
-    Do NOT fabricate data. If required fields are missing, respond as a friendly chat assistant and ASK THE USER (e.g., nurse) to provide the missing information.
-
-    ---
-
-    # 🧾 MASTER PROFILE REQUIREMENTS
-
-    1. **Chronic Disease Management (HF, DM, Asthma, COPD)**
-       - Core Vital/Biometric Inputs (sensor ➜ LOINC): 
-         • Weight ➜ 29463-7 
-         • HR/SBP/DBP ➜ 8867-4 / 8480-6 / 8462-4 
-         • SpO₂ ➜ 59408-5 
-         • Glucose ➜ 2339-0 
-       - Required History: 
-         • Age, sex 
-         • NYHA class 
-         • A1c & diabetes meds 
-         • Asthma severity / GOLD stage 
-       - Alert Thresholds: 
-         • SpO₂ < 88% (GOLD 2023) 
-         • Weight ↑ >2kg/3d (AHA 2022) 
-         • A1c > 9% (ADA 2025)
-       - Evidence: [1][2][3][4]
-
-    2. **Post-Operative Recovery**
-       - Core Vitals:
-         • HR ➜ 8867-4 
-         • BP ➜ 8480-6 
-         • Temp ➜ 8310-5 
-       - Required History:
-         • Procedure type 
-         • VTE risk 
-         • Opioid regimen 
-       - Alert:
-         • Temp >38.5°C 
-         • SBP <90 mmHg 
-       - Evidence: [5]
-
-    3. **Oncology Monitoring**
-       - Inputs:
-         • Temp ➜ 8310-5 
-         • Weight ➜ 29463-7 
-       - Required:
-         • ANC, cancer stage, ICI use 
-       - Alert:
-         • Temp ≥38°C + ANC <500 
-       - Evidence: [6]
-
-    4. **Maternal-Fetal Monitoring**
-       - Inputs:
-         • BP ➜ 8480-6 
-         • FHR ➜ 56085-1 
-       - Required:
-         • Gestational age, pre-eclampsia risk 
-       - Alert:
-         • BP ≥140/90, FHR <110/>160 
-       - Evidence: [8]
-
-    5. **Substance Use**
-       - Inputs:
-         • Transdermal EtOH, HR ➜ 8867-4 
-       - Required:
-         • AUDIT score, naltrexone use 
-       - Alert:
-         • TAC ≥0.02% 
-       - Evidence: [21]
-
-    # 📚 Sources
-    1. AHA 2022 HF - doi:10.1161/CIR.0000000000001063
-    2. ADA 2025 - https://diabetesjournals.org/care/article/48/Supplement_1/S6
-    3. GINA 2024 - https://ginasthma.org
-    4. GOLD 2023 - https://goldcopd.org
-    5. ERAS 2025 - https://erassociety.org
-    6. ASCO 2024 - https://connectwithcare.org
-    8. ACOG/AHRQ Maternal RPM 2025
-    21. SOBRsafe EtOH Validation - https://ir.sobrsafe.com
-
-    ---
-
-    ## TASK
-
-    Analyze the following input (which may contain both the original summary and follow-up updates).
-    If there is any follow up updates, you should act like a chatbot considering the response you gave earlier and new responses from the careteam and respond accordingly:
-
-    \"""{input_text}\"""
-
-    1. Extract valid clinical information and incorporate new updates into the existing structure.
-    2. Preserve previously valid data if still applicable.
-    3. Re-evaluate *missing_fields* based on the full current information.
-    4. Return the updated JSON structured profile.
-
-    Output a single raw JSON object with:
-    - demographics
-    - vitals_biometrics (with LOINC)
-    - functional_scores
-    - medications
-    - devices
-    - behavioral_factors
-    - infectious_history
-    - missing_fields (list of dictionaries with parameter, question, guideline_ref)
-    - alerts (trigger violations)
-
-    Use null for unknown values. Do not fabricate. Only ask about *required* missing values.
-    """
+    model = router.choose('parse-profile')
+    key = cache_key("parse-profile", model, input_text)
+    cached = profile_cache.get(key)
+    if cached is not None:
+        return cached
 
-    response = requests.post(
-        "https://api.perplexity.ai/chat/completions",
-        headers={
-            "Authorization": f"Bearer {SONAR_API_KEY}",
-            "Content-Type": "application/json"
-        },
-        json={
-            "model": "sonar-reasoning",
-            "messages": [{"role": "user", "content": prompt}]
-        }
-    )
+    prompt = PARSE_PROFILE.render(input_text=input_text)
 
-    raw_output = response.json()['choices'][0]['message']['content']
-    cleaned = re.sub(r"<think>.*?</think>", "", raw_output, flags=re.DOTALL).strip()
-    cleaned = re.sub(r"^```json|```$", "", cleaned).strip()
-    json_match = re.search(r'\{[\s\S]*\}', cleaned)
+    raw_output = router.chat('parse-profile', prompt, model)['choices'][0]['message']['content']
+    # the model only extracts; required-field gaps come from the schema
+    parsed_json = fill_missing_fields(extractor.extract(strip_think(raw_output)), input_text)
+    profile_cache.set(key, parsed_json)
+    return parsed_json
 
-    if not json_match:
-        raise ValueError("No valid JSON object found in cleaned output.")
 
-    json_str = json_match.group()
-    json_str = re.sub(r'//.*', '', json_str)
-    json_str = re.sub(r'/\*[\s\S]*?\*/', '', json_str)
 
-    parsed_json = json.loads(json_str)
-    return parsed_json
+def complete(prompt):
+    return strip_think(router.chat('reprocess-profile', prompt)['choices'][0]['message']['content'])
+
+
+def reprocess_profile(username, updates, mode=None):
+    # Fetch existing profile from DB
+    user = User.query.filter_by(username=username).first()
+    profile = PatientProfile.query.filter_by(user_id=user.id).first() if user else None
+    if not profile:
+        raise LookupError(f"No saved profile found for {username!r}")
+
+    # 1️⃣ Patch the stored JSON with just the updates, when possible
+    patched = None
+    if (mode or REPROCESS_MODE) != 'full':
+        patched = patcher.patch(profile.data, profile.provenance, updates, complete,
+                                narrative=profile.original_input)
+
+    # 2️⃣ Otherwise re-parse the original narrative plus the updates
+    if patched is not None:
+        parsed_json, provenance, changed = patched
+        mode = 'incremental'
+    else:
+        updated_input = f"{profile.original_input}\n\nUpdates:\n" + format_updates(updates)
+        parsed_json = parse_profile_text(updated_input, username)
+        provenance, changed = full_provenance(parsed_json, 'parse'), sorted(parsed_json)
+        mode = 'full'
+        patcher.counts['full'] += 1
+
+    previous_alerts = profile.alerts_snapshot
+    profile.data = parsed_json
+    profile.provenance = provenance
+    profile.missing_fields_snapshot = parsed_json.get('missing_fields', [])
+    profile.alerts_snapshot = parsed_json.get('alerts', [])
+    summaries.profile_saved(user.id, parsed_json, profile.original_input)
+    db.session.commit()
+    users.invalidate(username)
+    if profile.alerts_snapshot != previous_alerts:
+        broker.publish(patient_channel(username), 'alerts', {'alerts': profile.alerts_snapshot})
+    return {'parsed': parsed_json, 'mode': mode, 'changed': changed}
+
+
+job_queue.register('parse-profile', lambda p: {'parsed': parse_profile_text(p['input'], p['username'])})
+job_queue.register('reprocess-profile', lambda p: reprocess_profile(p['username'], p['updates'], p.get('mode')))
+
+
+def enqueue_job(kind, username, payload):
+    # identical pending jobs for the same user share one job id
+    job = job_queue.enqueue(kind, payload, key=dedup_key(kind, username, payload))
+    return jsonify({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': url_for('get_job', job_id=job.id)
+    }), 202
+
+
+@app.route('/jobs/metrics', methods=['GET'])
+def get_job_metrics():
+    return jsonify(job_queue.metrics()), 200
+
+
+@app.route('/parse-profile/metrics', methods=['GET'])
+def get_parse_metrics():
+    return jsonify({'extraction': extractor.stats(), 'cache': profile_cache.stats()}), 200
+
 
+@app.route('/models/metrics', methods=['GET'])
+def get_model_metrics():
+    return jsonify(router.stats()), 200
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    # ?wait=N long-polls up to N seconds (max 30) for the job to finish
+    try:
+        wait = min(float(request.args.get('wait', 0)), 30.0)
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    job = job_queue.wait(job_id, timeout=wait) if wait > 0 else job_queue.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 200
 
 
 @app.route('/parse-profile', methods=['POST'])
@@ -624,13 +798,18 @@ def parse_profile():
     data = request.get_json()
     input_text = data.get('input', '')
     username = data.get('username', None)
+    identify(username)
+
+    if data.get('async'):
+        if not input_text:
+            return jsonify({'error': 'Missing input text'}), 400
+        return enqueue_job('parse-profile', username, {'input': input_text, 'username': username})
 
     try:
         parsed_json = parse_profile_text(input_text, username)
         return jsonify({'parsed': parsed_json}), 200
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        log.exception("parse-profile failed for %s", username)
         return jsonify({'error': str(e)}), 500
 
 
@@ -645,91 +824,150 @@ def save_profile():
     user = User.query.filter_by(username=username).first()
     if not user:
         return jsonify({'error': 'User not found'}), 404
+    if not isinstance(profile_data, dict):
+        return jsonify({'error': 'Missing profile'}), 400
+
+    # gaps are re-checked locally, so edits made in the form count at once
+    profile_data = fill_missing_fields(profile_data, input_text)
 
     existing = PatientProfile.query.filter_by(user_id=user.id).first()
+    previous_alerts = existing.alerts_snapshot if existing else None
     if existing:
         existing.data                 = profile_data
         existing.original_input      = input_text
         existing.missing_fields_snapshot = profile_data.get('missing_fields', [])
         existing.alerts_snapshot        = profile_data.get('alerts', [])
+        existing.provenance             = full_provenance(profile_data, 'save')
     else:
         new_profile = PatientProfile(
             user_id                 = user.id,
             data                    = profile_data,
             original_input          = input_text,
             missing_fields_snapshot = profile_data.get('missing_fields', []),
-            alerts_snapshot         = profile_data.get('alerts', [])
+            alerts_snapshot         = profile_data.get('alerts', []),
+            provenance              = full_provenance(profile_data, 'save')
         )
         db.session.add(new_profile)
 
+    summaries.profile_saved(user.id, profile_data, input_text)
     db.session.commit()
-    return jsonify({'message': 'Profile saved'}), 200
+    users.invalidate(username)
+
+    alerts = profile_data.get('alerts', [])
+    if alerts != previous_alerts:
+        broker.publish(patient_channel(username), 'alerts', {'alerts': alerts})
+    return jsonify({'message': 'Profile saved', 'missing_fields': profile_data.get('missing_fields', [])}), 200
+
+
+@app.route('/validate-profile', methods=['POST'])
+def validate_profile():
+    """Required-field gaps for a draft `profile`, or the saved one for `username`; no model call."""
+    data = request.get_json(force=True)
+    profile_data, narrative = data.get('profile'), data.get('input')
+    if profile_data is None:
+        user, profile = users.resolve(data.get('username'))
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        if not profile:
+            return jsonify({'error': 'No saved profile found'}), 404
+        profile_data, narrative = profile.data, narrative or profile.original_input
+    if not isinstance(profile_data, dict):
+        return jsonify({'error': 'profile must be an object'}), 400
+
+    result = validate(profile_data, narrative)
+    return jsonify({
+        'use_cases': result.use_cases,
+        'missing_fields': result.missing_fields,
+        'missing_vitals': result.missing_vitals,
+    }), 200
 
 @app.route('/alerts/<username>', methods=['GET'])
 def get_alerts(username):
-    user    = User.query.filter_by(username=username).first()
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-
-    profile = PatientProfile.query.filter_by(user_id=user.id).first()
-    alerts  = profile.alerts_snapshot if profile else []
+    user_id, summary = summaries.for_username(username)
+    if not user_id:
+        return jsonify({'error': 'Patient not found'}), 404
+    if summary is None:
+        # every profile, vitals and chat write creates the row, so a patient
+        # without one has nothing to alert on yet
+        return jsonify({'alerts': []}), 200
+
+    # threshold rules run locally on the summary's latest vitals + profile
+    # readings (no profile document load); LLM alerts are kept for anything
+    # the rules don't cover
+    weight  = vitals_store.buffer(user_id).window('weight', parse_duration('3d'))
+    alerts  = summary_alerts(summary, weight_gain_3d=weight.get('rise'))
     return jsonify({'alerts': alerts}), 200
 
 
+@app.route('/alerts', methods=['GET'])
+def sweep_alerts():
+    # every patient's rule alerts from one query over the summary rows,
+    # most severe first
+    rows = (db.session.query(User.id, User.username, User.name, PatientSummary)
+            .join(PatientSummary, PatientSummary.user_id == User.id)
+            .filter(User.role == 'patient')
+            .all())
+    rises    = vitals_store.weight_rises(days=3)
+    readings = [summary_readings(summary, weight_gain_3d=rises.get(user_id))
+                for user_id, _, _, summary in rows]
+    columns  = {name: [r[name] for r in readings] for name in READINGS}
+    results  = evaluate_batch(columns, [summary.use_cases or () for _, _, _, summary in rows])
+
+    flagged = [
+        {'username': username, 'name': name, 'alerts': alerts}
+        for (_, username, name, _), alerts in zip(rows, results) if alerts
+    ]
+    flagged.sort(key=lambda p: -SEVERITY_RANK[p['alerts'][0]['severity']])
+    return jsonify({'patients': flagged, 'checked': len(rows)}), 200
+
+
 
 @app.route('/profile/<username>', methods=['GET'])
 def get_saved_profile(username):
-    user = User.query.filter_by(username=username).first()
+    user, profile = users.resolve(username)
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    profile = PatientProfile.query.filter_by(user_id=user.id).first()
     if not profile:
         return jsonify({'message': 'No saved profile found'}), 200
 
     return jsonify({'profile': profile.data}), 200
 
 
-from flask import url_for
-
 @app.route('/reprocess-profile', methods=['POST', 'OPTIONS'])
 @cross_origin()
 def reprocess_profile_with_updates():
-    process = psutil.Process(os.getpid())
-    mem_before = process.memory_info().rss / 1024 ** 2  # in MB
-    cpu_before = process.cpu_percent(interval=None)
     data = request.get_json()
     username = data.get('username')
     updates = data.get('updates', {})
+    mode = data.get('mode')  # 'incremental' (default) or 'full'
+    if mode not in (None, 'incremental', 'full'):
+        return jsonify({'error': 'mode must be incremental or full'}), 400
 
-    # Fetch existing profile from DB
-    user = User.query.filter_by(username=username).first()
-    profile = PatientProfile.query.filter_by(user_id=user.id).first()
-
-    updated_input = (
-            f"{profile.original_input}\n\nUpdates:\n" +
-            "\n".join(f"{k}: {v}" for k, v in updates.items())
-    )
+    if data.get('async'):
+        user, profile = users.resolve(username)
+        if not user or not profile:
+            return jsonify({'error': 'No saved profile found'}), 404
+        return enqueue_job('reprocess-profile', username,
+                           {'username': username, 'updates': updates, 'mode': mode})
 
     try:
-        parsed_json = parse_profile_text(updated_input, username)
-        profile.data = parsed_json
-        db.session.commit()
-        mem_after = process.memory_info().rss / 1024 ** 2
-        cpu_after = process.cpu_percent(interval=0.5)
-
-        print(f"Memory used: {mem_after - mem_before:.2f} MB")
-        print(f"CPU used: {cpu_after:.2f}%")
-        return jsonify({'parsed': parsed_json}), 200
+        return jsonify(reprocess_profile(username, updates, mode)), 200
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
     except Exception as e:
-        mem_after = process.memory_info().rss / 1024 ** 2
-        cpu_after = process.cpu_percent(interval=0.5)
-
-        print(f"Memory used: {mem_after - mem_before:.2f} MB")
-        print(f"CPU used: {cpu_after:.2f}%")
+        log.exception("reprocess-profile failed for %s", username)
         return jsonify({'error': str(e)}), 500
 
 
+def patient_message_json(m):
+    return {
+        'sender':    m.sender,
+        'content':   m.content,
+        'timestamp': m.timestamp.isoformat()
+    }
+
+
 @app.route('/patient-chat', methods=['POST'])
 def save_patient_chat_message():
     data = request.get_json()
@@ -740,7 +978,7 @@ def save_patient_chat_message():
     if not all([username, sender, content]):
         return jsonify({'error': 'Missing required fields'}), 400
 
-    user = User.query.filter_by(username=username).first()
+    user = users.user(username)
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
@@ -750,44 +988,82 @@ def save_patient_chat_message():
         content=content
     )
     db.session.add(msg)
+    db.session.flush()
+    summaries.message_added(user.id, msg.timestamp)
     db.session.commit()
+    broker.publish(patient_channel(username), 'patient_message',
+                   dict(patient_message_json(msg), id=msg.id,
+                        cursor=encode_cursor(msg.timestamp, msg.id)))
     return jsonify({'message': 'Message saved'}), 201
 
 
 @app.route('/patient-chat/<username>', methods=['GET'])
 def get_patient_chat_messages(username):
-    user = User.query.filter_by(username=username).first()
+    user = users.user(username)
     if not user:
         return jsonify({'error':'User not found'}), 404
 
-    msgs = (PatientChatMessage.query
-              .filter_by(user_id=user.id)
-              .order_by(PatientChatMessage.timestamp)
-              .all()
-           )
-    result = [
-      {
-        'sender':    m.sender,
-        'content':   m.content,
-        'timestamp': m.timestamp.isoformat()
-      } for m in msgs
-    ]
-    return jsonify({'messages': result}), 200
+    try:
+        msgs, has_more = paginate_messages(PatientChatMessage, user.id, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(page_response(msgs, has_more, patient_message_json)), 200
 
 @app.route('/patient-chat/<username>', methods=['DELETE'])
 def delete_patient_chat(username):
-    user = User.query.filter_by(username=username).first()
+    user = users.user(username)
     if not user:
         return jsonify({'error':'User not found'}), 404
 
     # delete all patient-chat messages for that user
     PatientChatMessage.query.filter_by(user_id=user.id).delete()
+    conversation.reset(user.id, 'patient')
+    summaries.messages_cleared(user.id)
     db.session.commit()
+    broker.publish(patient_channel(username), 'chat_cleared', {})
     return jsonify({'message':'Chat history cleared'}), 200
 
 
-import json
-from flask import request, jsonify
+@app.route('/events/<username>', methods=['GET'])
+def patient_events(username):
+    """
+    Server-sent event stream for one patient: `patient_message` for each
+    new chat message, `alerts` when the alert snapshot changes and
+    `chat_cleared` after a history delete. A comment line is sent every
+    15 s to keep idle connections open.
+    """
+    user = users.user(username)
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    broker.start()
+    sub = hub.subscribe(patient_channel(username))
+
+    def generate():
+        try:
+            yield ": connected\n\n"
+            # a client that fell too far behind is dropped; EventSource
+            # reconnects and the page catches up with ?since=
+            while not sub.overflowed:
+                item = sub.get(timeout=15)
+                if item is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                event, data = item
+                yield sse_event(data, event=event)
+        finally:
+            sub.close()
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def format_missing_fields(missing_fields):
+    if not missing_fields:
+        return "None."
+    return "\n".join(f"- {m['parameter']}: {m['question']} ({m['guideline_ref']})" for m in missing_fields)
+
 
 @app.route('/nurse-chat', methods=['POST'])
 def nurse_chat():
@@ -801,147 +1077,107 @@ def nurse_chat():
     if not messages:
         return jsonify({'error': 'No messages provided'}), 400
 
-    user = User.query.filter_by(username=username).first()
+    # 2️⃣ Grab the full AI‐parsed profile JSON you saved earlier
+    user, profile = users.resolve(username)
     if not user:
         return jsonify({'error': 'User not found'}), 404
+    identify(user.username, user.name)
 
-    # 2️⃣ Grab the full AI‐parsed profile JSON you saved earlier
-    profile = PatientProfile.query.filter_by(user_id=user.id).first()
-    profile_data = profile.data if profile else {}
+    # 3️⃣ Recent chat within the token budget, older turns (and care-team notes) summarized
+    convo, usage = chat_context(user, messages, 'care')
 
-    # 3️⃣ Serialize the chat history
-    convo = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    # 🩺 Required-field gaps from the schema, so the nurse sees them before the model answers
+    missing_fields = validate(profile.data, profile.original_input).missing_fields if profile else []
 
     # 4️⃣ Build a single prompt that includes:
     #    • The patient’s entire JSON profile
     #    • The ongoing chat
     #    • Clear instructions to parse/validate/alert
-    full_prompt = f"""
-You are a **nurse triage assistant**.  You must use only trusted clinical guidelines, case-studies and the master schema to:
-  1. Rigorously validate this patient’s JSON profile against the Master schema (AHA, ADA, GINA, GOLD…).
-  2. Generate any missing follow-up questions (for required fields).
-  3. Identify alerts (e.g. weight gain, hypoxemia, A1c thresholds).
-  4. Answer the nurse’s actual question below *in context* of this patient.
-  
-  Master Schema:
-  # 🧾 MASTER PROFILE REQUIREMENTS
-
-1. **Chronic Disease Management (HF, DM, Asthma, COPD)**
-   - Core Vital/Biometric Inputs (sensor ➜ LOINC): 
-     • Weight ➜ 29463-7 
-     • HR/SBP/DBP ➜ 8867-4 / 8480-6 / 8462-4 
-     • SpO₂ ➜ 59408-5 
-     • Glucose ➜ 2339-0 
-   - Required History: 
-     • Age, sex 
-     • NYHA class 
-     • A1c & diabetes meds 
-     • Asthma severity / GOLD stage 
-   - Alert Thresholds: 
-     • SpO₂ < 88% (GOLD 2023) 
-     • Weight ↑ >2kg/3d (AHA 2022) 
-     • A1c > 9% (ADA 2025)
-   - Evidence: [1][2][3][4]
-
-2. **Post-Operative Recovery**
-   - Core Vitals:
-     • HR ➜ 8867-4 
-     • BP ➜ 8480-6 
-     • Temp ➜ 8310-5 
-   - Required History:
-     • Procedure type 
-     • VTE risk 
-     • Opioid regimen 
-   - Alert:
-     • Temp >38.5°C 
-     • SBP <90 mmHg 
-   - Evidence: [5]
-
-3. **Oncology Monitoring**
-   - Inputs:
-     • Temp ➜ 8310-5 
-     • Weight ➜ 29463-7 
-   - Required:
-     • ANC, cancer stage, ICI use 
-   - Alert:
-     • Temp ≥38°C + ANC <500 
-   - Evidence: [6]
-
-4. **Maternal-Fetal Monitoring**
-   - Inputs:
-     • BP ➜ 8480-6 
-     • FHR ➜ 56085-1 
-   - Required:
-     • Gestational age, pre-eclampsia risk 
-   - Alert:
-     • BP ≥140/90, FHR <110/>160 
-   - Evidence: [8]
-
-5. **Substance Use**
-   - Inputs:
-     • Transdermal EtOH, HR ➜ 8867-4 
-   - Required:
-     • AUDIT score, naltrexone use 
-   - Alert:
-     • TAC ≥0.02% 
-   - Evidence: [21]
-
-# 📚 Sources
-1. AHA 2022 HF - doi:10.1161/CIR.0000000000001063
-2. ADA 2025 - https://diabetesjournals.org/care/article/48/Supplement_1/S6
-3. GINA 2024 - https://ginasthma.org
-4. GOLD 2023 - https://goldcopd.org
-5. ERAS 2025 - https://erassociety.org
-6. ASCO 2024 - https://connectwithcare.org
-8. ACOG/AHRQ Maternal RPM 2025
-21. SOBRsafe EtOH Validation - https://ir.sobrsafe.com
-
----
-
-**PATIENT PROFILE (full JSON):**
-```json
-{json.dumps(profile_data, indent=2)}
-CHAT SO FAR:
-{convo}
-When you reply:
-
-Don’t echo the nurse’s question verbatim.
-
-Do be concise and end with a “Sources:” list.
-
-If there are missing required fields, include them as follow-up questions.
-Nurse’s question →
-"""
+    full_prompt = NURSE_CHAT.render(profile_json=prompt_contexts.profile_json(profile), convo=convo,
+                                    missing_fields=format_missing_fields(missing_fields))
+    usage['prompt_tokens'] = count_tokens(full_prompt)
+    dump(log, "nurse_chat.prompt", prompt=full_prompt, usage=usage)
+
+    if wants_stream(data):
+        return stream_sonar_answer('nurse-chat', full_prompt, usage, extra={'missing_fields': missing_fields})
+
     try:
-        resp = requests.post(
-            "https://api.perplexity.ai/chat/completions",
-            headers={
-                "Authorization": f"Bearer {SONAR_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "sonar-reasoning",
-                "messages": [{"role": "user", "content": full_prompt}]
-            }
-        )
-        resp.raise_for_status()
-        raw = resp.json()
+        raw = router.chat('nurse-chat', full_prompt)
 
-        # dump entire raw for debug if you need:
-        print("📬 Raw nurse-chat response:", json.dumps(raw, indent=2))
+        dump(log, "nurse_chat.response", response=raw)
 
         raw_answer = raw['choices'][0]['message']['content']
         answer = clean_response(raw_answer)
         citations = raw.get('citations', [])
 
-        return jsonify({'answer': answer, 'citations': citations}), 200
+        return jsonify({'answer': answer, 'citations': citations, 'usage': usage,
+                        'missing_fields': missing_fields}), 200
 
     except Exception as e:
-        import traceback;
-        traceback.print_exc()
+        log.exception("nurse-chat failed")
         return jsonify({'error': str(e)}), 500
 
 
+@metrics.collector
+def component_metrics():
+    """Cache, queue and stream gauges, read only when /metrics is scraped."""
+    caches = {
+        'profile': profile_cache.stats(),
+        'user': users.stats(),
+        'prompt_context': prompt_contexts.stats(),
+    }
+    extraction = extractor.stats()
+    jobs = job_queue.metrics()
+    flights = sonar.flights.stats() if sonar.flights else {}
+    logs = log_handler.stats()
+    tokens = sessions.stats()
+    reprocessed = patcher.stats()
+    routed = router.stats()
+    return [
+        ('triagenow_cache_hits_total', 'counter', 'Cache lookups that hit.',
+         [({'cache': name}, s['hits']) for name, s in caches.items()]),
+        ('triagenow_cache_misses_total', 'counter', 'Cache lookups that missed.',
+         [({'cache': name}, s['misses']) for name, s in caches.items()]),
+        ('triagenow_cache_hit_ratio', 'gauge', 'Hits over lookups since start.',
+         [({'cache': name}, s['hit_rate']) for name, s in caches.items()]),
+        ('triagenow_cache_entries', 'gauge', 'Entries held in this process.',
+         [({'cache': name}, s['entries']) for name, s in caches.items()]),
+        ('triagenow_profile_extractions_total', 'counter', 'Profile JSON extractions by parse path.',
+         [({'outcome': k}, extraction[k]) for k in ('strict', 'repaired', 'json5', 'failed')]),
+        ('triagenow_sonar_coalesced_total', 'counter', 'Sonar calls that joined an identical in-flight call.',
+         [({}, flights.get('shared', 0))]),
+        ('triagenow_jobs_total', 'counter', 'Background jobs by outcome.',
+         [({'outcome': k}, jobs[k]) for k in ('enqueued', 'deduplicated', 'retried', 'succeeded', 'failed')]),
+        ('triagenow_job_queue_depth', 'gauge', 'Jobs waiting for a worker.', [({}, jobs['depth'])]),
+        ('triagenow_jobs_running', 'gauge', 'Jobs being processed.', [({}, jobs['running'])]),
+        ('triagenow_event_subscribers', 'gauge', 'Open /events streams.', [({}, hub.stats()['subscribers'])]),
+        ('triagenow_log_records_total', 'counter', 'Log records written or dropped on queue overflow.',
+         [({'state': 'written'}, logs['written']), ({'state': 'dropped'}, logs['dropped'])]),
+        ('triagenow_profile_reprocess_total', 'counter',
+         'Profile updates by path: incremental patch, full re-parse, or patch attempts that fell back.',
+         [({'mode': k}, reprocessed[k]) for k in ('incremental', 'full', 'fallback')]),
+        ('triagenow_model_calls_total', 'counter', 'Sonar calls by route, routed model and outcome.',
+         [({'route': r['route'], 'model': r['model'], 'outcome': k}, r[k])
+          for r in routed['routes'] for k in ('ok', 'error', 'cancelled')]),
+        ('triagenow_model_seconds_total', 'counter', 'Time spent in Sonar calls by route and model.',
+         [({'route': r['route'], 'model': r['model']}, r['seconds']) for r in routed['routes']]),
+        ('triagenow_model_cost_usd_total', 'counter', 'Estimated Sonar token cost by route and model.',
+         [({'route': r['route'], 'model': r['model']}, r['cost_usd']) for r in routed['routes']]),
+        ('triagenow_model_decisions_total', 'counter', 'Routing decisions by route, model and reason.',
+         [({'route': d['route'], 'model': d['model'], 'reason': d['reason']}, d['count'])
+          for d in routed['decisions']]),
+        ('triagenow_session_tokens_total', 'counter', 'Session tokens issued and checked, by result.',
+         [({'result': k}, tokens[k]) for k in ('issued', 'valid', 'expired', 'invalid')]),
+        ('triagenow_password_checks_total', 'counter', 'bcrypt verifications run on the hash pool.',
+         [({}, passwords.stats()['checks'])]),
+    ]
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), content_type=AppMetrics.CONTENT_TYPE)
+
+
 @app.route("/", methods=["GET"])
 def home():
     return {"status": "Backend is running"}, 200
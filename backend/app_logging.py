@@ -0,0 +1,186 @@
+"""
+Structured, asynchronous, PHI-redacting logging.
+
+Records go to the `triagenow.*` loggers. `AsyncHandler.emit` only appends
+the record to a bounded in-memory queue (dropping the oldest when full);
+a native OS thread, outside gevent's event loop, formats each one as a JSON
+line, scrubs it and writes it to stderr. Request greenlets never wait on
+stdout, and large payloads are only serialized on that thread.
+
+Debug dumps of prompts and upstream responses go through `dump()`, which
+does nothing unless debug logging is on for the current request: always at
+`LOG_LEVEL=DEBUG`, for a random `LOG_DEBUG_SAMPLE_RATE` fraction of
+requests, or when `LOG_DEBUG_HEADER=1` and the request sends `X-Debug-Log: 1`.
+
+Redaction (on unless `LOG_REDACT=0`) masks emails, phone numbers, SSNs,
+dates and long digit runs, plus any identifiers registered for the request
+with `identify()` (the patient's username and name).
+"""
+import json
+import logging
+import os
+import random
+import re
+import sys
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+try:
+    from gevent import monkey
+    _start_thread = monkey.get_original('_thread', 'start_new_thread')
+    _sleep = monkey.get_original('time', 'sleep')
+except ImportError:
+    import _thread
+    _start_thread = _thread.start_new_thread
+    _sleep = time.sleep
+
+ROOT = 'triagenow'
+
+_PATTERNS = [
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), '<email>'),
+    (re.compile(r"\b\d{3}-\d{2}-\d{4}\b"), '<ssn>'),
+    (re.compile(r"(?<![\w-])(?:\+?1[ .-]?)?\(?\d{3}\)?[ .-]\d{3}[ .-]\d{4}\b"), '<phone>'),
+    (re.compile(r"\b(?:\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{2,4})(?:[T ][\d:.]+)?\b"), '<date>'),
+    (re.compile(r"\b\d{7,}\b"), '<id>'),
+]
+
+# standard LogRecord attributes, so anything else is treated as an extra field
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+def get_logger(name):
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+def redact(text, identifiers=()):
+    for pattern, mask in _PATTERNS:
+        text = pattern.sub(mask, text)
+    for value in sorted(identifiers, key=len, reverse=True):
+        if len(value) > 2:
+            text = re.sub(re.escape(value), '<patient>', text, flags=re.IGNORECASE)
+    return text
+
+
+def identify(*values):
+    """Register patient identifiers (and each part of a full name) to mask for this request."""
+    if has_request_context():
+        known = g.setdefault('_log_identifiers', set())
+        for value in values:
+            if value:
+                known.add(str(value))
+                known.update(str(value).split())
+
+
+def debug_enabled():
+    if has_request_context():
+        return g.get('_log_debug', False)
+    return logging.getLogger(ROOT).isEnabledFor(logging.DEBUG)
+
+
+def dump(logger, event, **fields):
+    """Debug-level structured record, built only when debug is on for this request."""
+    if debug_enabled():
+        logger.debug(event, extra=fields)
+
+
+class JSONFormatter(logging.Formatter):
+    def __init__(self, redacting=True):
+        super().__init__()
+        self.redacting = redacting
+
+    def format(self, record):
+        entry = {
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and key not in ('identifiers', 'request_id'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        line = json.dumps(entry, default=str, ensure_ascii=False)
+        if self.redacting:
+            line = redact(line, getattr(record, 'identifiers', ()))
+        ts = datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds')
+        return f'{{"ts": "{ts}", {line[1:]}'  # added after redaction, which would mask it
+
+
+class AsyncHandler(logging.Handler):
+    """Queues records for a native writer thread; never blocks the caller."""
+
+    def __init__(self, stream=None, capacity=10000, level=logging.INFO, redacting=True):
+        super().__init__(logging.DEBUG)
+        self.threshold = level
+        self.stream = stream or sys.stderr
+        self.formatter = JSONFormatter(redacting)
+        self._queue = deque(maxlen=capacity)
+        self.dropped = 0
+        self.written = 0
+        _start_thread(self._drain, ())
+
+    def emit(self, record):
+        # below the configured level only when debug is on for this request
+        if record.levelno < self.threshold and not debug_enabled():
+            return
+        if has_request_context():
+            record.identifiers = tuple(g.get('_log_identifiers', ()))
+            record.request_id = g.get('_log_request_id')
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append(record)
+
+    def _drain(self):
+        # runs on a real OS thread: only deque operations and raw writes,
+        # no locks shared with greenlets
+        fd = self.stream.fileno()
+        while True:
+            if not self._queue:
+                _sleep(0.02)
+                continue
+            lines = []
+            while self._queue and len(lines) < 500:
+                record = self._queue.popleft()
+                try:
+                    lines.append(self.formatter.format(record))
+                except Exception as e:
+                    lines.append(json.dumps({'level': 'error', 'event': f"log format failed: {e}"}))
+            data = ("\n".join(lines) + "\n").encode('utf-8', 'replace')
+            while data:
+                data = data[os.write(fd, data):]
+            self.written += len(lines)
+
+    def stats(self):
+        return {'queued': len(self._queue), 'written': self.written, 'dropped': self.dropped}
+
+
+def configure_logging(app):
+    """Install the async handler on `triagenow.*` and per-request debug sampling."""
+    level = logging.getLevelName(os.getenv('LOG_LEVEL', 'INFO').upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+    sample_rate = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', 0))
+    allow_header = os.getenv('LOG_DEBUG_HEADER', '0') == '1'
+
+    handler = AsyncHandler(capacity=int(os.getenv('LOG_QUEUE_SIZE', 10000)), level=level,
+                           redacting=os.getenv('LOG_REDACT', '1') != '0')
+    root = logging.getLogger(ROOT)
+    root.handlers[:] = [handler]
+    root.propagate = False
+    # records below `level` still reach the handler, which keeps them only
+    # for requests with debug on
+    root.setLevel(logging.DEBUG if (sample_rate or allow_header) else level)
+
+    @app.before_request
+    def _sample_request():
+        g._log_request_id = request.headers.get('X-Request-ID') or f"{random.getrandbits(48):012x}"
+        g._log_debug = (level <= logging.DEBUG
+                        or (allow_header and request.headers.get('X-Debug-Log') == '1')
+                        or (sample_rate > 0 and random.random() < sample_rate))
+
+    return handler
@@ -0,0 +1,135 @@
+"""
+Password checks off the event loop, and signed session tokens.
+
+bcrypt is deliberately slow CPU work; run inline on a gevent worker it
+stalls every greenlet in the process for the length of the hash.
+`PasswordHasher` runs it on a small pool of native threads instead (the
+bcrypt library releases the GIL while hashing), so the request greenlet
+just waits and the rest of the worker keeps serving.
+
+`SessionTokens` issues an HMAC-signed, timestamped token at login carrying
+the user's id, username, role and token version. Later requests send it as
+`Authorization: Bearer <token>` and are checked with one HMAC and no
+database lookup. Routes limited to some roles (admin, care team) also
+compare the token's version with the user's current `token_version`, one
+primary-key lookup, so a role change (which bumps it) locks the old token
+out of them at once; elsewhere claims hold until the token expires
+(`SESSION_TTL`, default 8h). `SESSION_SECRET` must be set, to the same value on every worker;
+only the single-process dev server may run without it, signing with a
+random key so tokens die with the process.
+"""
+import hashlib
+import os
+import secrets
+from collections import namedtuple
+from functools import wraps
+
+from flask import g, jsonify, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from models import bcrypt
+
+try:
+    from gevent.threadpool import ThreadPool
+except ImportError:  # plain threads outside gevent
+    ThreadPool = None
+    from concurrent.futures import ThreadPoolExecutor
+
+# tokens issued before versions existed carry no version, which counts as 0
+Session = namedtuple('Session', 'id username role version', defaults=(0,))
+
+
+class PasswordHasher:
+    def __init__(self, threads=None):
+        threads = threads or os.cpu_count() or 2
+        if ThreadPool is not None:
+            self._pool = ThreadPool(threads)
+            self._run = self._pool.apply
+        else:
+            self._pool = ThreadPoolExecutor(threads, thread_name_prefix='bcrypt')
+            self._run = lambda fn, args: self._pool.submit(fn, *args).result()
+        self.threads = threads
+        self.checks = 0
+        self.hashes = 0
+
+    def check(self, password_hash, password):
+        self.checks += 1
+        return self._run(bcrypt.check_password_hash, (password_hash, password))
+
+    def hash(self, password):
+        self.hashes += 1
+        return self._run(bcrypt.generate_password_hash, (password,)).decode('utf-8')
+
+    def stats(self):
+        return {'threads': self.threads, 'checks': self.checks, 'hashes': self.hashes}
+
+
+class SessionTokens:
+    def __init__(self, secret=None, ttl=8 * 3600, version_of=None):
+        self.ephemeral = not secret
+        self.ttl = ttl
+        # user_id -> current token version (None for a deleted user), checked
+        # on role-restricted routes
+        self.version_of = version_of
+        self._serializer = URLSafeTimedSerializer(secret or secrets.token_hex(32), salt='triagenow-session',
+                                                  signer_kwargs={'digest_method': hashlib.sha256})
+        self.counts = {'issued': 0, 'valid': 0, 'expired': 0, 'invalid': 0, 'revoked': 0}
+
+    @classmethod
+    def from_env(cls, require_secret=True, version_of=None):
+        """Raises RuntimeError without `SESSION_SECRET` unless `require_secret` is false."""
+        secret = os.getenv('SESSION_SECRET')
+        if not secret and require_secret:
+            raise RuntimeError("SESSION_SECRET is not set; every worker needs the same secret to accept "
+                               "each other's session tokens")
+        return cls(secret=secret, ttl=int(os.getenv('SESSION_TTL', 8 * 3600)), version_of=version_of)
+
+    def issue(self, user):
+        self.counts['issued'] += 1
+        return self._serializer.dumps([user.id, user.username, user.role, user.token_version or 0])
+
+    def verify(self, token):
+        """The token's `Session`, or None if it is forged, malformed or expired."""
+        try:
+            claims = self._serializer.loads(token, max_age=self.ttl)
+        except SignatureExpired:
+            self.counts['expired'] += 1
+            return None
+        except BadSignature:
+            self.counts['invalid'] += 1
+            return None
+        self.counts['valid'] += 1
+        return Session(*claims)
+
+    def init_app(self, app):
+        app.before_request(self._load_session)
+
+    def _load_session(self):
+        g.session = None
+        header = request.headers.get('Authorization', '')
+        if header.startswith('Bearer '):
+            g.session = self.verify(header[7:].strip())
+
+    def required(self, *roles):
+        """
+        Route decorator: 401 without a valid token, 403 if its role is not
+        in `roles`. With `roles`, a token older than the user's last role
+        change is also refused with 401.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapped(*args, **kwargs):
+                session = g.get('session')
+                if session is None:
+                    return jsonify({'error': 'Login required'}), 401
+                if roles and session.role not in roles:
+                    return jsonify({'error': 'Unauthorized'}), 403
+                if roles and self.version_of is not None and self.version_of(session.id) != session.version:
+                    self.counts['revoked'] += 1
+                    return jsonify({'error': 'Session revoked; log in again'}), 401
+                return view(*args, **kwargs)
+            return wrapped
+        return decorator
+
+    def stats(self):
+        return dict(self.counts, ttl=self.ttl, ephemeral_secret=self.ephemeral)
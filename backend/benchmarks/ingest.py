@@ -0,0 +1,69 @@
+"""
+Readings/second through POST /vitals/ingest.
+
+Boots the app against a scratch SQLite file (or DATABASE_URL) and posts
+NDJSON batches spread across many patients.
+
+    cd backend && python -m benchmarks.ingest --patients 200 --batch 5000 --batches 10
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def make_batch(usernames, size, start):
+    lines = []
+    for i in range(size):
+        lines.append(json.dumps({
+            'username': random.choice(usernames),
+            'recorded_at': (start + timedelta(seconds=i)).isoformat(),
+            'hr': random.randint(55, 120),
+            'spo2': round(random.uniform(86, 100), 1),
+            'hrv': round(random.uniform(20, 90), 1),
+            'eda': round(random.uniform(0.1, 5), 2),
+            'step_count': random.randint(0, 40),
+        }))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--patients', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=5000)
+    parser.add_argument('--batches', type=int, default=10)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp()}/ingest-bench.db")
+    from app import app, db, User
+
+    usernames = [f"bench-patient-{i}" for i in range(args.patients)]
+    with app.app_context():
+        existing = {u for (u,) in db.session.query(User.username).filter(User.username.in_(usernames))}
+        for name in usernames:
+            if name not in existing:
+                user = User(name=name, username=name, role='patient', password_hash='x')
+                db.session.add(user)
+        db.session.commit()
+
+    client = app.test_client()
+    start = datetime.utcnow() - timedelta(days=1)
+    bodies = [make_batch(usernames, args.batch, start + timedelta(hours=i)) for i in range(args.batches)]
+
+    total = 0
+    began = time.perf_counter()
+    for body in bodies:
+        resp = client.post('/vitals/ingest', data=body, content_type='application/x-ndjson')
+        result = resp.get_json()
+        assert resp.status_code == 200 and result['rejected'] == 0, result
+        total += result['accepted']
+    elapsed = time.perf_counter() - began
+    print(f"{total} readings in {elapsed:.2f}s -> {total / elapsed:,.0f} readings/s "
+          f"({args.batch} per request, {args.patients} patients)")
+
+
+if __name__ == '__main__':
+    main()
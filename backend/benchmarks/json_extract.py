@@ -0,0 +1,87 @@
+"""
+Regex + stdlib json (the old `parse_profile_text` path) against
+`JSONExtractor` on Sonar-style profile answers: think blocks, code fences,
+URLs inside strings, `//` comments, trailing commas, prose after the object.
+
+    cd backend && python -m benchmarks.json_extract
+"""
+import json
+import re
+import timeit
+
+from json_extract import JSONExtractor
+from text_sanitizer import strip_think
+
+
+def regex_extract(raw_output):
+    # the original implementation, kept here as the baseline
+    cleaned = strip_think(raw_output).strip()
+    cleaned = re.sub(r"^```json|```$", "", cleaned).strip()
+    json_match = re.search(r'\{[\s\S]*\}', cleaned)
+    if not json_match:
+        raise ValueError("No valid JSON object found in cleaned output.")
+    json_str = json_match.group()
+    json_str = re.sub(r'//.*', '', json_str)
+    json_str = re.sub(r'/\*[\s\S]*?\*/', '', json_str)
+    return json.loads(json_str)
+
+
+PROFILE = {
+    'demographics': {'age': 71, 'sex': 'F'},
+    'vitals_biometrics': {
+        'spo2': {'value': 86, 'unit': '%', 'loinc': '59408-5'},
+        'weight': {'value': 82.5, 'unit': 'kg', 'loinc': '29463-7'},
+    },
+    'functional_scores': {'nyha_class': 'III'},
+    'medications': ['furosemide 40 mg', 'tiotropium'],
+    'devices': [],
+    'behavioral_factors': {},
+    'infectious_history': {},
+    'missing_fields': [
+        {'parameter': 'A1c', 'question': 'What is the most recent A1c?',
+         'guideline_ref': 'ADA 2025 - https://diabetesjournals.org/care/article/48/Supplement_1/S6'},
+    ],
+    'alerts': [{'parameter': 'SpO₂', 'value': 86, 'guideline_ref': 'GOLD 2023 - https://goldcopd.org'}],
+}
+
+THINK = "<think>\nThe schema says {weight, HR}; check SpO2 < 88.\n" + "Reasoning step.\n" * 200 + "</think>\n"
+BODY = json.dumps(PROFILE, indent=2, ensure_ascii=False)
+
+PLAIN = {k: v for k, v in PROFILE.items() if k not in ('missing_fields', 'alerts')}
+
+CASES = {
+    'no URLs': (f"{THINK}```json\n{json.dumps(PLAIN, indent=2)}\n```", PLAIN),
+    'fenced': (f"{THINK}```json\n{BODY}\n```", PROFILE),
+    'prose after': (f"{THINK}{BODY}\n\nLet me know if you need {{anything}} else.", PROFILE),
+    'line comments': (f"{THINK}```json\n" + BODY.replace('"devices": [],', '"devices": [], // none reported') + "\n```", PROFILE),
+    'trailing commas': (f"{THINK}" + BODY.replace('"tiotropium"', '"tiotropium",').replace('"III"', '"III",'), PROFILE),
+    'block comment': (f"{THINK}" + BODY.replace('"devices"', '/* none reported */ "devices"'), PROFILE),
+}
+
+
+def main():
+    extractor = JSONExtractor()
+    print(f"{'case':<16} {'regex+json':>14} {'extractor':>14}   regex result")
+    for name, (text, expected) in CASES.items():
+        try:
+            ok = regex_extract(text) == expected
+            verdict = 'ok' if ok else 'WRONG (URLs cut)'
+        except ValueError as e:
+            verdict = f"error: {str(e)[:40]}"
+        assert extractor.extract(strip_think(text)) == expected, name
+
+        def old():
+            try:
+                regex_extract(text)
+            except ValueError:
+                pass
+
+        runs = 500
+        t_old = min(timeit.repeat(old, number=runs, repeat=3)) / runs
+        t_new = min(timeit.repeat(lambda: extractor.extract(strip_think(text)), number=runs, repeat=3)) / runs
+        print(f"{name:<16} {t_old * 1e6:11.1f} µs {t_new * 1e6:11.1f} µs   {verdict}")
+    print(extractor.stats())
+
+
+if __name__ == '__main__':
+    main()
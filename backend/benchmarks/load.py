@@ -0,0 +1,335 @@
+"""
+Mixed-workload load test: per-route p50/p95/p99 latency and throughput.
+
+Starts the fake Sonar server and the backend (gunicorn, gevent workers)
+as subprocesses on free ports, against a scratch SQLite file unless
+DATABASE_URL is set (point it at a local Postgres to test that path).
+Registers patients, then runs `--concurrency` client greenlets for
+`--duration` seconds, each picking the next call from a weighted mix of
+login, session check, chat send/fetch, Sonar chat, profile parse,
+vitals ingest and the care-team worklist.
+
+    cd backend && python -m benchmarks.load --concurrency 50 --duration 30 --latency 0.5
+    cd backend && python -m benchmarks.load --mix chat_send=5,chat_fetch=5 --json after.json --compare before.json
+
+`--target http://host:port` skips booting and loads an already running
+backend (which must already have the patients, see `--setup-only`).
+"""
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import json
+import os
+import random
+import socket
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import gevent
+import requests
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'bench-password'
+
+DEFAULT_MIX = 'login=1,chat_send=4,chat_fetch=6,sonar_chat=2,parse_profile=1,vitals_ingest=2'
+
+NOTES = [
+    "67 year old female, CHF, SpO2 91% on room air, weight 82.5 kg, on furosemide 40mg daily.",
+    "54 y/o male, COPD GOLD 3, home oxygen 2L, FEV1 38% predicted, former smoker 40 pack-years.",
+    "72F with atrial fibrillation on apixaban, BP 148/92, HR 88 irregular, mild ankle edema.",
+    "61M, type 2 diabetes, A1c 8.4%, metformin and insulin glargine, BMI 33, neuropathy in feet.",
+]
+QUESTIONS = [
+    "I feel more short of breath than yesterday, should I be worried?",
+    "My ankles are swollen this evening. What can I do?",
+    "Is it okay to take my water pill later in the day?",
+    "My oxygen reading dropped to 90 after walking. Is that normal?",
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url, proc, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {proc.returncode}")
+        try:
+            requests.get(url, timeout=2)
+            return
+        except requests.RequestException:  # gunicorn binds before its worker is ready
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def start_servers(args):
+    """Boot fake Sonar and the backend; returns (base_url, [processes])."""
+    log = open(args.server_log, 'ab') if args.server_log else subprocess.DEVNULL
+    sonar_port, app_port = free_port(), free_port()
+    command = [sys.executable, 'fake_sonar.py', '--port', str(sonar_port), '--latency', str(args.latency)]
+    if args.fast_latency is not None:
+        command += ['--fast-latency', str(args.fast_latency)]
+    sonar = subprocess.Popen(command, cwd=BACKEND, stdout=log, stderr=log)
+    wait_until_up(f"http://127.0.0.1:{sonar_port}/stats", sonar)
+
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp()}/load-bench.db")
+    env['SONAR_API_URL'] = f"http://127.0.0.1:{sonar_port}/chat/completions"
+    env['SONAR_API_KEY'] = 'bench'  # the fake upstream ignores it; a real key never leaves
+    env.setdefault('SESSION_SECRET', secrets.token_hex(16))  # shared by every --workers process
+    backend = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-k', 'gevent', '-w', str(args.workers),
+         '--worker-connections', str(max(1000, args.concurrency * 2)),
+         '-b', f"127.0.0.1:{app_port}", 'app:app'],
+        cwd=BACKEND, env=env, stdout=log, stderr=log)
+    base = f"http://127.0.0.1:{app_port}"
+    try:
+        wait_until_up(base + '/', backend, timeout=60)
+    except RuntimeError:
+        stop([sonar, backend])
+        raise
+    return base, [sonar, backend]
+
+
+def stop(procs):
+    for proc in procs:
+        proc.terminate()
+    for proc in procs:
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def setup_patients(base, count):
+    """Register (or reuse) the patients and log each in once; returns {username: token}."""
+    tokens = {}
+    session = requests.Session()
+    for name in (f"load-patient-{i}" for i in range(count)):
+        resp = session.post(base + '/register', json={'name': name.replace('-', ' ').title(),
+                                                      'username': name, 'password': PASSWORD})
+        if resp.status_code not in (201, 409):
+            raise RuntimeError(f"register {name}: {resp.status_code} {resp.text[:200]}")
+        resp = session.post(base + '/login', json={'username': name, 'password': PASSWORD})
+        tokens[name] = resp.json().get('token')
+    return tokens
+
+
+# -- workload ------------------------------------------------------------
+
+def vitals_batch(usernames, size):
+    start = datetime.utcnow() - timedelta(seconds=random.randint(0, 86400))
+    return "\n".join(json.dumps({
+        'username': random.choice(usernames),
+        'recorded_at': (start + timedelta(seconds=i)).isoformat(),
+        'hr': random.randint(55, 120),
+        'spo2': round(random.uniform(86, 100), 1),
+        'step_count': random.randint(0, 40),
+    }) for i in range(size))
+
+
+class Workload:
+    """One method per operation, each making one request for the given patient."""
+
+    ROUTES = {
+        'login': 'POST /login',
+        'session': 'GET /session',
+        'chat_send': 'POST /patient-chat',
+        'chat_fetch': 'GET /patient-chat/<username>',
+        'sonar_chat': 'POST /sonar-chat',
+        'parse_profile': 'POST /parse-profile',
+        'vitals_ingest': 'POST /vitals/ingest',
+        'worklist': 'GET /worklist',
+    }
+
+    def __init__(self, base, tokens, args, admin_token=None):
+        self.base = base
+        self.tokens = tokens
+        self.usernames = list(tokens)
+        self.args = args
+        self.admin_token = admin_token
+
+    def login(self, s, user):
+        return s.post(self.base + '/login', json={'username': user, 'password': PASSWORD})
+
+    def session(self, s, user):
+        return s.get(self.base + '/session', headers={'Authorization': f"Bearer {self.tokens[user]}"})
+
+    def chat_send(self, s, user):
+        return s.post(self.base + '/patient-chat', json={
+            'username': user, 'sender': random.choice(('user', 'nurse')),
+            'content': random.choice(QUESTIONS)})
+
+    def chat_fetch(self, s, user):
+        return s.get(f"{self.base}/patient-chat/{user}", params={'limit': 50})
+
+    def sonar_chat(self, s, user):
+        question = random.choice(QUESTIONS)
+        if random.random() < self.args.unique:
+            question += f" ({random.getrandbits(32):x})"  # defeats the response cache
+        return s.post(self.base + '/sonar-chat', json={
+            'username': user, 'messages': [{'role': 'user', 'content': question}]})
+
+    def parse_profile(self, s, user):
+        note = random.choice(NOTES)
+        if random.random() < self.args.unique:
+            note += f" Visit ref {random.getrandbits(32):x}."
+        return s.post(self.base + '/parse-profile', json={'input': note, 'username': user})
+
+    def vitals_ingest(self, s, user):
+        return s.post(self.base + '/vitals/ingest',
+                      data=vitals_batch(self.usernames, self.args.ingest_batch),
+                      headers={'Content-Type': 'application/x-ndjson'})
+
+    def worklist(self, s, user):
+        return s.get(self.base + '/worklist', params={'limit': 50},
+                     headers={'Authorization': f"Bearer {self.admin_token}"})
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in Workload.ROUTES:
+            raise SystemExit(f"unknown operation in --mix: {name!r}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def run(workload, mix, concurrency, duration):
+    names, weights = list(mix), list(mix.values())
+    samples = defaultdict(list)   # route -> [seconds]
+    errors = defaultdict(int)
+    deadline = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            name = random.choices(names, weights)[0]
+            route = Workload.ROUTES[name]
+            user = random.choice(workload.usernames)
+            began = time.perf_counter()
+            try:
+                ok = getattr(workload, name)(session, user).status_code < 400
+            except requests.RequestException:
+                ok = False
+            samples[route].append(time.perf_counter() - began)
+            if not ok:
+                errors[route] += 1
+
+    began = time.perf_counter()
+    gevent.joinall([gevent.spawn(client) for _ in range(concurrency)])
+    return samples, errors, time.perf_counter() - began
+
+
+# -- report --------------------------------------------------------------
+
+def percentile(ordered, q):
+    # nearest rank
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def summarize(samples, errors, elapsed):
+    routes = {}
+    for route, times in samples.items():
+        ordered = sorted(times)
+        routes[route] = {
+            'count': len(ordered),
+            'errors': errors.get(route, 0),
+            'rps': len(ordered) / elapsed,
+            'p50_ms': percentile(ordered, 50) * 1000,
+            'p95_ms': percentile(ordered, 95) * 1000,
+            'p99_ms': percentile(ordered, 99) * 1000,
+            'max_ms': ordered[-1] * 1000,
+        }
+    total = sum(r['count'] for r in routes.values())
+    return {'elapsed_s': elapsed, 'requests': total, 'rps': total / elapsed,
+            'errors': sum(errors.values()), 'routes': routes}
+
+
+def print_report(result, baseline=None):
+    def delta(route, key):
+        old = (baseline or {}).get('routes', {}).get(route, {}).get(key)
+        if not old:
+            return ''
+        return f" ({(result['routes'][route][key] - old) / old:+.0%})"
+
+    print(f"{'route':32} {'count':>7} {'err':>5} {'rps':>14} {'p50 ms':>14} {'p95 ms':>14} "
+          f"{'p99 ms':>14} {'max ms':>9}")
+    for route in sorted(result['routes']):
+        r = result['routes'][route]
+        cells = [f"{r[k]:.1f}{delta(route, k)}" for k in ('rps', 'p50_ms', 'p95_ms', 'p99_ms')]
+        print(f"{route:32} {r['count']:>7} {r['errors']:>5} {cells[0]:>14} {cells[1]:>14} "
+              f"{cells[2]:>14} {cells[3]:>14} {r['max_ms']:>9.1f}")
+    print(f"\n{result['requests']} requests in {result['elapsed_s']:.1f}s -> {result['rps']:.1f} req/s, "
+          f"{result['errors']} errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=20, help="seconds of load, after setup")
+    parser.add_argument('--warmup', type=float, default=2, help="seconds of load before measuring")
+    parser.add_argument('--patients', type=int, default=50)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="operation=weight,... (default: %(default)s)")
+    parser.add_argument('--latency', type=float, default=0.5, help="fake Sonar latency in seconds")
+    parser.add_argument('--fast-latency', type=float,
+                        help="fake Sonar latency for non-reasoning models (default: --latency)")
+    parser.add_argument('--workers', type=int, default=1, help="gunicorn gevent workers")
+    parser.add_argument('--unique', type=float, default=0.5,
+                        help="fraction of Sonar/parse calls with unique input (cache misses)")
+    parser.add_argument('--ingest-batch', type=int, default=200, help="readings per ingest request")
+    parser.add_argument('--admin-password', default='admin123', help="rootadmin password, for /worklist")
+    parser.add_argument('--target', help="load an already running backend instead of booting one")
+    parser.add_argument('--setup-only', action='store_true', help="register the patients and exit")
+    parser.add_argument('--server-log', help="append backend and fake Sonar output to this file")
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--compare', help="show changes against an earlier --json result")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    mix = parse_mix(args.mix)
+    procs = []
+    try:
+        if args.target:
+            base = args.target.rstrip('/')
+        else:
+            base, procs = start_servers(args)
+        tokens = setup_patients(base, args.patients)
+        if args.setup_only:
+            print(f"{len(tokens)} patients registered on {base}")
+            return
+
+        admin = requests.post(base + '/login', json={'username': 'rootadmin',
+                                                     'password': args.admin_password})
+        workload = Workload(base, tokens, args, admin_token=admin.json().get('token'))
+        if args.warmup:
+            run(workload, mix, args.concurrency, args.warmup)
+        result = summarize(*run(workload, mix, args.concurrency, args.duration))
+    finally:
+        stop(procs)
+
+    result['config'] = {k: v for k, v in vars(args).items() if k not in ('json', 'compare')}
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
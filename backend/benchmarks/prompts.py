@@ -0,0 +1,79 @@
+"""
+Prompt-build time for the chat routes on large profiles: the previous
+per-turn `json.dumps(profile, indent=2)` + f-string against the compiled
+templates, with the profile context cache cold and warm.
+
+    cd backend && python -m benchmarks.prompts
+"""
+import json
+import timeit
+from datetime import datetime
+
+from prompts import (ProfileContextCache, PATIENT_CONTEXT, NURSE_CHAT, MASTER_SCHEMA,
+                     orjson)
+from response_cache import MemoryCache
+from user_resolver import ProfileRef
+
+
+def large_profile(entries):
+    return {
+        'demographics': {'age': 71, 'sex': 'F', 'nyha_class': 'III'},
+        'vitals_biometrics': {
+            f"reading_{i}": {'value': 90 + i % 10, 'unit': '%', 'loinc': '59408-5',
+                             'recorded': f"2025-06-{1 + i % 28:02d}T08:00:00"}
+            for i in range(entries)
+        },
+        'medications': [{'name': f"med-{i}", 'dose': '10 mg', 'frequency': 'BID'} for i in range(entries // 4)],
+        'missing_fields': [{'parameter': f"p{i}", 'question': 'What is the current value?',
+                            'guideline_ref': 'AHA 2022'} for i in range(20)],
+        'alerts': [],
+    }
+
+
+def baseline_prompt(profile_data, name, convo):
+    # what /nurse-chat used to do on every turn
+    return f"""
+Master Schema:
+{MASTER_SCHEMA}
+**PATIENT PROFILE (full JSON):**
+```json
+{json.dumps(profile_data, indent=2)}
+CHAT SO FAR:
+{convo}
+- Name: {name}
+"""
+
+
+def main():
+    convo = "\n".join(f"user: question {i}\nassistant: answer {i}" for i in range(10))
+    print(f"encoder: {'orjson' if orjson else 'json (stdlib)'}")
+    for entries in (50, 500, 5000):
+        data = large_profile(entries)
+        profile = ProfileRef(1, data, [], [], datetime(2025, 6, 1), None)
+        size = len(json.dumps(data, indent=2))
+
+        def cold():
+            contexts = ProfileContextCache(MemoryCache())
+            NURSE_CHAT.render(profile_json=contexts.profile_json(profile), convo=convo)
+
+        warm_contexts = ProfileContextCache(MemoryCache())
+
+        def warm():
+            profile_json = warm_contexts.profile_json(profile)
+            PATIENT_CONTEXT.render(profile_json=profile_json, name='Ann')
+            NURSE_CHAT.render(profile_json=profile_json, convo=convo)
+
+        rows = [
+            ('f-string + json.dumps', lambda: baseline_prompt(data, 'Ann', convo)),
+            ('template, cold cache', cold),
+            ('template, warm cache', warm),
+        ]
+        print(f"\nprofile ≈ {size / 1024:.0f} KiB of JSON")
+        for label, fn in rows:
+            runs = max(10, 20000 // entries)
+            per_call = min(timeit.repeat(fn, number=runs, repeat=3)) / runs
+            print(f"  {label:<24} {per_call * 1e6:10.1f} µs/prompt")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Microbenchmark: regex-chain clean_response vs. the single-pass sanitizer.
+
+    cd backend && python -m benchmarks.sanitize
+"""
+import re
+import timeit
+
+from text_sanitizer import ResponseSanitizer, sanitize_response
+
+
+def regex_clean_response(raw_text):
+    # the original five-pass implementation, kept here as the baseline
+    clean_text = re.sub(r"<think>.*?</think>", "", raw_text, flags=re.DOTALL)
+    clean_text = re.sub(r"```json|```", "", clean_text)
+    clean_text = re.sub(r"\*\*(.*?)\*\*", r"\1", clean_text)
+    clean_text = re.sub(r"\*(.*?)\*", r"\1", clean_text)
+    clean_text = re.sub(r"\n{2,}", "\n", clean_text)
+    return clean_text.strip()
+
+
+def reasoning_output(think_kb, answer_lines):
+    think = ("The patient reports dyspnea; consider **GOLD** stage and SpO2 trends.\n" * 40)
+    think = (think * (think_kb * 1024 // len(think) + 1))[:think_kb * 1024]
+    answer = "\n\n".join(
+        f"**Point {i}:** keep *monitoring* weight and SpO₂ daily." for i in range(answer_lines)
+    )
+    return f"<think>\n{think}\n</think>\n```json\n{answer}\n```\n\nSources:\n[1] https://goldcopd.org\n"
+
+
+def chunked(text, size):
+    sanitizer = ResponseSanitizer()
+    out = [sanitizer.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    out.append(sanitizer.finish())
+    return "".join(out)
+
+
+def main():
+    cases = [("small", reasoning_output(2, 10)),
+             ("medium", reasoning_output(32, 60)),
+             ("large", reasoning_output(256, 400))]
+    print(f"{'case':<8}{'size':>10}{'regex µs':>12}{'single µs':>12}{'speedup':>9}{'stream(16B) µs':>16}")
+    for name, text in cases:
+        assert sanitize_response(text) == regex_clean_response(text) == chunked(text, 16)
+        number = max(3, 200_000 // len(text))
+        regex = min(timeit.repeat(lambda: regex_clean_response(text), number=number, repeat=5)) / number
+        single = min(timeit.repeat(lambda: sanitize_response(text), number=number, repeat=5)) / number
+        stream = min(timeit.repeat(lambda: chunked(text, 16), number=1, repeat=3))
+        print(f"{name:<8}{len(text):>10}{regex * 1e6:>12.1f}{single * 1e6:>12.1f}"
+              f"{regex / single:>8.1f}x{stream * 1e6:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
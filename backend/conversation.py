@@ -0,0 +1,131 @@
+"""
+Token-budgeted chat context for the Sonar routes.
+
+Clients send the whole conversation every turn. Instead of flattening all
+of it into the prompt, `ConversationContext` keeps the most recent turns
+that fit `window_tokens`, folds the older ones into a short digest, and
+prepends a rolling summary of the patient's stored chat
+(`PatientChatMessage` / `CareChatMessage`). The summary lives in
+`ConversationSummary` and is only ever extended with messages newer than
+its `through_id`, so each turn costs the same no matter how long the
+session or the stored history gets.
+
+Summaries are extractive (the opening of each turn, newest kept when over
+budget): no extra model call, and nothing is said that the chat did not say.
+"""
+import re
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, CareChatMessage, ConversationSummary, PatientChatMessage
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding('cl100k_base')
+except Exception:  # optional; fall back to an estimate
+    _encoding = None
+
+# word pieces of up to 4 characters and single punctuation marks track
+# BPE token counts closely enough for budgeting
+_PIECES = re.compile(r"\w{1,4}|[^\w\s]")
+
+CHANNELS = {'patient': PatientChatMessage, 'care': CareChatMessage}
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(_PIECES.findall(text))
+
+
+def gist(role, content, max_chars=160):
+    """One summary line: the opening of the turn, clipped at a sentence or word boundary."""
+    text = " ".join(str(content).split())
+    if len(text) > max_chars:
+        head = text[:max_chars]
+        end = max(head.rfind(". "), head.rfind("! "), head.rfind("? "))
+        if end >= max_chars // 2:
+            text = head[:end + 1]
+        else:
+            text = head[:head.rfind(" ")].rstrip() + "…" if " " in head else head + "…"
+    return f"- {role}: {text}"
+
+
+def fold(summary, lines, budget):
+    """Append `lines` to `summary`, dropping the oldest lines to stay within `budget` tokens."""
+    kept = (summary.splitlines() if summary else []) + list(lines)
+    costs = [count_tokens(line) + 1 for line in kept]
+    total = sum(costs)
+    start = 0
+    while total > budget and start < len(kept):
+        total -= costs[start]
+        start += 1
+    return "\n".join(kept[start:])
+
+
+class ConversationContext:
+    def __init__(self, window_tokens=1500, summary_tokens=400, batch=500):
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.batch = batch
+
+    def stored_summary(self, user_id, channel):
+        """Rolling summary of the stored `channel` chat, brought up to date."""
+        model = CHANNELS[channel]
+        row = ConversationSummary.query.filter_by(user_id=user_id, channel=channel).first()
+        through_id = row.through_id if row else 0
+        fresh = (model.query
+                 .filter(model.user_id == user_id, model.id > through_id)
+                 .order_by(model.id)
+                 .limit(self.batch)
+                 .all())
+        if not fresh:
+            return row.summary if row else ''
+
+        if row is None:
+            row = ConversationSummary(user_id=user_id, channel=channel, summary='', through_id=0, turns=0)
+            db.session.add(row)
+        row.summary = fold(row.summary, (gist(m.sender, m.content) for m in fresh), self.summary_tokens)
+        row.through_id = fresh[-1].id
+        row.turns += len(fresh)
+        summary = row.summary
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # another worker created it first; it catches up next turn
+        return summary
+
+    def reset(self, user_id, channel):
+        ConversationSummary.query.filter_by(user_id=user_id, channel=channel).delete()
+
+    def build(self, messages, stored=''):
+        """
+        Flatten `messages` (`{'role', 'content'}` dicts, oldest first) for a
+        prompt. Returns `(text, usage)`.
+        """
+        lines = [f"{m.get('role')}: {m.get('content')}" for m in messages]
+        window, used = [], 0
+        for line in reversed(lines):
+            cost = count_tokens(line) + 1
+            if window and used + cost > self.window_tokens:
+                break  # the latest turn is always kept, whatever its size
+            window.append(line)
+            used += cost
+        window.reverse()
+        older = messages[:len(messages) - len(window)]
+
+        earlier = fold(stored, (gist(m.get('role'), m.get('content')) for m in older),
+                       self.summary_tokens)
+        text = "\n".join(window)
+        if earlier:
+            text = f"Summary of earlier conversation:\n{earlier}\n\nMost recent turns:\n{text}"
+        usage = {
+            'turns': len(messages),
+            'window_turns': len(window),
+            'summarized_turns': len(older),
+            'window_tokens': used,
+            'summary_tokens': count_tokens(earlier),
+        }
+        return text, usage
@@ -0,0 +1,32 @@
+import os
+
+try:
+    # makes psycopg2 cooperate with gevent instead of blocking the hub
+    from psycogreen.gevent import patch_psycopg
+except ImportError:
+    patch_psycopg = None
+
+
+def engine_options(database_url):
+    """
+    SQLAlchemy engine options for the configured database.
+
+    Each gevent worker serves many greenlets from one pool, so the pool is
+    sized for concurrent requests rather than processes; pre-ping and
+    recycle drop connections the managed Postgres has closed while idle.
+    SQLite (local runs and benchmarks) keeps SQLAlchemy's defaults.
+    """
+    if not database_url or database_url.startswith('sqlite'):
+        return {}
+
+    if patch_psycopg is not None:
+        patch_psycopg()
+
+    return {
+        'connect_args': {'sslmode': os.getenv('DB_SSLMODE', 'require')},
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,
+    }
@@ -0,0 +1,78 @@
+"""
+Local stand-in for the Perplexity chat-completions API.
+
+Point the backend at it to load-test without network access or API spend:
+
+    python fake_sonar.py --port 5055 --latency 0.8
+    SONAR_API_URL=http://127.0.0.1:5055/chat/completions python app.py
+"""
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import json
+import os
+import time
+
+from flask import Flask, Response, request, jsonify
+
+from sonar_stub import completion, fake_answer, is_reasoning, stream_chunks
+
+app = Flask(__name__)
+app.config['LATENCY'] = float(os.getenv('FAKE_SONAR_LATENCY', 0.5))
+app.config['TOKEN_DELAY'] = float(os.getenv('FAKE_SONAR_TOKEN_DELAY', 0.02))
+# non-reasoning models answer sooner upstream; unset means the same latency
+_fast = os.getenv('FAKE_SONAR_FAST_LATENCY')
+app.config['FAST_LATENCY'] = float(_fast) if _fast else None
+
+# upstream calls received, so tests can check how many requests got through
+REQUESTS = {'count': 0}
+
+
+def stream_answer(payload, answer, piece=8):
+    for chunk in stream_chunks(answer, payload.get('model'), piece, app.config['TOKEN_DELAY']):
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.route('/chat/completions', methods=['POST'])
+def completions():
+    payload = request.get_json(force=True)
+    REQUESTS['count'] += 1
+    model = payload.get('model')
+    default = app.config['LATENCY']
+    if app.config['FAST_LATENCY'] is not None and not is_reasoning(model):
+        default = app.config['FAST_LATENCY']
+    # per-request override, e.g. to mix slow and fast calls in one load test
+    latency = float(request.headers.get('X-Fake-Latency', default))
+    time.sleep(latency)
+
+    prompt = "\n".join(m.get('content', '') for m in payload.get('messages', []))
+    if payload.get('stream'):
+        return Response(stream_answer(payload, fake_answer(prompt, model)), mimetype='text/event-stream')
+    return jsonify(completion(prompt, model))
+
+
+@app.route('/stats', methods=['GET', 'DELETE'])
+def stats():
+    if request.method == 'DELETE':
+        REQUESTS['count'] = 0
+    return jsonify({'requests': REQUESTS['count']})
+
+
+if __name__ == '__main__':
+    from gevent.pywsgi import WSGIServer
+
+    parser = argparse.ArgumentParser(description="Fake Perplexity Sonar upstream")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--latency', type=float, default=app.config['LATENCY'],
+                        help="seconds to wait before answering each request")
+    parser.add_argument('--fast-latency', type=float, default=app.config['FAST_LATENCY'],
+                        help="latency for non-reasoning models (default: same as --latency)")
+    args = parser.parse_args()
+    app.config['LATENCY'] = args.latency
+    app.config['FAST_LATENCY'] = args.fast_latency
+
+    print(f"Fake Sonar listening on http://{args.host}:{args.port}/chat/completions")
+    WSGIServer((args.host, args.port), app, log=None).serve_forever()
@@ -0,0 +1,390 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+
+from sqlalchemy import and_, func, or_, update
+
+from app_logging import get_logger
+from models import db, BackgroundJob
+
+log = get_logger('jobs')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+def dedup_key(kind, username, payload):
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return f"{kind}:{username}:{digest}"
+
+
+class Job:
+    def __init__(self, kind, payload, key=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.payload = payload
+        self.key = key
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.attempts = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'attempts': self.attempts,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+def _from_row(row):
+    job = Job(row.kind, row.payload, row.key)
+    job.id = row.id
+    job.status = row.status
+    job.result = row.result
+    job.error = row.error
+    job.attempts = row.attempts
+    job.created_at = row.created_at
+    job.started_at = row.started_at
+    job.finished_at = row.finished_at
+    if row.status in (SUCCEEDED, FAILED):
+        job.done.set()
+    return job
+
+
+class JobQueue:
+    """
+    Interface for background job queues. Handlers are registered per job
+    kind and called with the job payload; whatever they return (JSON
+    serializable) becomes the job result. Failed jobs are retried with
+    exponential backoff, except for `permanent` errors (bad input, unknown
+    user) that no retry can fix.
+    """
+
+    def __init__(self, workers=4, max_attempts=3, retry_backoff=1.0, context=None,
+                 permanent=(ValueError, LookupError)):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.permanent = permanent
+        self.context = context  # e.g. app.app_context, entered around each run
+        self._handlers = {}
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+
+    def enqueue(self, kind, payload, key=None):
+        """Queue a job, or return the pending job already queued under `key`."""
+        raise NotImplementedError
+
+    def get(self, job_id):
+        raise NotImplementedError
+
+    def wait(self, job_id, timeout=None):
+        raise NotImplementedError
+
+    def metrics(self):
+        raise NotImplementedError
+
+    def _call(self, job):
+        handler = self._handlers[job.kind]
+        with self.context() if self.context is not None else nullcontext():
+            return handler(job.payload)
+
+    def _retry_delay(self, job, error):
+        """Seconds before `job` runs again after `error`, or None once it has failed for good."""
+        if job.attempts < self.max_attempts and not isinstance(error, self.permanent):
+            return self.retry_backoff * 2 ** (job.attempts - 1)
+        return None
+
+
+class InProcessJobQueue(JobQueue):
+    """
+    Job queue backed by worker threads in this process (greenlets once
+    gevent has patched threading); for tests and single-process runs, as
+    other worker processes cannot see its jobs. Finished jobs are kept,
+    bounded, so clients can poll them.
+    """
+
+    def __init__(self, workers=4, max_attempts=3, retry_backoff=1.0,
+                 keep_finished=1000, context=None, permanent=(ValueError, LookupError)):
+        super().__init__(workers, max_attempts, retry_backoff, context, permanent)
+        self.keep_finished = keep_finished
+        self._jobs = {}
+        self._finished = OrderedDict()
+        self._pending_keys = {}
+        self._ready = deque()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = 0
+        self._counts = {'enqueued': 0, 'deduplicated': 0, 'retried': 0, SUCCEEDED: 0, FAILED: 0}
+
+    def _start(self):
+        # started lazily so each pre-forked server worker gets its own pool
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def enqueue(self, kind, payload, key=None):
+        """Queue a job, or return the pending job already queued under `key`."""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        with self._cond:
+            if key is not None and key in self._pending_keys:
+                self._counts['deduplicated'] += 1
+                return self._jobs[self._pending_keys[key]]
+            job = Job(kind, payload, key)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._pending_keys[key] = job.id
+            self._ready.append(job)
+            self._counts['enqueued'] += 1
+            self._start()
+            self._cond.notify()
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def wait(self, job_id, timeout=None):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.done.wait(timeout)
+        return job
+
+    def metrics(self):
+        with self._cond:
+            return dict(self._counts, depth=len(self._ready), running=self._running,
+                        workers=self.workers)
+
+    def _requeue(self, job):
+        with self._cond:
+            job.status = QUEUED
+            self._ready.append(job)
+            self._cond.notify()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._ready:
+                    self._cond.wait()
+                job = self._ready.popleft()
+                self._running += 1
+            try:
+                self._run(job)
+            finally:
+                with self._cond:
+                    self._running -= 1
+
+    def _run(self, job):
+        job.status = RUNNING
+        job.attempts += 1
+        job.started_at = time.time()
+        try:
+            job.result = self._call(job)
+        except Exception as e:
+            log.exception("%s job %s failed (attempt %d)", job.kind, job.id, job.attempts)
+            job.error = str(e)
+            delay = self._retry_delay(job, e)
+            if delay is not None:
+                with self._cond:
+                    self._counts['retried'] += 1
+                threading.Timer(delay, self._requeue, args=(job,)).start()
+                return
+            self._finish(job, FAILED)
+        else:
+            job.error = None
+            self._finish(job, SUCCEEDED)
+
+    def _finish(self, job, status):
+        with self._cond:
+            job.status = status
+            job.finished_at = time.time()
+            self._counts[status] += 1
+            if job.key is not None and self._pending_keys.get(job.key) == job.id:
+                del self._pending_keys[job.key]
+            self._finished[job.id] = job
+            while len(self._finished) > self.keep_finished:
+                old_id, _ = self._finished.popitem(last=False)
+                self._jobs.pop(old_id, None)
+        job.done.set()
+
+
+class DatabaseJobQueue(JobQueue):
+    """
+    Job queue kept in the `background_job` table, so a job queued by one
+    worker process can be run and polled from any other. Every process runs
+    `workers` threads that claim queued jobs with a conditional UPDATE (one
+    claim wins); a job left running by a process that died is claimed again
+    after `lease` seconds. Deduplication by key is per table, but two
+    identical jobs queued at the same instant in different processes may
+    both run. Finished rows are deleted after `keep_seconds`.
+    """
+
+    def __init__(self, workers=4, max_attempts=3, retry_backoff=1.0, context=None,
+                 permanent=(ValueError, LookupError), poll_interval=0.5, lease=600.0,
+                 keep_seconds=86400.0):
+        super().__init__(workers, max_attempts, retry_backoff, context, permanent)
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.keep_seconds = keep_seconds
+        self._wake = threading.Condition()  # local enqueues and finishes
+        self._threads = []
+        self._running = 0
+        self._counts = {'enqueued': 0, 'deduplicated': 0, 'retried': 0, SUCCEEDED: 0, FAILED: 0}
+
+    def _session(self):
+        # a context of its own, so queue writes never commit the caller's session
+        return self.context() if self.context is not None else nullcontext()
+
+    def _start(self):
+        # started lazily so each pre-forked server worker gets its own pool
+        with self._wake:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _count(self, name):
+        with self._wake:
+            self._counts[name] += 1
+
+    def enqueue(self, kind, payload, key=None):
+        """Queue a job, or return the pending job already queued under `key`."""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        with self._session():
+            if key is not None:
+                row = (BackgroundJob.query
+                       .filter(BackgroundJob.key == key, BackgroundJob.status.in_((QUEUED, RUNNING)))
+                       .first())
+                if row is not None:
+                    self._count('deduplicated')
+                    return _from_row(row)
+            job = Job(kind, payload, key)
+            db.session.add(BackgroundJob(id=job.id, kind=kind, payload=payload, key=key, status=QUEUED,
+                                         attempts=0, created_at=job.created_at, run_after=job.created_at))
+            db.session.commit()
+        self._count('enqueued')
+        self._start()
+        with self._wake:
+            self._wake.notify()
+        return job
+
+    def get(self, job_id):
+        with self._session():
+            row = db.session.get(BackgroundJob, job_id)
+            return _from_row(row) if row is not None else None
+
+    def wait(self, job_id, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job.done.is_set():
+                return job
+            remaining = self.poll_interval if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            with self._wake:
+                self._wake.wait(min(remaining, self.poll_interval))
+
+    def metrics(self):
+        with self._session():
+            depth = db.session.query(func.count(BackgroundJob.id)).filter(BackgroundJob.status == QUEUED).scalar()
+        with self._wake:
+            return dict(self._counts, depth=depth, running=self._running, workers=self.workers)
+
+    def _work(self):
+        while True:
+            try:
+                job = self._claim()
+            except Exception:
+                log.exception("Claiming a background job failed")
+                job = None
+            if job is None:
+                with self._wake:
+                    self._wake.wait(self.poll_interval)
+                continue
+            with self._wake:
+                self._running += 1
+            try:
+                self._run(job)
+            except Exception:
+                # the row stays running and is claimed again once the lease runs out
+                log.exception("Recording the outcome of %s job %s failed", job.kind, job.id)
+            finally:
+                with self._wake:
+                    self._running -= 1
+                    self._wake.notify_all()
+
+    def _claim(self):
+        now = time.time()
+        claimable = or_(and_(BackgroundJob.status == QUEUED, BackgroundJob.run_after <= now),
+                        and_(BackgroundJob.status == RUNNING, BackgroundJob.started_at < now - self.lease))
+        with self._session():
+            candidates = (db.session.query(BackgroundJob.id).filter(claimable)
+                          .order_by(BackgroundJob.run_after).limit(self.workers).all())
+            for (job_id,) in candidates:
+                claimed = db.session.execute(
+                    update(BackgroundJob)
+                    .where(BackgroundJob.id == job_id, claimable)
+                    .values(status=RUNNING, attempts=BackgroundJob.attempts + 1, started_at=now))
+                db.session.commit()
+                if claimed.rowcount == 1:
+                    return _from_row(db.session.get(BackgroundJob, job_id))
+        return None
+
+    def _run(self, job):
+        try:
+            result = self._call(job)
+        except Exception as e:
+            log.exception("%s job %s failed (attempt %d)", job.kind, job.id, job.attempts)
+            delay = self._retry_delay(job, e)
+            if delay is not None:
+                self._save(job.id, status=QUEUED, error=str(e), run_after=time.time() + delay)
+                self._count('retried')
+            else:
+                self._save(job.id, status=FAILED, error=str(e), finished_at=time.time())
+                self._count(FAILED)
+        else:
+            self._save(job.id, status=SUCCEEDED, result=result, error=None, finished_at=time.time())
+            self._count(SUCCEEDED)
+
+    def _save(self, job_id, **values):
+        with self._session():
+            db.session.execute(update(BackgroundJob).where(BackgroundJob.id == job_id).values(**values))
+            if 'finished_at' in values:
+                db.session.execute(
+                    BackgroundJob.__table__.delete()
+                    .where(BackgroundJob.finished_at < values['finished_at'] - self.keep_seconds))
+            db.session.commit()
+
+
+def create_job_queue(backend='memory', **options):
+    """`memory`: this process only. `database`: the `background_job` table, shared by every worker."""
+    if backend == 'memory':
+        return InProcessJobQueue(**options)
+    if backend == 'database':
+        return DatabaseJobQueue(**options)
+    raise ValueError(f"unknown JOB_QUEUE {backend!r}; expected memory or database")
@@ -0,0 +1,106 @@
+"""
+Pull the JSON object out of an LLM answer.
+
+Sonar wraps the profile in prose, code fences and sometimes `//` comments
+or trailing commas. `find_object` scans the text once (skipping strings
+and comments as units, so braces or `//` inside them don't count) and
+returns the largest balanced top-level `{...}`. `JSONExtractor.extract`
+then tries a strict parse, and only if that fails strips comments and
+trailing commas (again leaving strings alone), with json5 as the last
+resort. Counters show how often the fallbacks are needed.
+"""
+import json
+import re
+
+try:
+    import orjson
+except ImportError:  # optional; stdlib json is the strict parser otherwise
+    orjson = None
+
+try:
+    import json5
+except ImportError:
+    json5 = None
+
+# strings are matched whole (unrolled loop: no per-character alternation),
+# so braces, quotes and `//` inside them are never seen as structure
+_STRING = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+_TOKEN = re.compile(_STRING + r'|[{}]|//[^\n]*|/\*.*?(?:\*/|\Z)', re.S)
+_COMMENT = r'//[^\n]*|/\*.*?\*/'
+# strings are kept (group 1); comments and commas before `}`/`]` are dropped
+_REPAIR = re.compile(f'({_STRING})|{_COMMENT}|,(?=(?:\\s|{_COMMENT})*[}}\\]])', re.S)
+
+
+def find_object(text):
+    """
+    `(start, end)` of the largest balanced top-level object in `text`. If
+    an object is opened but never closed (truncated output), its span runs
+    to the end of the text. None when there is no `{` at all.
+    """
+    best = None
+    start = text.find('{')
+    while start >= 0:
+        depth = 0
+        for match in _TOKEN.finditer(text, start):
+            token = match.group()
+            if token == '{':
+                depth += 1
+            elif token == '}':
+                depth -= 1
+                if depth == 0:
+                    end = match.end()
+                    break
+        else:
+            # never closed: truncated output (or an unterminated string)
+            return best or (start, len(text))
+        if best is None or end - start > best[1] - best[0]:
+            best = (start, end)
+        start = text.find('{', end)  # prose between objects is skipped unscanned
+    return best
+
+
+def repair(text):
+    """Drop comments and trailing commas in one pass, leaving string contents untouched."""
+    return _REPAIR.sub(r'\1', text)
+
+
+def _strict_loads(text):
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+class JSONExtractor:
+    def __init__(self):
+        self.counts = {'calls': 0, 'strict': 0, 'repaired': 0, 'json5': 0, 'failed': 0}
+
+    def extract(self, text):
+        """The JSON object in `text` as a dict. Raises ValueError."""
+        self.counts['calls'] += 1
+        span = find_object(text or '')
+        if span is None:
+            self.counts['failed'] += 1
+            raise ValueError("No valid JSON object found in cleaned output.")
+        candidate = text[span[0]:span[1]]
+
+        attempts = [('strict', _strict_loads, lambda s: s), ('repaired', json.loads, repair)]
+        if json5 is not None:
+            attempts.append(('json5', json5.loads, lambda s: s))
+        error = None
+        for outcome, loads, prepare in attempts:
+            try:
+                parsed = loads(prepare(candidate))
+            except ValueError as e:  # orjson.JSONDecodeError subclasses it too
+                error = error or e
+                continue
+            if isinstance(parsed, dict):
+                self.counts[outcome] += 1
+                return parsed
+        self.counts['failed'] += 1
+        raise ValueError(f"Could not parse JSON object: {error}")
+
+    def stats(self):
+        counts = dict(self.counts)
+        parsed = counts['calls'] - counts['failed']
+        fallbacks = counts['repaired'] + counts['json5']
+        counts['fallback_rate'] = fallbacks / parsed if parsed else 0.0
+        counts['failure_rate'] = counts['failed'] / counts['calls'] if counts['calls'] else 0.0
+        return counts
@@ -0,0 +1,220 @@
+"""
+In-process metrics in the Prometheus text format.
+
+`AppMetrics.init_app` times every request in `before_request` /
+`after_request` (labelled by route rule, not raw path, so cardinality
+stays bounded) and counts SQL statements through SQLAlchemy engine events.
+Recording is a lock, a `bisect` and a few additions, so nothing in the
+request path blocks. Point-in-time values (cache hit rates, queue depth,
+process RSS/CPU) are read by collectors only when `/metrics` is scraped.
+
+Each worker process keeps its own numbers; scrape every worker (or run one
+per container) when running several.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+
+import psutil
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def lines(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labels, labels)} {_number(value)}"
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[i] += 1
+            row[-1] += value
+
+    def lines(self):
+        with self._lock:
+            items = [(labels, list(row)) for labels, row in self._values.items()]
+        for labels, row in items:
+            running = 0
+            for bound, count in zip(self.buckets + (float('inf'),), row):
+                running += count
+                yield (f"{self.name}_bucket{_labels(self.labels, labels, [('le', _number(bound))])}"
+                       f" {running}")
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {_number(row[-1])}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {running}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """
+        Register `fn() -> [(name, kind, help, [(labels_dict, value), ...])]`,
+        called at scrape time. Usable as a decorator.
+        """
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        out = []
+        for metric in self._metrics:
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(metric.lines())
+        for fn in self._collectors:
+            for name, kind, help, samples in fn():
+                out.append(f"# HELP {name} {help}")
+                out.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    out.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return "\n".join(out) + "\n"
+
+
+class AppMetrics:
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, prefix='triagenow'):
+        self.registry = Registry()
+        r = self.registry
+        self.requests = r.histogram(f'{prefix}_http_request_duration_seconds',
+                                    'Time to build the response (first byte for streams).',
+                                    ('method', 'route', 'status'))
+        self.request_queries = r.histogram(f'{prefix}_http_request_db_queries',
+                                           'SQL statements executed per request.',
+                                           ('route',), COUNT_BUCKETS)
+        self.queries = r.histogram(f'{prefix}_db_query_duration_seconds',
+                                   'SQL statement execution time.', (), DB_BUCKETS)
+        self.upstream = r.histogram(f'{prefix}_sonar_request_duration_seconds',
+                                    'Sonar call time (to the full body, or to the end of a stream).',
+                                    ('kind', 'outcome'))
+        self.tokens = r.histogram(f'{prefix}_sonar_tokens',
+                                  'Tokens per Sonar call as reported by the upstream.',
+                                  ('kind', 'type'), TOKEN_BUCKETS)
+        self._process = psutil.Process(os.getpid())
+        r.collector(self._process_samples)
+
+    def init_app(self, app):
+        app.before_request(self._before)
+        app.after_request(self._after)
+        event.listen(Engine, 'before_cursor_execute', self._before_query)
+        event.listen(Engine, 'after_cursor_execute', self._after_query)
+
+    def collector(self, fn):
+        return self.registry.collector(fn)
+
+    def render(self):
+        return self.registry.render()
+
+    # -- requests --------------------------------------------------------
+
+    def _before(self):
+        g._metrics_start = time.perf_counter()
+        g._metrics_queries = 0
+
+    def _after(self, response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            self.requests.observe(time.perf_counter() - start,
+                                  request.method, route, str(response.status_code))
+            self.request_queries.observe(g.pop('_metrics_queries', 0), route)
+        return response
+
+    # -- database --------------------------------------------------------
+
+    # the start time rides on the statement's execution context, which is
+    # dropped with it when the statement fails and after_cursor_execute never runs
+    def _before_query(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    def _after_query(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        if started is not None:
+            self.queries.observe(time.perf_counter() - started)
+        if has_request_context() and '_metrics_queries' in g:
+            g._metrics_queries += 1
+
+    # -- upstream --------------------------------------------------------
+
+    def observe_sonar(self, kind, seconds, usage=None, outcome='ok'):
+        """Hook for `SonarClient.observer`."""
+        self.upstream.observe(seconds, kind, outcome)
+        for name in ('prompt_tokens', 'completion_tokens'):
+            if usage and usage.get(name) is not None:
+                self.tokens.observe(usage[name], kind, name.split('_')[0])
+
+    # -- process ---------------------------------------------------------
+
+    def _process_samples(self):
+        # cheap, non-blocking reads; no interval sampling
+        memory = self._process.memory_info()
+        cpu = self._process.cpu_times()
+        return [
+            ('process_resident_memory_bytes', 'gauge', 'Resident memory size in bytes.',
+             [({}, memory.rss)]),
+            ('process_cpu_seconds_total', 'counter', 'User and system CPU time in seconds.',
+             [({}, cpu.user + cpu.system)]),
+        ]
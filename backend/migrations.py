@@ -0,0 +1,99 @@
+"""
+Versioned schema migrations applied at startup, after `db.create_all()`.
+
+`create_all` only creates missing tables, so anything that changes an
+existing table (indexes, new columns) is added here as a numbered step.
+Steps run once, in order, and are recorded in `schema_migrations`. Use
+statements both SQLite and Postgres accept, or a callable taking the
+connection for anything that has to look first (see `add_column`).
+"""
+import json
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from app_logging import get_logger
+from models import VITAL_FIELDS
+from profile_schema import validate
+
+log = get_logger('migrations')
+
+_VITAL_COLUMNS = ', '.join(VITAL_FIELDS)
+
+
+def add_column(table, column, ddl):
+    # `create_all` already adds the column on a fresh database, and SQLite
+    # has no ADD COLUMN IF NOT EXISTS
+    def step(conn):
+        if column not in {c['name'] for c in inspect(conn).get_columns(table)}:
+            conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+    return step
+
+
+def _backfill_use_cases(conn):
+    # rows written before the column existed; alerts are re-scored with
+    # them on the patient's next write
+    rows = conn.execute(text(
+        'SELECT s.id, p.data, p.original_input FROM patient_summary s '
+        'JOIN patient_profile p ON p.user_id = s.user_id')).fetchall()
+    for summary_id, data, narrative in rows:
+        data = json.loads(data) if isinstance(data, str) else data
+        conn.execute(text('UPDATE patient_summary SET use_cases = :u WHERE id = :id'),
+                     {'u': json.dumps(validate(data, narrative).use_cases), 'id': summary_id})
+
+
+MIGRATIONS = [
+    (1, "index chat/narrative history by (user_id, timestamp) and user.role", [
+        'CREATE INDEX IF NOT EXISTS ix_user_role ON "user" (role)',
+        'CREATE INDEX IF NOT EXISTS ix_care_chat_message_user_ts ON care_chat_message (user_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_patient_chat_messages_user_ts ON patient_chat_messages (user_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_clinical_narrative_user_ts ON clinical_narrative (user_id, timestamp)',
+    ]),
+    (2, "seed vitals_reading history with each patient's current vitals row", [
+        'INSERT INTO vitals_reading (user_id, recorded_at, ' + _VITAL_COLUMNS + ') '
+        'SELECT user_id, COALESCE(recorded_at, CURRENT_TIMESTAMP), ' + _VITAL_COLUMNS + ' '
+        'FROM vitals WHERE user_id IS NOT NULL',
+    ]),
+    (3, "field-level provenance on patient_profile", [
+        add_column('patient_profile', 'provenance', 'JSON'),
+    ]),
+    (4, "master-schema use cases on patient_summary, for scoping alert rules", [
+        add_column('patient_summary', 'use_cases', 'JSON'),
+        _backfill_use_cases,
+    ]),
+    (5, "per-user session token version, bumped on role changes", [
+        add_column('user', 'token_version', 'INTEGER NOT NULL DEFAULT 0'),
+    ]),
+]
+
+
+def run_migrations(db):
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            " version INTEGER PRIMARY KEY,"
+            " description VARCHAR(200) NOT NULL,"
+            " applied_at TIMESTAMP NOT NULL)"
+        ))
+        applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+    for version, description, statements in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            with db.engine.begin() as conn:
+                for statement in statements:
+                    if callable(statement):
+                        statement(conn)
+                    else:
+                        conn.execute(text(statement))
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, description, applied_at) "
+                         "VALUES (:v, :d, :t)"),
+                    {'v': version, 'd': description, 't': datetime.utcnow()},
+                )
+            log.info("Applied migration %d: %s", version, description)
+        except IntegrityError:
+            # another worker applied it at the same time
+            pass
@@ -0,0 +1,166 @@
+"""
+Per-route model selection, with latency and cost accounting.
+
+Each route has a policy entry: a tier (`fast`, `reasoning`), a model name,
+or `auto`. `auto` routes use the fast model unless the user's text has a
+red-flag symptom or is long, in which case the request goes to the
+reasoning model. Reasoning models spend most of their latency on a
+`<think>` block that `clean_response` throws away, so small talk and simple
+questions should not pay for it; profile parsing and nurse validation
+still do.
+
+`MODEL_POLICY=bored-chat=fast,sonar-chat=reasoning` overrides entries;
+`MODEL_FAST` / `MODEL_REASONING` name the tiers' models. Routes missing
+from the policy get the reasoning model, as before routing existed.
+"""
+import os
+import re
+import time
+
+from sonar_client import DEFAULT_MODEL
+
+FAST_MODEL = "sonar"
+REASONING_MODEL = DEFAULT_MODEL
+
+DEFAULT_POLICY = {
+    'triage': 'auto',
+    'sonar-chat': 'auto',
+    'bored-chat': 'fast',
+    'parse-profile': 'reasoning',
+    'reprocess-profile': 'reasoning',
+    'nurse-chat': 'reasoning',
+}
+
+# USD per million (prompt, completion) tokens; unlisted models are not costed
+PRICES = {
+    'sonar': (1.0, 1.0),
+    'sonar-pro': (3.0, 15.0),
+    'sonar-reasoning': (1.0, 5.0),
+    'sonar-reasoning-pro': (2.0, 8.0),
+}
+
+RED_FLAGS = re.compile(
+    r"chest (?:pain|pressure|tightness)|short(?:ness)? of breath|can'?t breathe|trouble breathing"
+    r"|faint|passed out|unconscious|seizure|stroke|slurred|numbness|paralys|confus|suicid|overdose"
+    r"|bleeding|blood in|coughing (?:up )?blood|vomiting blood|anaphyla|swollen (?:face|throat|tongue)"
+    r"|severe|worst|pregnan|infant|newborn", re.I)
+
+
+def parse_policy(text):
+    """`route=model,route=model` (model names or tiers) as a dict. Raises ValueError."""
+    policy = {}
+    for item in filter(None, (part.strip() for part in (text or '').split(','))):
+        route, sep, model = (s.strip() for s in item.partition('='))
+        if not sep or not route or not model:
+            raise ValueError(f"bad MODEL_POLICY entry {item!r}; expected route=model")
+        policy[route] = model
+    return policy
+
+
+def latest_user_text(messages):
+    """Content of the last user message in a chat payload, for `auto` routing."""
+    for message in reversed(messages or []):
+        if isinstance(message, dict) and message.get('role', 'user') == 'user':
+            return str(message.get('content') or '')
+    return ''
+
+
+class ModelRouter:
+    def __init__(self, client, policy=None, fast=FAST_MODEL, reasoning=REASONING_MODEL,
+                 auto_max_chars=600, prices=PRICES):
+        self.client = client
+        self.policy = {**DEFAULT_POLICY, **(policy or {})}
+        self.tiers = {'fast': fast, 'reasoning': reasoning}
+        self.auto_max_chars = auto_max_chars
+        self.prices = prices
+        self.decisions = {}  # (route, model, reason) -> count
+        self.calls = {}  # (route, model) -> totals
+
+    @classmethod
+    def from_env(cls, client):
+        return cls(
+            client,
+            policy=parse_policy(os.getenv('MODEL_POLICY', '')),
+            fast=os.getenv('MODEL_FAST', FAST_MODEL),
+            reasoning=os.getenv('MODEL_REASONING', REASONING_MODEL),
+            auto_max_chars=int(os.getenv('MODEL_AUTO_MAX_CHARS', 600)),
+        )
+
+    def choose(self, route, text=None):
+        """Model for one request to `route`; `text` is what the user wrote."""
+        rule = self.policy.get(route, 'reasoning')
+        if rule == 'auto':
+            if text and RED_FLAGS.search(text):
+                tier, reason = 'reasoning', 'red_flag'
+            elif text and len(text) > self.auto_max_chars:
+                tier, reason = 'reasoning', 'long'
+            else:
+                tier, reason = 'fast', 'simple'
+            model = self.tiers[tier]
+        else:
+            model, reason = self.tiers.get(rule, rule), 'policy'
+        key = (route, model, reason)
+        self.decisions[key] = self.decisions.get(key, 0) + 1
+        return model
+
+    def chat(self, route, prompt, model=None, text=None):
+        """`client.chat` with the routed model, accounted under `route`."""
+        model = model or self.choose(route, text)
+        started = time.perf_counter()
+        try:
+            body = self.client.chat(prompt, model=model)
+        except Exception:
+            self._record(route, model, started, outcome='error')
+            raise
+        self._record(route, model, started, body.get('usage'))
+        return body
+
+    def stream_chat(self, route, prompt, model=None, text=None):
+        """`client.stream_chat` with the routed model; accounted once the stream ends."""
+        model = model or self.choose(route, text)
+        started = time.perf_counter()
+        usage, outcome = None, 'error'
+        try:
+            for chunk in self.client.stream_chat(prompt, model=model):
+                usage = chunk.get('usage') or usage
+                yield chunk
+            outcome = 'ok'
+        except GeneratorExit:
+            outcome = 'cancelled'
+            raise
+        finally:
+            self._record(route, model, started, usage, outcome)
+
+    def cost(self, model, usage):
+        price = self.prices.get(model)
+        if not price or not usage:
+            return 0.0
+        return ((usage.get('prompt_tokens') or 0) * price[0]
+                + (usage.get('completion_tokens') or 0) * price[1]) / 1e6
+
+    def _record(self, route, model, started, usage=None, outcome='ok'):
+        totals = self.calls.get((route, model))
+        if totals is None:
+            totals = self.calls[(route, model)] = {
+                'ok': 0, 'error': 0, 'cancelled': 0, 'seconds': 0.0,
+                'prompt_tokens': 0, 'completion_tokens': 0, 'cost_usd': 0.0}
+        totals[outcome] += 1
+        totals['seconds'] += time.perf_counter() - started
+        if usage:
+            totals['prompt_tokens'] += usage.get('prompt_tokens') or 0
+            totals['completion_tokens'] += usage.get('completion_tokens') or 0
+            totals['cost_usd'] += self.cost(model, usage)
+
+    def stats(self):
+        routes = []
+        for (route, model), totals in sorted(self.calls.items()):
+            calls = totals['ok'] + totals['error'] + totals['cancelled']
+            routes.append({'route': route, 'model': model, 'calls': calls,
+                           'avg_seconds': totals['seconds'] / calls if calls else 0.0, **totals})
+        return {
+            'policy': dict(self.policy),
+            'tiers': dict(self.tiers),
+            'routes': routes,
+            'decisions': [{'route': r, 'model': m, 'reason': why, 'count': n}
+                          for (r, m, why), n in sorted(self.decisions.items())],
+        }
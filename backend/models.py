@@ -13,7 +13,8 @@ class User(db.Model):
     name = db.Column(db.String(100), nullable=False)
     username = db.Column(db.String(100), unique=True, nullable=False)
     password_hash = db.Column(db.String(128), nullable=False)
-    role = db.Column(db.String(20), nullable=False)
+    role = db.Column(db.String(20), nullable=False, index=True)
+    token_version = db.Column(db.Integer, nullable=False, default=0)  # bumped to revoke session tokens
 
     # Core profile data
     age = db.Column(db.Integer)
@@ -34,10 +35,8 @@ class User(db.Model):
         self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
 
 
-class Vitals(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True)
-
+class SensorColumns:
+    """Device/sensor measurements shared by the latest-value and history tables."""
     bp = db.Column(db.String(20))   # Optional fallback
     hr = db.Column(db.Integer)
     weight = db.Column(db.Float)
@@ -61,12 +60,39 @@ class Vitals(db.Model):
     skin_temp = db.Column(db.Float)
     bradykinesia_score = db.Column(db.Float)
     limb_rom_symmetry = db.Column(db.Float)
+
+
+# numeric sensor columns (everything except the free-text `bp`)
+NUMERIC_VITALS = (
+    'hr', 'weight', 'temp', 'spo2', 'glucose', 'rr', 'bmi', 'ahi', 'eda', 'hrv',
+    'step_count', 'sleep_duration', 'gait_speed', 'tremor_amplitude', 'peak_exp_flow',
+    'transdermal_alcohol', 'fetal_hr', 'contraction_freq', 'med_adherence', 'skin_temp',
+    'bradykinesia_score', 'limb_rom_symmetry',
+)
+VITAL_FIELDS = ('bp',) + NUMERIC_VITALS
+
+
+class Vitals(SensorColumns, db.Model):
+    """Latest reading per patient -- the fast path for /vitals/<username>."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True)
     recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     user = db.relationship('User', backref=db.backref('vitals', uselist=False))
 
 
+class VitalsReading(SensorColumns, db.Model):
+    """Append-only vitals history, one row per reading."""
+    __table_args__ = (db.Index('ix_vitals_reading_user_recorded', 'user_id', 'recorded_at'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    recorded_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
 class ClinicalNarrative(db.Model):
+    __table_args__ = (db.Index('ix_clinical_narrative_user_ts', 'user_id', 'timestamp'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
@@ -78,6 +104,8 @@ class ClinicalNarrative(db.Model):
 
 
 class CareChatMessage(db.Model):
+    __table_args__ = (db.Index('ix_care_chat_message_user_ts', 'user_id', 'timestamp'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     sender = db.Column(db.String(10), nullable=False)
@@ -96,13 +124,80 @@ class PatientProfile(db.Model):
     original_input          = db.Column(db.Text)
     missing_fields_snapshot = db.Column(db.JSON)
     alerts_snapshot         = db.Column(db.JSON)            # ← NEW
+    provenance              = db.Column(db.JSON)            # path -> {source, at, ...}, see profile_patch
     updated_at              = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class PatientChatMessage(db.Model):
     __tablename__ = 'patient_chat_messages'
+    __table_args__ = (db.Index('ix_patient_chat_messages_user_ts', 'user_id', 'timestamp'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     sender = db.Column(db.String(50), nullable=False)     # e.g. 'user' or 'nurse'
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    user = db.relationship('User', backref='patient_messages')
\ No newline at end of file
+    user = db.relationship('User', backref='patient_messages')
+
+class ConversationSummary(db.Model):
+    """Rolling digest of a patient's stored chat, folded forward as new messages arrive."""
+    __table_args__ = (db.UniqueConstraint('user_id', 'channel', name='uq_conversation_summary_user_channel'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    channel = db.Column(db.String(20), nullable=False)    # 'patient' or 'care'
+    summary = db.Column(db.Text, nullable=False, default='')
+    through_id = db.Column(db.Integer, nullable=False, default=0)  # last message folded in
+    turns = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class PatientSummary(db.Model):
+    """
+    Compact per-patient state kept up to date by profile, vitals and chat
+    writes, so list and alert views never load `PatientProfile.data`.
+    """
+    __table_args__ = (db.Index('ix_patient_summary_severity', 'severity_rank', 'alert_count'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True, nullable=False)
+
+    has_profile = db.Column(db.Boolean, nullable=False, default=False)
+    demographics = db.Column(db.JSON)
+    profile_readings = db.Column(db.JSON)    # rule inputs found in the profile, see alert_rules
+    use_cases = db.Column(db.JSON)           # master-schema use cases, see profile_schema
+    llm_alerts = db.Column(db.JSON)          # the profile's own alert list
+    missing_count = db.Column(db.Integer, nullable=False, default=0)
+    profile_updated_at = db.Column(db.DateTime)
+
+    latest_vitals = db.Column(db.JSON)       # non-null columns of the Vitals row
+    vitals_at = db.Column(db.DateTime)
+
+    alerts = db.Column(db.JSON)              # rule + LLM alerts, most severe first
+    alert_count = db.Column(db.Integer, nullable=False, default=0)
+    severity_rank = db.Column(db.Integer, nullable=False, default=0)
+    highest_severity = db.Column(db.String(20))
+
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    last_message_at = db.Column(db.DateTime)
+    care_message_count = db.Column(db.Integer, nullable=False, default=0)
+    last_care_message_at = db.Column(db.DateTime)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class BackgroundJob(db.Model):
+    """A queued `/parse-profile` or `/reprocess-profile` job, shared by every worker process."""
+    __table_args__ = (db.Index('ix_background_job_status_run_after', 'status', 'run_after'),)
+
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON)
+    key = db.Column(db.String(200), index=True)  # dedup key while queued or running
+    status = db.Column(db.String(20), nullable=False)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    # epoch seconds, as `Job.to_dict` reports them
+    created_at = db.Column(db.Float, nullable=False)
+    run_after = db.Column(db.Float, nullable=False)  # retry backoff
+    started_at = db.Column(db.Float)
+    finished_at = db.Column(db.Float)
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(timestamp, row_id):
+    return f"{timestamp.isoformat()}_{row_id}"
+
+
+def decode_cursor(cursor):
+    timestamp, _, row_id = cursor.rpartition('_')
+    try:
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+def paginate_messages(model, user_id, args):
+    """
+    Keyset pagination over a chat table ordered by (timestamp, id).
+
+    - no cursor: the newest `limit` messages
+    - `before=<cursor>`: the `limit` messages just older than the cursor
+    - `after=<cursor>` (or `since=<cursor>`): messages newer than the
+      cursor, oldest first -- what a client needs to pick up the delta
+
+    Returns `(messages, has_more)` with messages in chronological order.
+    Raises ValueError for a malformed cursor or limit.
+    """
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    before = args.get('before')
+    after = args.get('after') or args.get('since')
+    query = model.query.filter(model.user_id == user_id)
+
+    if after:
+        ts, row_id = decode_cursor(after)
+        query = query.filter(or_(model.timestamp > ts,
+                                 and_(model.timestamp == ts, model.id > row_id)))
+        rows = query.order_by(model.timestamp, model.id).limit(limit + 1).all()
+        return rows[:limit], len(rows) > limit
+
+    if before:
+        ts, row_id = decode_cursor(before)
+        query = query.filter(or_(model.timestamp < ts,
+                                 and_(model.timestamp == ts, model.id < row_id)))
+    rows = query.order_by(model.timestamp.desc(), model.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    return rows[:limit][::-1], has_more
+
+
+def page_response(messages, has_more, serialize):
+    return {
+        'messages': [dict(serialize(m), id=m.id, cursor=encode_cursor(m.timestamp, m.id))
+                     for m in messages],
+        'has_more': has_more,
+        # pass as ?before= for older history / ?since= for new messages
+        'prev_cursor': encode_cursor(messages[0].timestamp, messages[0].id) if messages else None,
+        'next_cursor': encode_cursor(messages[-1].timestamp, messages[-1].id) if messages else None,
+    }
@@ -0,0 +1,163 @@
+"""
+Denormalized per-patient summary rows (`PatientSummary`).
+
+Profile saves, vitals writes and chat messages update the patient's row in
+the same transaction as the write itself (callers commit), so the worklist
+and alert views read a few small columns instead of the whole
+`PatientProfile.data` document. The profile is parsed once per save: the
+rule inputs it provides are kept in `profile_readings` and its use cases in
+`use_cases`, and alerts are re-scored from those and the latest vitals
+whenever either changes.
+"""
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import func, update
+
+from alert_rules import (SEVERITY_RANK, checked_rules, evaluate, merge_alerts, patient_readings,
+                         profile_readings)
+from profile_schema import validate
+from models import (db, User, Vitals, PatientProfile, PatientChatMessage, CareChatMessage,
+                    PatientSummary, VITAL_FIELDS)
+
+_MESSAGE_COLUMNS = {
+    'patient': ('message_count', 'last_message_at'),
+    'care': ('care_message_count', 'last_care_message_at'),
+}
+
+
+def alert_severity(alert):
+    severity = str(alert.get('severity', '')).lower() if isinstance(alert, dict) else ''
+    return severity if severity in SEVERITY_RANK else None
+
+
+def vitals_values(vitals):
+    return {name: getattr(vitals, name) for name in VITAL_FIELDS if getattr(vitals, name) is not None}
+
+
+def summary_readings(summary, weight_gain_3d=None):
+    """Rule inputs for one patient from the summary alone."""
+    vitals = SimpleNamespace(**(summary.latest_vitals or {})) if summary.latest_vitals else None
+    return patient_readings(vitals, weight_gain_3d=weight_gain_3d,
+                            profile_values=summary.profile_readings)
+
+
+def summary_alerts(summary, weight_gain_3d=None):
+    readings, use_cases = summary_readings(summary, weight_gain_3d), summary.use_cases or ()
+    return merge_alerts(evaluate(readings, use_cases), summary.llm_alerts or [],
+                        checked_rules(readings, use_cases))
+
+
+class PatientSummaries:
+    def __init__(self, weight_gains=None):
+        # [user_id] -> {user_id: 3-day weight rise in kg}, for the weight-gain rule
+        self.weight_gains = weight_gains or (lambda user_ids: {})
+
+    def row(self, user_id):
+        return PatientSummary.query.filter_by(user_id=user_id).first() or self._new(user_id)
+
+    def _new(self, user_id):
+        summary = PatientSummary(user_id=user_id, has_profile=False, missing_count=0, alert_count=0,
+                                 severity_rank=0, message_count=0, care_message_count=0)
+        db.session.add(summary)
+        return summary
+
+    def rescore(self, summary, weight_gain_3d=None):
+        alerts = summary_alerts(summary, weight_gain_3d)
+        top = max((SEVERITY_RANK.get(alert_severity(a), 0) for a in alerts), default=0)
+        summary.alerts = alerts
+        summary.alert_count = len(alerts)
+        summary.severity_rank = top
+        summary.highest_severity = next((s for s, r in SEVERITY_RANK.items() if r == top), None)
+        return alerts
+
+    # -- writes; the caller commits --------------------------------------
+
+    def profile_saved(self, user_id, profile_data, narrative=None):
+        summary = self._apply_profile(self.row(user_id), profile_data, narrative=narrative)
+        self.rescore(summary, self.weight_gains([user_id]).get(user_id))
+        return summary
+
+    def _apply_profile(self, summary, profile_data, updated_at=None, narrative=None):
+        profile_data = profile_data if isinstance(profile_data, dict) else {}
+        demographics = profile_data.get('demographics')
+        summary.has_profile = True
+        summary.demographics = demographics if isinstance(demographics, dict) else None
+        summary.profile_readings = profile_readings(profile_data)
+        summary.use_cases = validate(profile_data, narrative).use_cases
+        summary.llm_alerts = profile_data.get('alerts') or []
+        summary.missing_count = len(profile_data.get('missing_fields') or [])
+        summary.profile_updated_at = updated_at or datetime.utcnow()
+        return summary
+
+    def vitals_changed(self, user_ids):
+        """Refresh latest vitals and alerts for `user_ids` with one query per table; returns the rows."""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        vitals = {v.user_id: v for v in Vitals.query.filter(Vitals.user_id.in_(user_ids))}
+        existing = {s.user_id: s for s in PatientSummary.query.filter(PatientSummary.user_id.in_(user_ids))}
+        gains = self.weight_gains(user_ids)
+        for user_id in user_ids:
+            summary = existing[user_id] = existing.get(user_id) or self._new(user_id)
+            row = vitals.get(user_id)
+            summary.latest_vitals = vitals_values(row) if row is not None else None
+            summary.vitals_at = row.recorded_at if row is not None else None
+            self.rescore(summary, gains.get(user_id))
+        return existing
+
+    def message_added(self, user_id, timestamp, channel='patient'):
+        # one UPDATE, so concurrent messages never lose a count
+        count, last = _MESSAGE_COLUMNS[channel]
+        column = getattr(PatientSummary, count)
+        result = db.session.execute(
+            update(PatientSummary)
+            .where(PatientSummary.user_id == user_id)
+            .values({count: column + 1, last: timestamp}))
+        if result.rowcount == 0:
+            summary = self.row(user_id)
+            setattr(summary, count, 1)
+            setattr(summary, last, timestamp)
+
+    def messages_cleared(self, user_id, channel='patient'):
+        count, last = _MESSAGE_COLUMNS[channel]
+        db.session.execute(update(PatientSummary)
+                           .where(PatientSummary.user_id == user_id)
+                           .values({count: 0, last: None}))
+
+    # -- reads -----------------------------------------------------------
+
+    def for_username(self, username):
+        """`(user_id, PatientSummary or None)`, or `(None, None)` unless `username` is a patient."""
+        row = (db.session.query(User.id, PatientSummary)
+               .outerjoin(PatientSummary, PatientSummary.user_id == User.id)
+               .filter(User.username == username, User.role == 'patient')
+               .first())
+        return (row[0], row[1]) if row else (None, None)
+
+    # -- startup ---------------------------------------------------------
+
+    def backfill(self):
+        """Create rows for patients that have none (first start after upgrading). Returns the count."""
+        missing = [user_id for (user_id,) in
+                   db.session.query(User.id)
+                   .outerjoin(PatientSummary, PatientSummary.user_id == User.id)
+                   .filter(User.role == 'patient', PatientSummary.id.is_(None))]
+        if not missing:
+            return 0
+        rows = {user_id: self._new(user_id) for user_id in missing}
+        for user_id, data, narrative, updated_at in (
+                db.session.query(PatientProfile.user_id, PatientProfile.data, PatientProfile.original_input,
+                                 PatientProfile.updated_at)
+                .filter(PatientProfile.user_id.in_(missing))):
+            self._apply_profile(rows[user_id], data, updated_at, narrative)
+        self.vitals_changed(missing)  # also scores every row
+        for channel, model in (('patient', PatientChatMessage), ('care', CareChatMessage)):
+            count, last = _MESSAGE_COLUMNS[channel]
+            for user_id, n, ts in (db.session.query(model.user_id, func.count(model.id), func.max(model.timestamp))
+                                   .filter(model.user_id.in_(missing))
+                                   .group_by(model.user_id)):
+                setattr(rows[user_id], count, n)
+                setattr(rows[user_id], last, ts)
+        db.session.commit()
+        return len(missing)
@@ -0,0 +1,131 @@
+"""
+Incremental profile updates.
+
+A care-team correction usually touches a field or two, yet a full re-parse
+resends the whole narrative and has the model regenerate the whole profile.
+`ProfilePatcher` instead sends the stored profile (compact JSON) and just
+the new updates, asks for a list of `{"path", "value"}` changes plus the
+re-evaluated `alerts`, and merges that into the stored document
+(`missing_fields` is then recomputed locally by `derive`). Every changed path is recorded in the profile's `provenance`
+(`{path: {"source", "at", ...}}`), so it is clear which values came from
+the original parse and which from later updates.
+
+Anything that does not fit (no stored profile, unparseable or malformed
+patch, the model asking for a rebuild) makes `patch()` return None and the
+caller falls back to the full re-parse.
+"""
+import copy
+import json
+from datetime import datetime
+
+from prompts import PATCH_PROFILE
+
+SECTIONS = ('conditions', 'demographics', 'vitals_biometrics', 'functional_scores', 'medications', 'devices',
+            'behavioral_factors', 'infectious_history')
+
+
+class PatchError(ValueError):
+    pass
+
+
+def format_updates(updates):
+    return "\n".join(f"{k}: {v}" for k, v in updates.items())
+
+
+def parse_patch(patch):
+    """`(changes, alerts)` from a model reply; alerts may be None. Raises PatchError."""
+    if not isinstance(patch, dict):
+        raise PatchError("patch is not an object")
+    if patch.get('needs_full_reparse') is True:
+        raise PatchError("model asked for a full re-parse")
+    changes = []
+    for change in patch.get('changes') or []:
+        if not isinstance(change, dict) or not isinstance(change.get('path'), str) or 'value' not in change:
+            raise PatchError(f"malformed change: {change!r}")
+        path = tuple(part for part in change['path'].strip().split('.') if part)
+        if not path or path[0] not in SECTIONS:
+            raise PatchError(f"unknown section in path {change['path']!r}")
+        changes.append((path, change['value']))
+    alerts = patch.get('alerts')
+    if alerts is not None and not isinstance(alerts, list):
+        raise PatchError("alerts is not a list")
+    return changes, alerts
+
+
+def apply_changes(data, changes):
+    """
+    A copy of `data` with each `(path, value)` set, creating missing objects
+    on the way. Raises PatchError for a list index or a path through a list
+    or scalar, so the caller re-parses instead of overwriting the value.
+    """
+    merged = copy.deepcopy(data)
+    for path, value in changes:
+        if any(key.lstrip('-').isdigit() for key in path):
+            raise PatchError(f"list index in path {'.'.join(path)!r}")
+        node = merged
+        for key in path[:-1]:
+            if node.get(key) is None:
+                node[key] = {}
+            elif not isinstance(node[key], dict):
+                raise PatchError(f"{'.'.join(path)!r} goes through a {type(node[key]).__name__}")
+            node = node[key]
+        node[path[-1]] = value
+    return merged
+
+
+def full_provenance(data, source, at=None):
+    """Provenance for a profile written whole (parse or save): one entry per section."""
+    at = (at or datetime.utcnow()).isoformat()
+    return {key: {'source': source, 'at': at} for key in (data or {})}
+
+
+class ProfilePatcher:
+    def __init__(self, extractor, derive=None):
+        self.extractor = extractor
+        # recomputes derived fields (missing_fields) on the merged profile,
+        # given the patient narrative that use-case detection also reads
+        self.derive = derive or (lambda data, narrative=None: data)
+        self.counts = {'incremental': 0, 'full': 0, 'fallback': 0}
+
+    def prompt(self, data, updates):
+        profile_json = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+        return PATCH_PROFILE.render(profile_json=profile_json, updates=format_updates(updates))
+
+    def patch(self, data, provenance, updates, complete, narrative=None):
+        """
+        `(merged data, merged provenance, changed paths)`, or None to fall
+        back to a full re-parse. `complete(prompt)` returns the model's text;
+        `narrative` is the profile's original input, passed to `derive`.
+        """
+        if not isinstance(data, dict) or not data or not updates:
+            self.counts['fallback'] += 1
+            return None
+        try:
+            changes, alerts = parse_patch(self.extractor.extract(complete(self.prompt(data, updates))))
+            merged = apply_changes(data, changes)
+        except ValueError:  # PatchError, or no JSON object in the reply
+            self.counts['fallback'] += 1
+            return None
+
+        if alerts is not None:
+            merged['alerts'] = alerts
+        merged = self.derive(merged, narrative)
+
+        at = datetime.utcnow().isoformat()
+        entry = {'source': 'update', 'at': at, 'updates': sorted(updates)}
+        provenance = dict(provenance or {})
+        changed = ['.'.join(path) for path, _ in changes]
+        for path in changed:
+            # a section replaced whole supersedes what was recorded beneath it
+            for old in [p for p in provenance if p.startswith(path + '.')]:
+                del provenance[old]
+            provenance[path] = entry
+        for key in ('missing_fields', 'alerts'):
+            if key in merged and merged.get(key) != data.get(key):
+                provenance[key] = entry
+                changed.append(key)
+        self.counts['incremental'] += 1
+        return merged, provenance, changed
+
+    def stats(self):
+        return dict(self.counts)
@@ -0,0 +1,226 @@
+"""
+The master schema's five monitoring use cases, as data, and a local
+validator for their required history.
+
+`validate(data)` works out which use cases a parsed profile falls under
+(from the conditions, medications and filled-in fields it mentions, plus
+the original narrative when there is one) and lists
+each required field that has no usable value, with the follow-up question
+and guideline to cite. It walks the JSON once and runs a handful of
+regexes, so `/save-profile`, `/validate-profile` and the nurse chat can
+show gaps without a model call; Sonar is only asked to extract the data.
+
+Field presence is judged by key (any depth, normalized, or LOINC code), so
+`"NYHA class"`, `"nyha_class"` and `"nyhaClass"` all count. Values of
+null, "", "unknown", "n/a" or `{"value": null}` are missing.
+"""
+import re
+from collections import namedtuple
+
+Requirement = namedtuple('Requirement', 'key parameter question aliases loinc when medications guideline_ref')
+Vital = namedtuple('Vital', 'key parameter aliases loinc')
+UseCase = namedtuple('UseCase', 'key name detect guideline_ref vitals required')
+Validation = namedtuple('Validation', 'use_cases missing_fields missing_vitals')
+
+
+def requirement(key, parameter, question, aliases=(), loinc=None, when=None, medications=(),
+                guideline_ref=None):
+    """
+    `when`: regex on the profile text that must match for the field to be
+    required. `guideline_ref` defaults to the use case's.
+    """
+    return Requirement(key, parameter, question, (key,) + tuple(aliases), loinc,
+                       re.compile(when, re.I) if when else None, tuple(medications), guideline_ref)
+
+
+AGE = requirement('age', 'Age', "What is the patient's age?", ('age_years', 'dob', 'date_of_birth'),
+                  guideline_ref='Master schema')
+SEX = requirement('sex', 'Sex', "What is the patient's sex?", ('gender', 'sex_at_birth'),
+                  guideline_ref='Master schema')
+
+HF = r"heart failure|\bchf\b|\bhf(?:ref|pef)?\b|cardiomyopath|\bnyha\b"
+DIABETES = r"diabet|\bt[12]dm?\b|\ba1c\b|hba1c|insulin|metformin"
+ASTHMA = r"asthma"
+COPD = r"\bcopd\b|emphysema|chronic bronchitis"
+
+USE_CASES = (
+    UseCase('chronic', 'Chronic Disease Management (HF, DM, Asthma, COPD)',
+            re.compile('|'.join((HF, DIABETES, ASTHMA, COPD)), re.I), 'AHA 2022',
+            (Vital('weight', 'Weight', ('weight', 'body_weight'), '29463-7'),
+             Vital('hr', 'Heart rate', ('hr', 'heart_rate', 'pulse'), '8867-4'),
+             Vital('sbp', 'Systolic BP', ('sbp', 'systolic_bp', 'bp', 'blood_pressure'), '8480-6'),
+             Vital('spo2', 'SpO₂', ('spo2', 'oxygen_saturation'), '59408-5'),
+             Vital('glucose', 'Glucose', ('glucose', 'blood_glucose'), '2339-0')),
+            (AGE, SEX,
+             requirement('nyha_class', 'NYHA class', "What is the patient's NYHA functional class (I–IV)?",
+                         ('nyha', 'nyha_functional_class'), when=HF, guideline_ref='AHA 2022'),
+             requirement('a1c', 'A1c', "What is the patient's most recent HbA1c (%)?",
+                         ('hba1c', 'hemoglobin_a1c'), loinc='4548-4', when=DIABETES, guideline_ref='ADA 2025'),
+             requirement('diabetes_medications', 'Diabetes medications',
+                         "Which diabetes medications is the patient taking (drug, dose)?",
+                         ('diabetes_meds',), when=DIABETES, guideline_ref='ADA 2025',
+                         medications=('metformin', 'insulin', 'glipizide', 'glyburide', 'glimepiride',
+                                      'sitagliptin', 'linagliptin', 'empagliflozin', 'dapagliflozin',
+                                      'canagliflozin', 'semaglutide', 'liraglutide', 'dulaglutide',
+                                      'tirzepatide', 'pioglitazone')),
+             requirement('asthma_severity', 'Asthma severity',
+                         "What is the patient's asthma severity or GINA step?",
+                         ('gina_step', 'asthma_control'), when=ASTHMA, guideline_ref='GINA 2024'),
+             requirement('gold_stage', 'GOLD stage', "What is the patient's COPD GOLD stage/grade?",
+                         ('gold', 'gold_grade', 'copd_stage'), when=COPD, guideline_ref='GOLD 2023'))),
+    UseCase('post_op', 'Post-Operative Recovery',
+            re.compile(r"post[- ]?op|surg|[a-z]ectomy|otomy\b|arthroplasty|\bcabg\b|\bprocedure\b", re.I),
+            'ERAS 2025',
+            (Vital('hr', 'Heart rate', ('hr', 'heart_rate', 'pulse'), '8867-4'),
+             Vital('sbp', 'Systolic BP', ('sbp', 'systolic_bp', 'bp', 'blood_pressure'), '8480-6'),
+             Vital('temp', 'Temperature', ('temp', 'temperature', 'body_temperature'), '8310-5')),
+            (requirement('procedure_type', 'Procedure type', "What procedure did the patient have, and when?",
+                         ('procedure', 'surgery', 'surgery_type', 'surgical_procedure')),
+             requirement('vte_risk', 'VTE risk', "What is the patient's VTE risk (e.g. Caprini score)?",
+                         ('caprini_score', 'vte_risk_score', 'dvt_risk')),
+             requirement('opioid_regimen', 'Opioid regimen', "What opioid regimen is the patient on, if any?",
+                         ('opioids', 'analgesia', 'pain_regimen'),
+                         medications=('oxycodone', 'hydrocodone', 'morphine', 'tramadol', 'hydromorphone',
+                                      'fentanyl', 'codeine', 'tapentadol')))),
+    UseCase('oncology', 'Oncology Monitoring',
+            re.compile(r"cancer|oncolog|tumou?r|carcinoma|lymphoma|leuk[ae]mia|myeloma|sarcoma|chemo"
+                       r"|metasta|immunotherapy|neutropeni", re.I),
+            'ASCO 2024',
+            (Vital('temp', 'Temperature', ('temp', 'temperature', 'body_temperature'), '8310-5'),
+             Vital('weight', 'Weight', ('weight', 'body_weight'), '29463-7')),
+            (requirement('anc', 'ANC', "What is the patient's latest absolute neutrophil count?",
+                         ('absolute_neutrophil_count',), loinc='751-8'),
+             requirement('cancer_stage', 'Cancer stage', "What is the cancer type and stage?",
+                         ('stage', 'tnm_stage', 'tumor_stage')),
+             requirement('ici_use', 'ICI use', "Is the patient receiving immune checkpoint inhibitors?",
+                         ('immune_checkpoint_inhibitor', 'immunotherapy', 'checkpoint_inhibitor'),
+                         medications=('pembrolizumab', 'nivolumab', 'ipilimumab', 'atezolizumab',
+                                      'durvalumab', 'avelumab', 'cemiplimab', 'dostarlimab')))),
+    UseCase('maternal', 'Maternal-Fetal Monitoring',
+            re.compile(r"pregnan|gestation|prenatal|antenatal|fetal|foetal|obstetric|pre-?eclampsia"
+                       r"|\bg\d\s*p\d", re.I),
+            'ACOG/AHRQ Maternal RPM 2025',
+            (Vital('sbp', 'Systolic BP', ('sbp', 'systolic_bp', 'bp', 'blood_pressure'), '8480-6'),
+             Vital('fetal_hr', 'Fetal heart rate', ('fetal_hr', 'fhr', 'fetal_heart_rate'), '56085-1')),
+            (requirement('gestational_age', 'Gestational age', "What is the current gestational age (weeks)?",
+                         ('ga', 'gestation', 'weeks_gestation', 'gestational_age_weeks'), loinc='18185-9'),
+             requirement('preeclampsia_risk', 'Pre-eclampsia risk',
+                         "What is the patient's pre-eclampsia risk (risk factors, aspirin prophylaxis)?",
+                         ('pre_eclampsia_risk', 'preeclampsia_risk_factors')))),
+    UseCase('substance', 'Substance Use',
+            re.compile(r"alcohol|\betoh\b|\baud\b|substance use|naltrexone|drinking|\baudit\b", re.I),
+            'SOBRsafe EtOH Validation',
+            (Vital('tac', 'Transdermal EtOH', ('tac', 'transdermal_alcohol', 'transdermal_etoh'), None),
+             Vital('hr', 'Heart rate', ('hr', 'heart_rate', 'pulse'), '8867-4')),
+            (requirement('audit_score', 'AUDIT score', "What is the patient's AUDIT score?",
+                         ('audit', 'audit_c', 'audit_total'), loinc='75624-7'),
+             requirement('naltrexone_use', 'Naltrexone use', "Is the patient taking naltrexone?",
+                         ('naltrexone',), medications=('naltrexone', 'vivitrol')))),
+)
+
+_MISSING_TEXT = {'', 'unknown', 'null', 'none', 'n/a', 'na', 'not available', 'not documented'}
+
+
+def _normalize(key):
+    key = re.sub(r"([a-z])([A-Z])", r"\1_\2", str(key)).lower().replace('₂', '2')
+    return re.sub(r"[^a-z0-9]+", "_", key).strip('_')
+
+
+def has_value(value):
+    if value is None or isinstance(value, bool) and value is False:
+        return value is False  # an explicit "no" answers the question
+    if isinstance(value, str):
+        return value.strip().lower() not in _MISSING_TEXT
+    if isinstance(value, dict):
+        if 'value' in value:
+            return has_value(value['value'])
+        return any(has_value(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(has_value(v) for v in value)
+    return True
+
+
+class _Index:
+    """One walk over the profile: normalized key -> values, LOINC -> values, and searchable text."""
+
+    def __init__(self, data):
+        self.keys = {}
+        self.loinc = {}
+        text = []
+        self._walk(data, text)
+        self.text = "\n".join(text)
+        meds = data.get('medications') if isinstance(data, dict) else None
+        med_text = []
+        self._walk(meds, med_text)
+        self.medication_text = "\n".join(med_text).lower()
+
+    def _walk(self, node, text):
+        if isinstance(node, dict):
+            if node.get('loinc'):
+                self.loinc.setdefault(str(node['loinc']), []).append(node)
+            for key, value in node.items():
+                if key in ('missing_fields', 'alerts'):
+                    continue  # the previous gaps list says nothing about the patient
+                self.keys.setdefault(_normalize(key), []).append(value)
+                if has_value(value) and not isinstance(value, (dict, list)):
+                    # a filled key ("a1c: 8.1") is evidence too
+                    text.append(f"{str(key).replace('_', ' ')} {value}")
+                self._walk(value, text)
+        elif isinstance(node, list):
+            for item in node:
+                self._walk(item, text)
+        elif isinstance(node, str):
+            text.append(node)
+
+    def present(self, req):
+        for alias in req.aliases:
+            if any(has_value(v) for v in self.keys.get(alias, ())):
+                return True
+        if req.loinc and any(has_value(v) for v in self.loinc.get(req.loinc, ())):
+            return True
+        return any(term in self.medication_text for term in req.medications)
+
+    def vital_present(self, vital):
+        return (any(has_value(v) for alias in vital.aliases for v in self.keys.get(alias, ()))
+                or bool(vital.loinc and any(has_value(v) for v in self.loinc.get(vital.loinc, ()))))
+
+
+def validate(data, narrative=None):
+    """The use cases `data` (and its source `narrative`) fall under and what each still needs."""
+    index = _Index(data if isinstance(data, dict) else {})
+    if narrative:
+        index.text += "\n" + narrative
+    cases, missing, vitals, seen = [], [], [], set()
+    for case in USE_CASES:
+        if not case.detect.search(index.text):
+            continue
+        cases.append(case.key)
+        for req in case.required:
+            if req.key in seen or (req.when and not req.when.search(index.text)) or index.present(req):
+                continue
+            seen.add(req.key)
+            entry = {'parameter': req.parameter, 'question': req.question,
+                     'guideline_ref': req.guideline_ref or case.guideline_ref,
+                     'use_case': case.key, 'source': 'schema'}
+            if req.loinc:
+                entry['loinc'] = req.loinc
+            missing.append(entry)
+        for vital in case.vitals:
+            if vital.key not in seen and not index.vital_present(vital):
+                seen.add(vital.key)
+                vitals.append({'parameter': vital.parameter, 'loinc': vital.loinc, 'use_case': case.key})
+    return Validation(cases, missing, vitals)
+
+
+def fill_missing_fields(data, narrative=None):
+    """
+    A copy of `data` with `missing_fields` from the schema; `data` itself is
+    not changed. A profile that matches no use case keeps whatever list it
+    already had.
+    """
+    if not isinstance(data, dict):
+        return data
+    result = validate(data, narrative)
+    if not result.use_cases:
+        return data
+    return {**data, 'missing_fields': result.missing_fields}
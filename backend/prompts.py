@@ -0,0 +1,281 @@
+"""
+Prompt templates for the Sonar routes.
+
+Templates are split into literal text and slots once, at import, with the
+master schema baked in; a request only fills the remaining slots. The
+patient's profile JSON, the largest part of every chat prompt, is
+serialized once per saved profile version (`PatientProfile.updated_at`)
+and reused across turns.
+"""
+import json
+from string import Formatter
+from textwrap import indent
+
+try:
+    import orjson  # optional, not in requirements.txt
+except ImportError:
+    orjson = None
+
+
+def dumps_indented(data):
+    """
+    The profile as indented JSON for a prompt. Without orjson this is
+    exactly `json.dumps(data, indent=2)`, as the prompts were built before.
+    orjson's text is equivalent JSON but not the same bytes: non-ASCII is
+    written raw (`SpO₂`, not `SpO\\u2082`) and floats in shortest form
+    (`1e20`, not `1e+20`).
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode('utf-8')
+        except TypeError:
+            pass  # non-string keys or integers past 64 bits
+    return json.dumps(data, indent=2)
+
+
+class PromptTemplate:
+    """Text with `{slot}` placeholders; `static` slots are filled in at compile time."""
+
+    def __init__(self, text, **static):
+        self.parts = []  # literal, slot, literal, ..., slot, literal
+        literal = []
+        for text_part, slot, _, _ in Formatter().parse(text):
+            literal.append(text_part)
+            if slot is None:
+                continue
+            if slot in static:
+                literal.append(static[slot])
+            else:
+                self.parts += [''.join(literal), slot]
+                literal = []
+        self.parts.append(''.join(literal))
+        self.slots = tuple(self.parts[1::2])
+
+    def render(self, **values):
+        parts = list(self.parts)
+        parts[1::2] = [values[slot] for slot in self.slots]
+        return ''.join(parts)
+
+
+class ProfileContextCache:
+    """Indented profile JSON keyed by `(profile id, updated_at)`, so saves never serve stale text."""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+
+    def profile_json(self, profile):
+        """`profile` is a `ProfileRef` (or None when the patient has no saved profile)."""
+        if profile is None:
+            return '{}'
+        key = (profile.id, profile.updated_at)
+        text = self.cache.get(key)
+        if text is not None:
+            self.hits += 1
+            return text
+        self.misses += 1
+        text = dumps_indented(profile.data)
+        self.cache.set(key, text)
+        return text
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self.cache),
+        }
+
+
+MASTER_SCHEMA = '''# 🧾 MASTER PROFILE REQUIREMENTS
+
+1. **Chronic Disease Management (HF, DM, Asthma, COPD)**
+   - Core Vital/Biometric Inputs (sensor ➜ LOINC): 
+     • Weight ➜ 29463-7 
+     • HR/SBP/DBP ➜ 8867-4 / 8480-6 / 8462-4 
+     • SpO₂ ➜ 59408-5 
+     • Glucose ➜ 2339-0 
+   - Required History: 
+     • Age, sex 
+     • NYHA class 
+     • A1c & diabetes meds 
+     • Asthma severity / GOLD stage 
+   - Alert Thresholds: 
+     • SpO₂ < 88% (GOLD 2023) 
+     • Weight ↑ >2kg/3d (AHA 2022) 
+     • A1c > 9% (ADA 2025)
+   - Evidence: [1][2][3][4]
+
+2. **Post-Operative Recovery**
+   - Core Vitals:
+     • HR ➜ 8867-4 
+     • BP ➜ 8480-6 
+     • Temp ➜ 8310-5 
+   - Required History:
+     • Procedure type 
+     • VTE risk 
+     • Opioid regimen 
+   - Alert:
+     • Temp >38.5°C 
+     • SBP <90 mmHg 
+   - Evidence: [5]
+
+3. **Oncology Monitoring**
+   - Inputs:
+     • Temp ➜ 8310-5 
+     • Weight ➜ 29463-7 
+   - Required:
+     • ANC, cancer stage, ICI use 
+   - Alert:
+     • Temp ≥38°C + ANC <500 
+   - Evidence: [6]
+
+4. **Maternal-Fetal Monitoring**
+   - Inputs:
+     • BP ➜ 8480-6 
+     • FHR ➜ 56085-1 
+   - Required:
+     • Gestational age, pre-eclampsia risk 
+   - Alert:
+     • BP ≥140/90, FHR <110/>160 
+   - Evidence: [8]
+
+5. **Substance Use**
+   - Inputs:
+     • Transdermal EtOH, HR ➜ 8867-4 
+   - Required:
+     • AUDIT score, naltrexone use 
+   - Alert:
+     • TAC ≥0.02% 
+   - Evidence: [21]
+
+# 📚 Sources
+1. AHA 2022 HF - doi:10.1161/CIR.0000000000001063
+2. ADA 2025 - https://diabetesjournals.org/care/article/48/Supplement_1/S6
+3. GINA 2024 - https://ginasthma.org
+4. GOLD 2023 - https://goldcopd.org
+5. ERAS 2025 - https://erassociety.org
+6. ASCO 2024 - https://connectwithcare.org
+8. ACOG/AHRQ Maternal RPM 2025
+21. SOBRsafe EtOH Validation - https://ir.sobrsafe.com
+
+'''
+
+PATIENT_CONTEXT = PromptTemplate('''Here is your FULL PROFILE (JSON):
+```json
+{profile_json}
+```
+
+- Name: {name}
+''')
+
+PARSE_PROFILE = PromptTemplate('''
+    You are a clinical AI assistant designed to extract structured patient data from free-text clinical summaries and updates. You must extract relevant information and validate it against condition-specific monitoring schemas.
+
+    Use the following **master schema** derived from 2025 clinical guidelines (AHA, ADA, GINA, GOLD, etc.). For each use case, there are:
+    - Core vital/biometric requirements (with LOINC references)
+    - Mandatory patient-history elements
+    - Recommended alert/trigger thresholds
+    - Primary guideline source citations
+
+    Do NOT fabricate data. Missing required fields are checked against the schema by the application; only extract what the input states.
+
+    ---
+
+{master_schema}    ---
+
+    ## TASK
+
+    Analyze the following input (which may contain both the original summary and follow-up updates).
+    If there is any follow up updates, you should act like a chatbot considering the response you gave earlier and new responses from the careteam and respond accordingly:
+
+    """{input_text}"""
+
+    1. Extract valid clinical information and incorporate new updates into the existing structure.
+    2. Preserve previously valid data if still applicable.
+    3. Return the updated JSON structured profile.
+
+    Output a single raw JSON object with:
+    - conditions (list of active diagnoses, procedures, pregnancy or substance-use history as stated)
+    - demographics
+    - vitals_biometrics (with LOINC)
+    - functional_scores
+    - medications
+    - devices
+    - behavioral_factors
+    - infectious_history
+    - alerts (trigger violations)
+
+    Use null for unknown values. Do not fabricate.
+    ''', master_schema=indent(MASTER_SCHEMA, '    '))
+
+PATCH_PROFILE = PromptTemplate('''
+    You are a clinical AI assistant maintaining a patient's structured profile. The care team has sent new information; change only what it changes.
+
+    CURRENT PROFILE (JSON):
+    {profile_json}
+
+    NEW INFORMATION FROM THE CARE TEAM:
+    """{updates}"""
+
+    Output a single raw JSON object with:
+    - changes: list of {{"path": "<section>.<field>", "value": <new value>}} for every field the new information sets or corrects. Sections: conditions, demographics, vitals_biometrics (values as {{"value", "unit", "loinc"}}), functional_scores, medications, devices, behavioral_factors, infectious_history. A path may be just a section to replace it whole (e.g. the medications list).
+    - alerts: the complete updated list of trigger violations
+    - needs_full_reparse: true only if the new information contradicts so much of the profile that it must be rebuilt
+
+    Do not repeat unchanged fields. Use null for unknown values. Do not fabricate.
+    ''')
+
+SONAR_CHAT = PromptTemplate('''
+You are SonarCare, a patient‐facing clinical assistant.  You have the patient’s full JSON profile above.
+Use only trusted, up‐to‐date medical guidelines and case studies that physicians rely on.
+Answer in clear, empathetic language (3–4 sentences) and always include a **Sources:** section at the end.
+
+---
+{patient_context}
+
+**Chat so far:**  
+{convo}
+
+**Your response:**
+''')
+
+BORED_CHAT = PromptTemplate('''
+You are a friendly AI assistant for bored patients. When patients are bored or anxious, you teach them fun, useful, or health-related facts in simple terms.
+Keep the conversation appropriate.
+
+{patient_context}
+
+**Chat so far:**  
+{convo}
+
+**Your response (keep it friendly and under 5 sentences, cite sources if needed):**
+''')
+
+NURSE_CHAT = PromptTemplate('''
+You are a **nurse triage assistant**.  You must use only trusted clinical guidelines, case-studies and the master schema to:
+  1. Review this patient’s JSON profile against the Master schema (AHA, ADA, GINA, GOLD…).
+  2. Identify alerts (e.g. weight gain, hypoxemia, A1c thresholds).
+  3. Answer the nurse’s actual question below *in context* of this patient.
+  
+  Master Schema:
+  {master_schema}---
+
+**PATIENT PROFILE (full JSON):**
+```json
+{profile_json}
+MISSING REQUIRED FIELDS (already checked against the schema):
+{missing_fields}
+CHAT SO FAR:
+{convo}
+When you reply:
+
+Don’t echo the nurse’s question verbatim.
+
+Do be concise and end with a “Sources:” list.
+
+If the missing required fields matter to the question, include them as follow-up questions.
+Nurse’s question →
+''', master_schema=MASTER_SCHEMA)
@@ -0,0 +1,156 @@
+import json
+import os
+import queue
+import threading
+import time
+
+from app_logging import get_logger
+
+try:
+    import redis
+except ImportError:  # only needed for the cross-process broker
+    redis = None
+
+log = get_logger('pubsub')
+
+
+class Subscription:
+    """One connected client. Messages queue up until its stream reads them."""
+
+    def __init__(self, hub, channel, max_pending):
+        self.hub = hub
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def get(self, timeout):
+        """Next `(event, data)`, or None if nothing arrived within `timeout`."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class Hub:
+    """
+    In-process fan-out from a channel to every subscription on it.
+
+    Delivery never blocks the publisher: each subscription has a bounded
+    queue, and a client that falls that far behind is marked overflowed so
+    its stream ends and the client reconnects and catches up over HTTP.
+    """
+
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        sub = Subscription(self, channel, self.max_pending)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._channels.get(sub.channel)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._channels[sub.channel]
+
+    def deliver(self, channel, event, data):
+        with self._lock:
+            subs = list(self._channels.get(channel, ()))
+        for sub in subs:
+            try:
+                sub.queue.put_nowait((event, data))
+            except queue.Full:
+                sub.overflowed = True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'channels': len(self._channels),
+                'subscribers': sum(len(s) for s in self._channels.values()),
+            }
+
+
+class MemoryBroker:
+    """Publishes straight into the local hub (single process, tests)."""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def start(self):
+        pass
+
+    def publish(self, channel, event, data):
+        self.hub.deliver(channel, event, data)
+
+
+class RedisBroker:
+    """
+    Publishes through Redis pub/sub so subscribers connected to any worker
+    process receive the event; a background listener feeds the local hub.
+    If the Redis connection drops, the listener logs it and resubscribes
+    with exponential backoff; events published while it is down are lost.
+    """
+
+    PREFIX = 'triagenow:'
+
+    def __init__(self, hub, url, min_backoff=0.5, max_backoff=30.0):
+        if redis is None:
+            raise RuntimeError("redis package is not installed")
+        self.hub = hub
+        self._client = redis.Redis.from_url(url)
+        self._listener = None
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+    def _listen(self):
+        delay = self.min_backoff
+        while True:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(self.PREFIX + '*')
+                delay = self.min_backoff
+                for message in pubsub.listen():
+                    self._deliver(message)
+                log.warning("Redis pub/sub stream ended; resubscribing in %.1fs", delay)
+            except Exception:
+                log.exception("Redis pub/sub listener failed; resubscribing in %.1fs", delay)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_backoff)
+
+    def _deliver(self, message):
+        # one malformed message must not take the listener down
+        try:
+            channel = message['channel'].decode('utf-8')[len(self.PREFIX):]
+            payload = json.loads(message['data'])
+            self.hub.deliver(channel, payload['event'], payload['data'])
+        except Exception:
+            log.exception("Dropping malformed pub/sub message %r", message)
+
+    def start(self):
+        # started lazily so each pre-forked worker runs its own listener
+        if self._listener is None:
+            self._listener = threading.Thread(target=self._listen, name='redis-broker', daemon=True)
+            self._listener.start()
+
+    def publish(self, channel, event, data):
+        self._client.publish(self.PREFIX + channel,
+                             json.dumps({'event': event, 'data': data}, default=str))
+
+
+def create_broker(hub):
+    url = os.getenv('PUBSUB_REDIS_URL')
+    return RedisBroker(hub, url) if url else MemoryBroker(hub)
@@ -0,0 +1,143 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app_logging import get_logger
+
+try:
+    import redis
+except ImportError:  # shared tier is optional
+    redis = None
+
+log = get_logger('cache')
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially re-formatted input hashes the same."""
+    return " ".join(text.split())
+
+
+def cache_key(namespace, model, text):
+    digest = hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+class MemoryCache:
+    """Bounded in-process LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries=512, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache:
+    """Shared tier so every worker process sees the same entries."""
+
+    def __init__(self, url, ttl=3600):
+        if redis is None:
+            raise RuntimeError("redis package is not installed")
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value):
+        self._client.set(key, json.dumps(value), ex=self.ttl)
+
+    def delete(self, key):
+        self._client.delete(key)
+
+
+class ResponseCache:
+    """
+    Two-tier cache for JSON-serializable LLM results: the in-process LRU is
+    checked first, then the optional shared backend (hits there are copied
+    into the local tier). Values are deep-copied on the way out so callers
+    can mutate what they get back.
+    """
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls):
+        ttl = int(os.getenv("PROFILE_CACHE_TTL", 3600))
+        local = MemoryCache(max_entries=int(os.getenv("PROFILE_CACHE_SIZE", 512)), ttl=ttl)
+        redis_url = os.getenv("PROFILE_CACHE_REDIS_URL")
+        shared = RedisCache(redis_url, ttl=ttl) if redis_url else None
+        return cls(local, shared)
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                log.warning("shared cache read failed: %s", e)
+                value = None
+            if value is not None:
+                self.local.set(key, value)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        value = copy.deepcopy(value)
+        self.local.set(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value)
+            except Exception as e:
+                log.warning("shared cache write failed: %s", e)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.local),
+        }
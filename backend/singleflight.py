@@ -0,0 +1,146 @@
+"""
+Single-flight coalescing of identical upstream calls.
+
+When several requests need the same completion at the same time (two
+nurses opening one patient), only the first caller runs the upstream call;
+the others wait for it and share the result, or, for streams, replay its
+chunks from the start and then follow along live. Nothing is cached once
+the call finishes; that is `ResponseCache`'s job.
+
+Only `threading` primitives are used, which `gevent.monkey.patch_all()`
+turns into greenlet-aware ones, so a waiting caller just yields.
+"""
+import copy
+import hashlib
+import threading
+
+
+def flight_key(*parts):
+    return hashlib.sha256("\0".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.followers = 0
+        self.result = None
+        self.error = None
+
+
+class _Broadcast:
+    """Chunks from one upstream stream, replayed to every reader."""
+
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    def pump(self, chunks, on_finish):
+        try:
+            for chunk in chunks:
+                with self.cond:
+                    self.chunks.append(chunk)
+                    self.cond.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            on_finish()
+            with self.cond:
+                self.finished = True
+                self.cond.notify_all()
+
+    def reader(self):
+        seen = 0
+        while True:
+            with self.cond:
+                while seen == len(self.chunks) and not self.finished:
+                    self.cond.wait()
+                batch = self.chunks[seen:]
+                seen = len(self.chunks)
+                finished, error = self.finished, self.error
+            yield from batch
+            if finished:
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """
+        Return `fn()`, running it once for all concurrent callers with the
+        same `key`. Followers get a deep copy and see the leader's exception
+        if it failed.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+            else:
+                call.followers += 1
+                self.shared += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = fn()
+        except BaseException as e:
+            # a killed leader greenlet must not take its followers down with it
+            call.error = e if isinstance(e, Exception) else RuntimeError("Coalesced call was interrupted")
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]  # later callers start a fresh call
+            if call.error is None and call.followers:
+                # snapshot before the leader can mutate its copy
+                call.result = copy.deepcopy(result)
+            call.done.set()
+        return result
+
+    def stream(self, key, fn):
+        """
+        Iterate the chunks of `fn()` (an iterator), started once for all
+        concurrent callers with the same `key`. The upstream is read by a
+        background worker, so it completes even if the first caller
+        disconnects.
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is not None:
+                self.shared += 1
+                return broadcast.reader()
+            broadcast = self._streams[key] = _Broadcast()
+            self.leaders += 1
+
+        def finish():
+            with self._lock:
+                self._streams.pop(key, None)
+
+        try:
+            chunks = fn()
+        except Exception:
+            finish()
+            raise
+        threading.Thread(target=broadcast.pump, args=(chunks, finish),
+                         name='singleflight-stream', daemon=True).start()
+        return broadcast.reader()
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._calls) + len(self._streams)
+        return {'in_flight': in_flight, 'leaders': self.leaders, 'shared': self.shared}
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from singleflight import SingleFlight, flight_key
+
+DEFAULT_API_URL = "https://api.perplexity.ai/chat/completions"
+DEFAULT_MODEL = "sonar-reasoning"
+
+
+class SonarBusyError(RuntimeError):
+    """Raised when no upstream slot frees up within the queue timeout."""
+
+
+class SonarClient:
+    """
+    Shared HTTP client for every Perplexity Sonar call.
+
+    One `requests.Session` keeps TLS connections to the upstream alive and
+    pooled, every call gets explicit connect/read timeouts, and a bounded
+    semaphore caps how many calls this process has in flight at once (under
+    gevent the semaphore is greenlet-aware, so waiting callers just yield).
+    With `coalesce`, concurrent calls with the same model and prompt share a
+    single upstream request.
+    """
+
+    def __init__(self, api_key=None, api_url=DEFAULT_API_URL, pool_size=20,
+                 max_concurrency=20, connect_timeout=3.05, read_timeout=120.0,
+                 queue_timeout=30.0, connect_retries=2, coalesce=True):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self.flights = SingleFlight() if coalesce else None
+        # optional `observer(kind, seconds, usage, outcome)`, e.g. for metrics
+        self.observer = None
+
+        # Only connection failures are retried: the request never reached
+        # Sonar, so re-sending a POST cannot double-bill a completion.
+        retry = Retry(total=connect_retries, connect=connect_retries,
+                      read=0, status=0, other=0, redirect=0,
+                      backoff_factor=0.2)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                              pool_block=True, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            api_key=os.getenv("SONAR_API_KEY"),
+            api_url=os.getenv("SONAR_API_URL", DEFAULT_API_URL),
+            pool_size=int(os.getenv("SONAR_POOL_SIZE", 20)),
+            max_concurrency=int(os.getenv("SONAR_MAX_CONCURRENCY", 20)),
+            connect_timeout=float(os.getenv("SONAR_CONNECT_TIMEOUT", 3.05)),
+            read_timeout=float(os.getenv("SONAR_READ_TIMEOUT", 120)),
+            queue_timeout=float(os.getenv("SONAR_QUEUE_TIMEOUT", 30)),
+            connect_retries=int(os.getenv("SONAR_CONNECT_RETRIES", 2)),
+            coalesce=os.getenv("SONAR_COALESCE", "1") != "0",
+        )
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise SonarBusyError("Too many concurrent Sonar requests")
+
+    def _send(self, payload, stream=False):
+        resp = self.session.post(
+            self.api_url,
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            json=payload,
+            timeout=self.timeout,
+            stream=stream,
+        )
+        resp.raise_for_status()
+        return resp
+
+    def post(self, payload):
+        """POST a raw chat-completions payload and return the response."""
+        self._acquire()
+        try:
+            return self._send(payload)
+        finally:
+            self._slots.release()
+
+    def _observe(self, kind, started, usage=None, outcome="ok"):
+        if self.observer is not None:
+            self.observer(kind, time.perf_counter() - started, usage, outcome)
+
+    def chat(self, prompt, model=DEFAULT_MODEL):
+        """Send a single-turn prompt and return the decoded completion JSON."""
+        def call():
+            started = time.perf_counter()
+            try:
+                body = self.post({
+                    "model": model,
+                    "messages": [{"role": "user", "content": prompt}],
+                }).json()
+            except Exception:
+                self._observe("chat", started, outcome="error")
+                raise
+            self._observe("chat", started, body.get("usage"))
+            return body
+
+        if self.flights is None:
+            return call()
+        return self.flights.do(flight_key("chat", model, prompt), call)
+
+    def stream_chat(self, prompt, model=DEFAULT_MODEL):
+        """
+        Send a single-turn prompt with `stream: true` and iterate the decoded
+        SSE chunks as they arrive. Coalesced callers all get every chunk.
+        """
+        if self.flights is None:
+            return self._stream(prompt, model)
+        return self.flights.stream(flight_key("stream", model, prompt),
+                                   lambda: self._stream(prompt, model))
+
+    def _stream(self, prompt, model):
+        # the concurrency slot and the pooled connection are held until the
+        # generator is exhausted or closed
+        started = time.perf_counter()
+        usage, outcome = None, "error"
+        self._acquire()
+        try:
+            resp = self._send({
+                "model": model,
+                "messages": [{"role": "user", "content": prompt}],
+                "stream": True,
+            }, stream=True)
+            resp.encoding = resp.encoding or "utf-8"
+            try:
+                for line in resp.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    usage = chunk.get("usage") or usage
+                    yield chunk
+                outcome = "ok"
+            except GeneratorExit:
+                outcome = "cancelled"
+                raise
+            finally:
+                resp.close()
+        finally:
+            self._slots.release()
+            self._observe("stream", started, usage, outcome)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,132 @@
+"""
+Canned Sonar completions, and an in-process client that serves them.
+
+`fake_sonar.py` answers over HTTP with these; `StubSonarClient` answers
+without a socket at all (`SONAR_STUB=1`), for tests and offline
+development. Reasoning models (`*reasoning*`) prefix their answer with a
+`<think>` block like the real ones, so clean-up paths are exercised.
+"""
+import json
+import time
+import uuid
+
+from sonar_client import DEFAULT_MODEL
+
+CITATIONS = ["https://example.org/guideline-1", "https://example.org/guideline-2"]
+
+FAKE_PROFILE = {
+    "conditions": ["heart failure (HFrEF)"],
+    "demographics": {"age": 67, "sex": "F"},
+    "vitals_biometrics": {
+        "spo2": {"value": 91, "unit": "%", "loinc": "59408-5"},
+        "weight": {"value": 82.5, "unit": "kg", "loinc": "29463-7"},
+    },
+    "functional_scores": {"nyha_class": None},
+    "medications": ["furosemide 40mg daily"],
+    "devices": [],
+    "behavioral_factors": {},
+    "infectious_history": {},
+    "missing_fields": [
+        {"parameter": "NYHA class", "question": "What is the patient's NYHA class?",
+         "guideline_ref": "AHA 2022"}
+    ],
+    "alerts": [],
+}
+
+
+FAKE_PATCH = {
+    "changes": [{"path": "functional_scores.nyha_class", "value": "II"}],
+    "alerts": [],
+    "needs_full_reparse": False,
+}
+
+
+def is_reasoning(model):
+    return model is None or 'reasoning' in model
+
+
+def fake_answer(prompt, model=None):
+    if "CURRENT PROFILE (JSON):" in prompt:
+        body = "```json\n" + json.dumps(FAKE_PATCH, indent=2) + "\n```"
+    elif "MASTER PROFILE REQUIREMENTS" in prompt and "Output a single raw JSON object" in prompt:
+        body = "```json\n" + json.dumps(FAKE_PROFILE, indent=2) + "\n```"
+    else:
+        body = ("**Stay hydrated** and rest.\n\nIf symptoms *worsen*, contact your care team.\n"
+                "Sources:\n[1] https://example.org/guideline-1")
+    if is_reasoning(model):
+        return "<think>\nReasoning about the request...\n</think>\n" + body
+    return body
+
+
+def completion(prompt, model):
+    """A chat-completions response body for `prompt`."""
+    answer = fake_answer(prompt, model)
+    return {
+        "id": uuid.uuid4().hex,
+        "model": model,
+        "created": int(time.time()),
+        "citations": CITATIONS,
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": answer},
+        }],
+        "usage": {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(answer) // 4,
+            "total_tokens": (len(prompt) + len(answer)) // 4,
+        },
+    }
+
+
+def stream_chunks(answer, model, piece=8, delay=0.0):
+    """Streaming chunks for `answer`, `piece` characters each, `delay` seconds apart."""
+    completion_id = uuid.uuid4().hex
+    for i in range(0, len(answer), piece):
+        if delay:
+            time.sleep(delay)
+        yield {
+            "id": completion_id,
+            "model": model,
+            "citations": CITATIONS,
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop" if i + piece >= len(answer) else None,
+                "delta": {"role": "assistant", "content": answer[i:i + piece]},
+            }],
+        }
+
+
+class StubSonarClient:
+    """Drop-in for `SonarClient` that answers from `fake_answer` in process."""
+
+    def __init__(self, latency=0.0, token_delay=0.0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.flights = None
+        self.observer = None
+        self.calls = {}  # model -> completions served
+
+    def _observe(self, kind, started, usage=None, outcome="ok"):
+        if self.observer is not None:
+            self.observer(kind, time.perf_counter() - started, usage, outcome)
+
+    def chat(self, prompt, model=DEFAULT_MODEL):
+        started = time.perf_counter()
+        self.calls[model] = self.calls.get(model, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+        body = completion(prompt, model)
+        self._observe("chat", started, body["usage"])
+        return body
+
+    def stream_chat(self, prompt, model=DEFAULT_MODEL):
+        started = time.perf_counter()
+        self.calls[model] = self.calls.get(model, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+        yield from stream_chunks(fake_answer(prompt, model), model, delay=self.token_delay)
+        self._observe("stream", started)
+
+    def close(self):
+        pass
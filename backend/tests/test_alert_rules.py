@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import pytest
+
+from alert_rules import _number, checked_rules, evaluate, merge_alerts, patient_readings
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('HbA1c 9.5%', 9.5),
+    ('SpO2 86', 86),
+    ('SpO₂: 91 % on 2L', 91),
+    ('A1c: 7.2 (was 8.1)', 7.2),
+    ('101F', 101),
+    ('38.6 °C', 38.6),
+    ('ANC 450 cells/µL', 450),
+    ('weight -1.5 kg', -1.5),
+    ({'value': '88%', 'unit': '%'}, 88),
+    (92, 92),
+    ('unknown', None),
+    (None, None),
+])
+def test_number_reads_the_value_not_the_label(text, expected):
+    assert _number(text) == expected
+
+
+def parameters(alerts):
+    return {a['parameter'] for a in alerts}
+
+
+def test_scoped_rules_only_run_for_their_use_case():
+    readings = patient_readings(SimpleNamespace(spo2=86, bp='150/95', temp=39.0))
+    assert parameters(evaluate(readings, ['chronic'])) == {'SpO₂'}
+    assert parameters(evaluate(readings, ['maternal'])) == {'SpO₂', 'Blood pressure'}
+    assert parameters(evaluate(readings, ['post_op'])) == {'SpO₂', 'Temperature'}
+    assert parameters(evaluate(readings)) == {'SpO₂'}
+
+
+def test_profile_strings_feed_thresholds():
+    readings = patient_readings(profile_data={'labs': {'HbA1c': 'HbA1c 9.5%'},
+                                              'vitals_biometrics': {'spo2': 'SpO2 86'}})
+    assert readings['a1c'] == 9.5 and readings['spo2'] == 86
+    assert parameters(evaluate(readings, ['chronic'])) == {'SpO₂', 'A1c'}
+
+
+def test_checked_rule_overrides_llm_alert_even_when_quiet():
+    readings = patient_readings(SimpleNamespace(spo2=95, bp='150/95'))
+    llm = [{'parameter': 'SpO2', 'value': 85}, {'parameter': 'Blood pressure', 'value': '150/95'},
+           {'parameter': 'Edema', 'value': '2+'}]
+    merged = merge_alerts(evaluate(readings, ['chronic']), llm, checked_rules(readings, ['chronic']))
+    # SpO₂ was measured and is fine; BP is not a chronic rule, so the model's alert stays
+    assert parameters(merged) == {'Blood pressure', 'Edema'}
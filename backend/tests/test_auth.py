@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask, jsonify
+
+from auth import SessionTokens
+
+
+@pytest.fixture
+def client():
+    versions = {1: 0}
+    tokens = SessionTokens(secret='test', version_of=versions.get)
+    app = Flask(__name__)
+    tokens.init_app(app)
+
+    @app.route('/admin')
+    @tokens.required('admin')
+    def admin():
+        return jsonify({'ok': True})
+
+    @app.route('/session')
+    @tokens.required()
+    def session():
+        return jsonify({'ok': True})
+
+    admin_user = SimpleNamespace(id=1, username='ada', role='admin', token_version=0)
+    client = app.test_client()
+    client.versions, client.tokens = versions, tokens
+    client.headers = {'Authorization': f"Bearer {tokens.issue(admin_user)}"}
+    return client
+
+
+def test_current_token_reaches_role_restricted_routes(client):
+    assert client.get('/admin', headers=client.headers).status_code == 200
+
+
+def test_role_change_revokes_the_old_token_at_once(client):
+    client.versions[1] = 1  # what /update-role does
+    resp = client.get('/admin', headers=client.headers)
+    assert resp.status_code == 401
+    assert client.tokens.stats()['revoked'] == 1
+    # routes open to any session check the signature only
+    assert client.get('/session', headers=client.headers).status_code == 200
+
+
+def test_deleted_user_is_refused(client):
+    del client.versions[1]
+    assert client.get('/admin', headers=client.headers).status_code == 401
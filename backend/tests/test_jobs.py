@@ -0,0 +1,85 @@
+import pytest
+
+from jobs import FAILED, SUCCEEDED, DatabaseJobQueue, InProcessJobQueue
+
+
+def run(queue, kind, payload=None):
+    job = queue.enqueue(kind, payload or {})
+    return queue.wait(job.id, timeout=5)
+
+
+def test_transient_errors_are_retried():
+    calls = []
+
+    def flaky(payload):
+        calls.append(1)
+        if len(calls) < 2:
+            raise RuntimeError("upstream busy")
+        return {'ok': True}
+
+    queue = InProcessJobQueue(workers=1, retry_backoff=0.01)
+    queue.register('flaky', flaky)
+    job = run(queue, 'flaky')
+    assert (job.status, job.attempts, job.result) == (SUCCEEDED, 2, {'ok': True})
+
+
+@pytest.mark.parametrize('error', [ValueError("Missing input text"), LookupError("No saved profile")])
+def test_permanent_errors_fail_at_once(error, caplog):
+    def handler(payload):
+        raise error
+
+    queue = InProcessJobQueue(workers=1, retry_backoff=0.01)
+    queue.register('bad', handler)
+    job = run(queue, 'bad')
+    assert (job.status, job.attempts, job.error) == (FAILED, 1, str(error))
+    assert queue.metrics()['retried'] == 0
+    assert any(r.exc_info and r.exc_info[1] is error for r in caplog.records)
+
+
+@pytest.fixture
+def app_context(tmp_path):
+    from flask import Flask
+    from models import db
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'jobs.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app.app_context
+
+
+def test_database_jobs_are_visible_to_every_process(app_context):
+    # two queues on one database stand in for two worker processes
+    accepting = DatabaseJobQueue(workers=1, context=app_context, poll_interval=0.05)
+    other = DatabaseJobQueue(workers=1, context=app_context, poll_interval=0.05)
+    for queue in (accepting, other):
+        queue.register('echo', lambda payload: {'echo': payload['n']})
+
+    job = accepting.enqueue('echo', {'n': 1}, key='echo:1')
+    assert accepting.enqueue('echo', {'n': 1}, key='echo:1').id == job.id
+    polled = other.wait(job.id, timeout=5)
+    assert (polled.status, polled.attempts, polled.result) == (SUCCEEDED, 1, {'echo': 1})
+    assert other.get('missing') is None
+
+
+def test_database_jobs_retry_and_fail_permanent_errors_at_once(app_context):
+    calls = []
+
+    def flaky(payload):
+        calls.append(1)
+        if len(calls) < 2:
+            raise RuntimeError("upstream busy")
+        return {'ok': True}
+
+    def bad(payload):
+        raise LookupError("No saved profile")
+
+    queue = DatabaseJobQueue(workers=1, retry_backoff=0.01, context=app_context, poll_interval=0.05)
+    queue.register('flaky', flaky)
+    queue.register('bad', bad)
+    job = run(queue, 'flaky')
+    assert (job.status, job.attempts, job.result) == (SUCCEEDED, 2, {'ok': True})
+    job = run(queue, 'bad')
+    assert (job.status, job.attempts, job.error) == (FAILED, 1, "No saved profile")
+    assert queue.metrics()['retried'] == 1
@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+from metrics import AppMetrics
+
+
+@pytest.fixture
+def metrics():
+    metrics = AppMetrics()
+    metrics.init_app(Flask(__name__))
+    metrics.observed = []
+    # the listeners are engine-wide, so leave out other tests' background threads
+    test_thread = threading.get_ident()
+
+    def observe(seconds, *labels):
+        if threading.get_ident() == test_thread:
+            metrics.observed.append(seconds)
+
+    metrics.queries.observe = observe
+    yield metrics
+    event.remove(Engine, 'before_cursor_execute', metrics._before_query)
+    event.remove(Engine, 'after_cursor_execute', metrics._after_query)
+
+
+def test_failed_queries_are_not_recorded(metrics):
+    engine = create_engine('sqlite://')
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM missing'))
+        conn.execute(text('SELECT 1'))
+    assert len(metrics.observed) == 1
+
+
+def test_interleaved_failure_does_not_skew_the_other_statement(metrics):
+    engine = create_engine('sqlite://')
+
+    # the outer statement starts, then an inner one fails on the same
+    # connection before the outer reaches the database
+    def slow_outer(conn, cursor, statement, parameters, context, executemany):
+        if 'outer' in statement:
+            time.sleep(0.2)
+            with pytest.raises(OperationalError):
+                conn.exec_driver_sql('SELECT * FROM missing')
+
+    event.listen(engine, 'before_cursor_execute', slow_outer)
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1 /* outer */'))
+    assert len(metrics.observed) == 1
+    assert metrics.observed[0] >= 0.2
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from json_extract import JSONExtractor
+from profile_patch import PatchError, ProfilePatcher, apply_changes
+from profile_schema import fill_missing_fields
+
+PROFILE = {
+    'demographics': {'age': 67},
+    'functional_scores': {'nyha_class': None},
+    'medications': ['furosemide 40mg daily', 'metoprolol 25mg bid'],
+    'alerts': [],
+}
+
+
+def reply(changes):
+    return lambda prompt: json.dumps({'changes': changes, 'alerts': []})
+
+
+def test_sets_nested_field_and_creates_objects():
+    merged = apply_changes(PROFILE, [(('functional_scores', 'nyha_class'), 'II'),
+                                     (('devices', 'pacemaker'), True)])
+    assert merged['functional_scores']['nyha_class'] == 'II'
+    assert merged['devices'] == {'pacemaker': True}
+    assert PROFILE['functional_scores']['nyha_class'] is None
+
+
+def test_replaces_list_section_whole():
+    merged = apply_changes(PROFILE, [(('medications',), ['furosemide 80mg daily'])])
+    assert merged['medications'] == ['furosemide 80mg daily']
+
+
+@pytest.mark.parametrize('path', [('medications', '1'), ('medications', 'dose'), ('demographics', 'age', 'years')])
+def test_refuses_paths_into_lists_and_scalars(path):
+    with pytest.raises(PatchError):
+        apply_changes(PROFILE, [(path, 'x')])
+
+
+def test_patch_into_medications_list_falls_back_to_full_reparse():
+    patcher = ProfilePatcher(JSONExtractor())
+    result = patcher.patch(PROFILE, {}, {'meds': 'metoprolol stopped'},
+                           reply([{'path': 'medications.1', 'value': None}]))
+    assert result is None
+    assert patcher.stats()['fallback'] == 1
+
+
+def test_patch_records_provenance():
+    patcher = ProfilePatcher(JSONExtractor())
+    merged, provenance, changed = patcher.patch(
+        PROFILE, {}, {'nyha': 'II'}, reply([{'path': 'functional_scores.nyha_class', 'value': 'II'}]))
+    assert merged['medications'] == PROFILE['medications']
+    assert changed == ['functional_scores.nyha_class']
+    assert provenance['functional_scores.nyha_class']['source'] == 'update'
+
+
+def test_missing_fields_are_derived_with_the_narrative():
+    # no `conditions` list, as in profiles parsed before the master schema:
+    # only the narrative says this is a chronic (heart failure) patient
+    profile = {key: value for key, value in PROFILE.items() if key != 'functional_scores'}
+    patcher = ProfilePatcher(JSONExtractor(), derive=fill_missing_fields)
+    merged, _, changed = patcher.patch(
+        profile, {}, {'weight': '82 kg'}, reply([{'path': 'vitals_biometrics.weight', 'value': 82}]),
+        narrative='70M with CHF, on furosemide')
+    assert any(f['parameter'] == 'NYHA class' for f in merged['missing_fields'])
+    assert 'missing_fields' in changed
@@ -0,0 +1,33 @@
+from profile_schema import fill_missing_fields, validate
+
+
+def refs(result):
+    return {m['parameter']: m['guideline_ref'] for m in result.missing_fields}
+
+
+def test_each_requirement_cites_its_own_guideline():
+    result = validate({'conditions': ['heart failure', 'type 2 diabetes', 'asthma', 'COPD']})
+    assert result.use_cases == ['chronic']
+    assert refs(result) == {
+        'Age': 'Master schema', 'Sex': 'Master schema', 'NYHA class': 'AHA 2022', 'A1c': 'ADA 2025',
+        'Diabetes medications': 'ADA 2025', 'Asthma severity': 'GINA 2024', 'GOLD stage': 'GOLD 2023',
+    }
+
+
+def test_filled_fields_and_medications_count_as_present():
+    result = validate({'conditions': ['type 2 diabetes'], 'demographics': {'age': 60, 'sex': 'M'},
+                       'labs': {'HbA1c': {'value': 8.1, 'loinc': '4548-4'}},
+                       'medications': ['metformin 500 mg bid']})
+    assert result.missing_fields == []
+
+
+def test_fill_missing_fields_leaves_the_input_alone():
+    data = {'conditions': ['pregnant'], 'missing_fields': [{'parameter': 'old'}]}
+    filled = fill_missing_fields(data)
+    assert data['missing_fields'] == [{'parameter': 'old'}]
+    assert {m['parameter'] for m in filled['missing_fields']} == {'Gestational age', 'Pre-eclampsia risk'}
+
+
+def test_profile_without_a_use_case_keeps_its_list():
+    data = {'conditions': ['seasonal allergies'], 'missing_fields': [{'parameter': 'old'}]}
+    assert fill_missing_fields(data) is data
@@ -0,0 +1,47 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pubsub
+from pubsub import Hub, RedisBroker
+
+
+class FlakyRedis:
+    """Drops the first subscription, then serves the queued messages."""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.subscriptions = 0
+
+    def pubsub(self, ignore_subscribe_messages=True):
+        self.subscriptions += 1
+        return FakePubSub(self)
+
+
+class FakePubSub:
+    def __init__(self, client):
+        self.client = client
+
+    def psubscribe(self, pattern):
+        if self.client.subscriptions == 1:
+            raise ConnectionError("Connection refused")
+
+    def listen(self):
+        yield from self.client.messages
+        threading.Event().wait()  # an idle connection
+
+    def close(self):
+        pass
+
+
+def test_listener_resubscribes_after_a_dropped_connection(monkeypatch):
+    message = {'channel': b'triagenow:alice', 'data': json.dumps({'event': 'alert', 'data': {'n': 1}})}
+    client = FlakyRedis([{'channel': b'triagenow:bob', 'data': b'not json'}, message])
+    monkeypatch.setattr(pubsub, 'redis', SimpleNamespace(Redis=SimpleNamespace(from_url=lambda url: client)))
+
+    hub = Hub()
+    sub = hub.subscribe('alice')
+    broker = RedisBroker(hub, 'redis://test', min_backoff=0.01)
+    broker.start()
+    assert sub.get(timeout=5) == ('alert', {'n': 1})
+    assert client.subscriptions == 2
@@ -0,0 +1,92 @@
+"""
+Coalescing against the slow local stub upstream (`fake_sonar.py`), whose
+`/stats` counts the requests that actually reached it.
+"""
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+import requests
+
+from sonar_client import SonarClient
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CALLERS = 10
+
+
+@pytest.fixture(scope='module')
+def upstream():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    env = dict(os.environ, FAKE_SONAR_TOKEN_DELAY='0')
+    proc = subprocess.Popen([sys.executable, 'fake_sonar.py', '--port', str(port), '--latency', '0.5'],
+                            cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            requests.get(base + '/stats', timeout=1)
+            break
+        except requests.RequestException:
+            if proc.poll() is not None or time.monotonic() > deadline:
+                proc.kill()
+                pytest.fail("fake_sonar.py did not start")
+            time.sleep(0.1)
+    yield base
+    proc.terminate()
+    proc.wait(timeout=10)
+
+
+def upstream_requests(base):
+    return requests.get(base + '/stats').json()['requests']
+
+
+def concurrently(call):
+    # threads here; under gevent's monkey patching these are the request greenlets
+    results = [None] * CALLERS
+
+    def run(i):
+        try:
+            results[i] = call()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(CALLERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=30)
+    return results
+
+
+CALLS = {
+    'chat': lambda client: client.chat("same question", model='sonar'),
+    'stream': lambda client: list(client.stream_chat("same question", model='sonar')),
+}
+
+
+@pytest.mark.parametrize('kind', CALLS)
+def test_identical_calls_share_one_upstream_request(upstream, kind):
+    requests.delete(upstream + '/stats')
+    client = SonarClient(api_key='test', api_url=upstream + '/chat/completions')
+    results = concurrently(lambda: CALLS[kind](client))
+    assert not [r for r in results if isinstance(r, Exception)]
+    assert all(r == results[0] for r in results)
+    assert upstream_requests(upstream) == 1
+    assert client.flights.stats()['shared'] == CALLERS - 1
+
+
+@pytest.mark.parametrize('kind', CALLS)
+def test_followers_get_the_leaders_exception(upstream, kind):
+    requests.delete(upstream + '/stats')
+    # the upstream answers after 0.5s, so the shared request times out
+    client = SonarClient(api_key='test', api_url=upstream + '/chat/completions',
+                         read_timeout=0.2, connect_retries=0)
+    results = concurrently(lambda: CALLS[kind](client))
+    assert all(isinstance(r, requests.exceptions.ReadTimeout) for r in results)
+    assert upstream_requests(upstream) == 1
@@ -0,0 +1,14 @@
+import pytest
+
+from vitals_ingest import IngestTooLarge, InvalidBody, ingest
+
+
+def test_batch_over_the_limit_is_too_large():
+    with pytest.raises(IngestTooLarge):
+        ingest(b'{"username": "a"}\n{"username": "b"}', 'application/x-ndjson', max_records=1)
+
+
+def test_body_that_is_not_utf8_is_invalid_not_too_large():
+    with pytest.raises(InvalidBody) as caught:
+        ingest(b'\xff\xfe{"username": "a"}', 'application/x-ndjson')
+    assert not isinstance(caught.value, IngestTooLarge)
@@ -0,0 +1,250 @@
+"""
+Single-pass, chunk-safe replacement for the regex chain in `clean_response`.
+
+`ResponseSanitizer` runs the same five rewrites as a pipeline of small
+streaming stages, each advancing with `str.find` rather than regex
+backtracking, so a response can be cleaned whole or chunk by chunk and
+produce byte-for-byte the same text as:
+
+    re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL)
+    re.sub(r"```json|```", "", ...)
+    re.sub(r"\*\*(.*?)\*\*", r"\1", ...)
+    re.sub(r"\*(.*?)\*", r"\1", ...)
+    re.sub(r"\n{2,}", "\n", ...).strip()
+"""
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+def _partial_suffix(text, token):
+    """Length of the longest suffix of `text` that is a proper prefix of `token`."""
+    for n in range(min(len(token) - 1, len(text)), 0, -1):
+        if text.endswith(token[:n]):
+            return n
+    return 0
+
+
+class ThinkFilter:
+    """
+    Incrementally removes `<think>…</think>` blocks from streamed text.
+
+    `feed()` returns whatever is safe to show so far; text that might still
+    turn out to be part of a think block (an open block, or a trailing
+    "<thi") is held back. As with `re.sub(r"<think>.*?</think>", "", ...)`,
+    a block that is never closed is kept verbatim, so `finish()` flushes it.
+    """
+
+    def __init__(self):
+        self._held = ""    # possible start of "<think>" at the end of visible text
+        self._block = []   # chunks of the currently open block, "<think>" first
+        self._tail = ""    # end of the open block, in case "</think>" is split
+
+    def feed(self, chunk):
+        out = []
+        data = chunk
+        while data:
+            if self._block:
+                probe = self._tail + data
+                end = probe.find(THINK_CLOSE)
+                if end < 0:
+                    self._block.append(data)
+                    self._tail = probe[-(len(THINK_CLOSE) - 1):]
+                    break
+                self._block, self._tail = [], ""
+                data = probe[end + len(THINK_CLOSE):]
+                continue
+
+            data, self._held = self._held + data, ""
+            i = data.find(THINK_OPEN)
+            if i < 0:
+                hold = _partial_suffix(data, THINK_OPEN)
+                out.append(data[:len(data) - hold])
+                self._held = data[len(data) - hold:]
+                break
+            out.append(data[:i])
+            self._block = [THINK_OPEN]
+            data = data[i + len(THINK_OPEN):]
+        return "".join(out)
+
+    def finish(self):
+        rest = "".join(self._block) if self._block else self._held
+        self._held, self._block, self._tail = "", [], ""
+        return rest
+
+
+class FenceFilter:
+    """Drops "```json" and "```" markers, preferring the longer one."""
+
+    FENCE = "```"
+    FENCE_JSON = "```json"
+
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, chunk, final=False):
+        data = self._pending + chunk
+        self._pending = ""
+        out = []
+        pos = 0
+        while True:
+            i = data.find(self.FENCE, pos)
+            if i < 0:
+                hold = 0 if final else _partial_suffix(data[pos:], self.FENCE)
+                out.append(data[pos:len(data) - hold])
+                self._pending = data[len(data) - hold:]
+                return "".join(out)
+            out.append(data[pos:i])
+            rest = data[i:i + len(self.FENCE_JSON)]
+            if not final and len(rest) < len(self.FENCE_JSON) and self.FENCE_JSON.startswith(rest):
+                # could still become "```json" once more text arrives
+                self._pending = data[i:]
+                return "".join(out)
+            pos = i + (len(self.FENCE_JSON) if rest == self.FENCE_JSON else len(self.FENCE))
+
+    def finish(self):
+        return self.feed("", final=True)
+
+
+def _unwrap(line, marker):
+    """Apply re.sub(rf"{marker}(.*?){marker}", r"\1", line) to a newline-free line."""
+    if marker not in line:
+        return line
+    out = []
+    pos = 0
+    width = len(marker)
+    while True:
+        i = line.find(marker, pos)
+        if i < 0:
+            break
+        j = line.find(marker, i + width)
+        if j < 0:
+            break
+        out.append(line[pos:i])
+        out.append(line[i + width:j])
+        pos = j + width
+    out.append(line[pos:])
+    return "".join(out)
+
+
+def unwrap_emphasis(line):
+    return _unwrap(_unwrap(line, "**"), "*")
+
+
+class EmphasisFilter:
+    """
+    Strips **bold** then *italic* markers. Neither pattern can cross a
+    newline, so text is released line by line; within the current line
+    everything before the first "*" is released immediately.
+    """
+
+    def __init__(self):
+        self._line = ""
+
+    def feed(self, chunk):
+        out = []
+        pos = 0
+        while True:
+            nl = chunk.find("\n", pos)
+            if nl < 0:
+                break
+            out.append(unwrap_emphasis(self._line + chunk[pos:nl]))
+            out.append("\n")
+            self._line = ""
+            pos = nl + 1
+        self._line += chunk[pos:]
+        star = self._line.find("*")
+        if star < 0:
+            out.append(self._line)
+            self._line = ""
+        elif star > 0:
+            out.append(self._line[:star])
+            self._line = self._line[star:]
+        return "".join(out)
+
+    def finish(self):
+        rest, self._line = self._line, ""
+        return unwrap_emphasis(rest)
+
+
+class WhitespaceFilter:
+    """Collapses newline runs to one newline and strips both ends."""
+
+    def __init__(self):
+        self._started = False
+        self._last_newline = False
+        self._trailing = ""
+
+    def _collapse(self, chunk):
+        if "\n\n" not in chunk and not (self._last_newline and chunk.startswith("\n")):
+            if chunk:
+                self._last_newline = chunk.endswith("\n")
+            return chunk
+        out = []
+        pos = 0
+        while True:
+            nl = chunk.find("\n", pos)
+            if nl < 0:
+                break
+            if nl > pos:
+                out.append(chunk[pos:nl])
+                self._last_newline = False
+            if not self._last_newline:
+                out.append("\n")
+                self._last_newline = True
+            pos = nl + 1
+        if pos < len(chunk):
+            out.append(chunk[pos:])
+            self._last_newline = False
+        return "".join(out)
+
+    def feed(self, chunk):
+        text = self._collapse(chunk)
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._started = True
+        # trailing whitespace is only released once more content follows
+        text = self._trailing + text
+        body = text.rstrip()
+        self._trailing = text[len(body):]
+        return body
+
+    def finish(self):
+        self._trailing = ""
+        return ""
+
+
+class ResponseSanitizer:
+    """
+    Streaming equivalent of `clean_response`. Call `feed()` with each chunk
+    and `finish()` once at the end; the concatenation of everything
+    returned equals `clean_response` of the concatenated input.
+    """
+
+    def __init__(self):
+        self._think = ThinkFilter()
+        self._fence = FenceFilter()
+        self._emphasis = EmphasisFilter()
+        self._whitespace = WhitespaceFilter()
+
+    def feed(self, chunk):
+        text = self._fence.feed(self._think.feed(chunk))
+        return self._whitespace.feed(self._emphasis.feed(text))
+
+    def finish(self):
+        text = self._fence.feed(self._think.finish()) + self._fence.finish()
+        text = self._emphasis.feed(text) + self._emphasis.finish()
+        return self._whitespace.feed(text) + self._whitespace.finish()
+
+
+def sanitize_response(raw_text):
+    sanitizer = ResponseSanitizer()
+    return sanitizer.feed(raw_text) + sanitizer.finish()
+
+
+def strip_think(raw_text):
+    """Remove `<think>…</think>` blocks from a complete response."""
+    think = ThinkFilter()
+    return think.feed(raw_text) + think.finish()
@@ -0,0 +1,65 @@
+from collections import namedtuple
+
+from models import db, User, PatientProfile
+
+# Plain, session-independent copies of the columns read-heavy routes need,
+# so cached entries never touch a closed session.
+UserRef = namedtuple('UserRef', 'id name username role')
+ProfileRef = namedtuple('ProfileRef',
+                        'id data missing_fields_snapshot alerts_snapshot updated_at original_input')
+
+
+class UserResolver:
+    """
+    Resolves a username to its user and saved profile with a single joined
+    query, caching the result in a bounded TTL cache. Routes that change a
+    user or profile must call `invalidate()`; the TTL bounds staleness
+    across worker processes, which each keep their own cache.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, username):
+        """Return `(UserRef, ProfileRef)`; either may be None."""
+        if not username:
+            return None, None
+        entry = self.cache.get(username)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        self.misses += 1
+
+        row = (db.session.query(User, PatientProfile)
+               .outerjoin(PatientProfile, PatientProfile.user_id == User.id)
+               .filter(User.username == username)
+               .first())
+        if row is None:
+            return None, None  # unknown users are not cached
+
+        user, profile = row
+        entry = (
+            UserRef(user.id, user.name, user.username, user.role),
+            ProfileRef(profile.id, profile.data, profile.missing_fields_snapshot,
+                       profile.alerts_snapshot, profile.updated_at, profile.original_input)
+            if profile else None,
+        )
+        self.cache.set(username, entry)
+        return entry
+
+    def user(self, username):
+        return self.resolve(username)[0]
+
+    def invalidate(self, username):
+        self.cache.delete(username)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self.cache),
+        }
@@ -0,0 +1,194 @@
+"""
+Batched device ingest for `VitalsReading`.
+
+A batch is NDJSON (one reading per line) or a JSON array of readings,
+for any number of patients:
+
+    {"username": "p1", "recorded_at": "2025-06-01T10:00:00", "spo2": 93, "hr": 88}
+
+Every record is validated on its own; valid ones are written to the
+session's transaction (COPY on Postgres, one executemany elsewhere) and
+invalid ones come back as per-record errors. The caller commits, so other
+writes that depend on the readings (patient summaries) land with them.
+"""
+import csv
+import io
+import json
+import math
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from models import db, User, Vitals, VitalsReading, NUMERIC_VITALS, VITAL_FIELDS
+
+INTEGER_FIELDS = {'hr', 'step_count'}
+
+# physiologically plausible bounds; values outside are rejected as sensor noise
+RANGES = {
+    'hr': (0, 300),
+    'spo2': (0, 100),
+    'temp': (25, 115),          # °C or °F
+    'skin_temp': (0, 115),
+    'weight': (0, 700),
+    'glucose': (0, 2000),
+    'rr': (0, 100),
+    'bmi': (0, 150),
+    'fetal_hr': (0, 300),
+    'transdermal_alcohol': (0, 1),
+    'med_adherence': (0, 100),
+}
+
+COLUMNS = ('user_id', 'recorded_at') + VITAL_FIELDS
+
+
+class IngestTooLarge(Exception):
+    """The batch has more records than `max_records`."""
+
+
+class InvalidBody(ValueError):
+    """The request body cannot be read as a batch at all."""
+
+
+def parse_batch(body, content_type=''):
+    """
+    Yield `(record_number, record_or_None, error_or_None)` from a request
+    body. Raises InvalidBody if the body is not UTF-8.
+    """
+    try:
+        text = body.decode('utf-8') if isinstance(body, bytes) else body
+    except UnicodeDecodeError as e:
+        raise InvalidBody(f"Body is not valid UTF-8: {e}")
+    if 'ndjson' not in content_type and text.lstrip().startswith('['):
+        try:
+            records = json.loads(text)
+        except ValueError as e:
+            yield 0, None, f"Invalid JSON: {e}"
+            return
+        for n, record in enumerate(records, start=1):
+            yield n, record, None
+        return
+
+    for n, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield n, json.loads(line), None
+        except ValueError as e:
+            yield n, None, f"Invalid JSON: {e}"
+
+
+def validate(record, user_ids, now):
+    """Return a row dict for `VitalsReading`, or raise ValueError."""
+    if not isinstance(record, dict):
+        raise ValueError("Record must be a JSON object")
+    unknown = set(record) - set(VITAL_FIELDS) - {'username', 'recorded_at'}
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    user_id = user_ids.get(record.get('username'))
+    if user_id is None:
+        raise ValueError(f"Unknown patient: {record.get('username')!r}")
+
+    recorded_at = now
+    if record.get('recorded_at'):
+        try:
+            recorded_at = datetime.fromisoformat(str(record['recorded_at']).replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError(f"Invalid recorded_at: {record['recorded_at']!r}")
+        if recorded_at.tzinfo is not None:
+            # stored naive, in UTC, like the rest of the schema
+            recorded_at = (recorded_at - recorded_at.utcoffset()).replace(tzinfo=None)
+
+    row = {'user_id': user_id, 'recorded_at': recorded_at}
+    has_value = False
+    bp = record.get('bp')
+    if bp is not None:
+        if not isinstance(bp, str) or '/' not in bp or len(bp) > 20:
+            raise ValueError("bp must look like '120/80'")
+        row['bp'] = bp
+        has_value = True
+    for name in NUMERIC_VITALS:
+        value = record.get(name)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(f"{name} must be a number")
+        low, high = RANGES.get(name, (0, math.inf))
+        if not low <= value <= high:
+            raise ValueError(f"{name}={value} outside {low}–{high}")
+        row[name] = int(round(value)) if name in INTEGER_FIELDS else float(value)
+        has_value = True
+    if not has_value:
+        raise ValueError("Record has no measurements")
+    return row
+
+
+def _copy_rows(rows):
+    """Postgres fast path: stream the batch through COPY ... FROM STDIN."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow(['' if row.get(c) is None else row[c] for c in COLUMNS])
+    buf.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(
+        f"COPY vitals_reading ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '')", buf)
+
+
+def _update_latest(rows):
+    """Move each patient's latest-values Vitals row forward to its newest reading."""
+    newest = {}
+    for row in rows:
+        current = newest.get(row['user_id'])
+        if current is None or row['recorded_at'] >= current['recorded_at']:
+            newest[row['user_id']] = row
+    existing = {v.user_id: v for v in Vitals.query.filter(Vitals.user_id.in_(newest)).all()}
+    for user_id, row in newest.items():
+        vitals = existing.get(user_id)
+        if vitals is None:
+            vitals = Vitals(user_id=user_id)
+            db.session.add(vitals)
+        elif vitals.recorded_at and vitals.recorded_at > row['recorded_at']:
+            continue
+        vitals.recorded_at = row['recorded_at']
+        for name in VITAL_FIELDS:
+            if row.get(name) is not None:
+                setattr(vitals, name, row[name])
+
+
+def ingest(body, content_type='', max_records=50000):
+    """
+    Validate and stage a batch in the current transaction; the caller
+    commits. Returns `(accepted_rows, errors)` where errors are
+    `{'record': n, 'error': msg}`. Raises IngestTooLarge past `max_records`
+    and InvalidBody for a body that is not UTF-8.
+    """
+    parsed = list(parse_batch(body, content_type))
+    if len(parsed) > max_records:
+        raise IngestTooLarge(f"Batch too large: {len(parsed)} records (max {max_records})")
+
+    usernames = {r.get('username') for _, r, _ in parsed if isinstance(r, dict)}
+    user_ids = dict(db.session.query(User.username, User.id)
+                    .filter(User.username.in_(usernames), User.role == 'patient')
+                    .all()) if usernames else {}
+
+    now = datetime.utcnow()
+    rows, errors = [], []
+    for n, record, error in parsed:
+        if error is None:
+            try:
+                rows.append(validate(record, user_ids, now))
+                continue
+            except ValueError as e:
+                error = str(e)
+        errors.append({'record': n, 'error': error})
+
+    if rows:
+        if db.session.get_bind().dialect.name == 'postgresql':
+            _copy_rows(rows)
+        else:
+            # one executemany; every row carries the same keys
+            db.session.execute(insert(VitalsReading),
+                               [{c: row.get(c) for c in COLUMNS} for row in rows])
+        _update_latest(rows)
+    return rows, errors
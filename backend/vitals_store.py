@@ -0,0 +1,219 @@
+"""
+Per-patient vitals time series.
+
+History lives in the append-only `VitalsReading` table, indexed by
+(user_id, recorded_at). Reads go through compact in-memory buffers: one
+`array('d')` of timestamps plus one per metric (NaN where a reading did
+not include that metric), loaded on first use and topped up with a delta
+query (`id > last seen`) once they are stale, so writes from other worker
+processes show up too.
+"""
+import math
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from models import db, VitalsReading, NUMERIC_VITALS
+from alert_rules import parse_bp
+
+# blood pressure is stored as text ("120/80") and split into two series
+METRICS = ('sbp', 'dbp') + NUMERIC_VITALS
+
+_DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*$")
+_UNIT_SECONDS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_duration(text):
+    """'90' / '15m' / '6h' / '3d' / '1w' -> seconds. Raises ValueError."""
+    match = _DURATION.match(str(text))
+    if not match:
+        raise ValueError(f"Invalid duration: {text!r}")
+    seconds = float(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+    if seconds <= 0:
+        raise ValueError(f"Duration must be positive: {text!r}")
+    return seconds
+
+
+def to_epoch(dt):
+    return dt.replace(tzinfo=timezone.utc).timestamp()
+
+
+def from_epoch(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).replace(tzinfo=None)
+
+
+def reading_values(reading):
+    """Metric -> float (NaN if absent) for one VitalsReading-like object."""
+    sbp, dbp = parse_bp(reading.bp)
+    values = {'sbp': sbp, 'dbp': dbp}
+    for name in NUMERIC_VITALS:
+        values[name] = getattr(reading, name)
+    return {k: float(v) if v is not None else math.nan for k, v in values.items()}
+
+
+class SeriesBuffer:
+    """Time-ordered columns for one patient, trimmed to `capacity` readings."""
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.ts = array('d')
+        self.cols = {m: array('d') for m in METRICS}
+
+    def __len__(self):
+        return len(self.ts)
+
+    def append(self, ts, values):
+        # devices may deliver late; keep timestamps sorted
+        i = len(self.ts) if not self.ts or ts >= self.ts[-1] else bisect_right(self.ts, ts)
+        self.ts.insert(i, ts)
+        for m, col in self.cols.items():
+            col.insert(i, values.get(m, math.nan))
+        if len(self.ts) > self.capacity * 1.25:
+            drop = len(self.ts) - self.capacity
+            del self.ts[:drop]
+            for col in self.cols.values():
+                del col[:drop]
+
+    def _span(self, start, end):
+        lo = 0 if start is None else bisect_left(self.ts, start)
+        hi = len(self.ts) if end is None else bisect_right(self.ts, end)
+        return lo, hi
+
+    def points(self, metric, start=None, end=None):
+        lo, hi = self._span(start, end)
+        col = self.cols[metric]
+        return [(self.ts[i], col[i]) for i in range(lo, hi) if not math.isnan(col[i])]
+
+    def downsample(self, metric, bucket, start=None, end=None):
+        """Mean/min/max/count per `bucket`-second interval, empty buckets omitted."""
+        out = []
+        current = None
+        for ts, value in self.points(metric, start, end):
+            key = ts - ts % bucket
+            if current is None or current[0] != key:
+                current = [key, 0.0, value, value, 0]
+                out.append(current)
+            current[1] += value
+            current[2] = min(current[2], value)
+            current[3] = max(current[3], value)
+            current[4] += 1
+        return [{'t': key, 'mean': total / n, 'min': lo, 'max': hi, 'count': n}
+                for key, total, lo, hi, n in out]
+
+    def window(self, metric, seconds, end=None):
+        """Aggregates over the trailing `seconds` ending at `end` (default: now)."""
+        end = time.time() if end is None else end
+        values = [v for _, v in self.points(metric, end - seconds, end)]
+        if not values:
+            return {'count': 0}
+        return {
+            'count': len(values),
+            'min': min(values),
+            'max': max(values),
+            'mean': sum(values) / len(values),
+            'first': values[0],
+            'last': values[-1],
+            'delta': values[-1] - values[0],
+            # rise of the latest reading over the lowest one before it
+            'rise': values[-1] - min(values[:-1]) if len(values) > 1 else 0.0,
+        }
+
+
+class VitalsStore:
+    def __init__(self, capacity=4096, preload_days=30, refresh_after=30.0, max_patients=2048):
+        self.capacity = capacity
+        self.preload = timedelta(days=preload_days)
+        self.refresh_after = refresh_after
+        self.max_patients = max_patients
+        self._entries = OrderedDict()  # user_id -> [buffer, last_id, checked_at]
+        self._lock = threading.Lock()
+        # user_id -> [lock, holders + waiters]: one loader per patient, no double
+        # appends, while other patients load in parallel
+        self._loaders = {}
+
+    @contextmanager
+    def _loading(self, user_id):
+        with self._lock:
+            slot = self._loaders.setdefault(user_id, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if not slot[1]:
+                    del self._loaders[user_id]
+
+    def _load(self, user_id, after_id=None):
+        query = VitalsReading.query.filter(VitalsReading.user_id == user_id)
+        if after_id is None:
+            query = query.filter(VitalsReading.recorded_at >= datetime.utcnow() - self.preload)
+        else:
+            query = query.filter(VitalsReading.id > after_id)
+        return query.order_by(VitalsReading.recorded_at, VitalsReading.id).all()
+
+    def buffer(self, user_id):
+        """The patient's buffer, loaded or topped up from the DB if stale."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+        if entry is not None and time.monotonic() - entry[2] < self.refresh_after:
+            return entry[0]
+
+        with self._loading(user_id):
+            with self._lock:
+                entry = self._entries.get(user_id, entry)
+            now = time.monotonic()
+            if entry is not None and now - entry[2] < self.refresh_after:
+                return entry[0]  # another caller refreshed it meanwhile
+
+            rows = self._load(user_id, entry[1] if entry and entry[1] else None)
+            if entry is None:
+                entry = [SeriesBuffer(self.capacity), 0, now]
+            for row in rows:
+                entry[0].append(to_epoch(row.recorded_at), reading_values(row))
+                entry[1] = max(entry[1], row.id)
+            entry[2] = now
+
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_patients:
+                self._entries.popitem(last=False)
+        return entry[0]
+
+    def mark_stale(self, user_id):
+        """Call after writing readings so the next read picks them up."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry[2] = float('-inf')
+
+    def weight_rises(self, days=3, user_ids=None):
+        """
+        {user_id: kg gained by the latest reading over the lowest earlier one}
+        for the trailing window, for every patient (or just `user_ids`),
+        from a single query.
+        """
+        query = (db.session.query(VitalsReading.user_id, VitalsReading.weight)
+                 .filter(VitalsReading.recorded_at >= datetime.utcnow() - timedelta(days=days),
+                         VitalsReading.weight.isnot(None)))
+        if user_ids is not None:
+            query = query.filter(VitalsReading.user_id.in_(list(user_ids)))
+        rows = query.order_by(VitalsReading.user_id, VitalsReading.recorded_at).all()
+        rises = {}
+        lowest = {}
+        for user_id, weight in rows:
+            if user_id in lowest:
+                rises[user_id] = weight - lowest[user_id]
+                lowest[user_id] = min(lowest[user_id], weight)
+            else:
+                lowest[user_id] = weight
+        return rises
@@ -0,0 +1,84 @@
+"""
+Care-team worklist: every patient's triage state in one query.
+
+Reads the denormalized `PatientSummary` row of each patient (alert count
+and severity, missing fields, last chat message), never the full profile
+document. Sorting, paging and the total count all happen in that one SQL
+statement, so a page costs the same however many patients there are.
+"""
+from sqlalchemy import func
+
+from models import db, User, PatientSummary
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+_name = func.lower(User.name)
+
+# sort name -> columns; patients without a summary row count as zero
+SORT_COLUMNS = {
+    'severity': (func.coalesce(PatientSummary.severity_rank, 0),
+                 func.coalesce(PatientSummary.alert_count, 0)),
+    'alerts': (func.coalesce(PatientSummary.alert_count, 0),),
+    'missing': (func.coalesce(PatientSummary.missing_count, 0),),
+    'last_message': (PatientSummary.last_message_at,),
+    'name': (_name,),
+}
+
+
+def page_args(args):
+    """`(sort, order, offset, limit)` from query args. Raises ValueError."""
+    sort = args.get('sort', 'severity')
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_COLUMNS)}")
+    order = args.get('order', 'asc' if sort == 'name' else 'desc')
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be asc or desc")
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+        offset = int(args.get('offset', 0))
+    except ValueError:
+        raise ValueError("limit and offset must be integers")
+    return sort, order, max(0, offset), max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def worklist_page(args):
+    """`(entries, total)` for one page of the worklist. Raises ValueError for bad args."""
+    sort, order, offset, limit = page_args(args)
+    columns = [(c.desc() if order == 'desc' else c.asc()).nulls_last() for c in SORT_COLUMNS[sort]]
+    rows = (db.session.query(User.id, User.username, User.name, PatientSummary,
+                             func.count().over().label('total'))
+            .outerjoin(PatientSummary, PatientSummary.user_id == User.id)
+            .filter(User.role == 'patient')
+            .order_by(*columns, _name, User.id)
+            .offset(offset)
+            .limit(limit)
+            .all())
+    total = rows[0].total if rows else _count()
+    return [worklist_entry(row) for row in rows], total
+
+
+def _count():
+    # only reached for a page past the end
+    return db.session.query(func.count(User.id)).filter(User.role == 'patient').scalar()
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def worklist_entry(row):
+    user_id, username, name, summary, _ = row
+    return {
+        'id': user_id,
+        'username': username,
+        'name': name,
+        'alert_count': summary.alert_count if summary else 0,
+        'highest_severity': summary.highest_severity if summary else None,
+        'severity_rank': summary.severity_rank if summary else 0,
+        'missing_count': summary.missing_count if summary else 0,
+        'has_profile': bool(summary and summary.has_profile),
+        'profile_updated_at': _iso(summary and summary.profile_updated_at),
+        'last_message_at': _iso(summary and summary.last_message_at),
+        'vitals_at': _iso(summary and summary.vitals_at),
+    }
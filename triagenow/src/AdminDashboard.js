@@ -1,25 +1,47 @@
 import React, { useEffect, useState } from 'react';
+import { useNavigate } from 'react-router-dom';
+import { useAuth } from './AuthContext';
 import { BACKEND_URL } from './config';
 
 function AdminDashboard() {
   const [users, setUsers] = useState([]);
   const [message, setMessage] = useState('');
 
-  const currentUser = JSON.parse(localStorage.getItem('user'));
+  const { user: currentUser, logout } = useAuth();
+  const navigate = useNavigate();
+
+  // no token (a session stored before tokens existed) or an expired one: log in again
+  const loginAgain = () => {
+    logout();
+    navigate('/login');
+  };
 
   useEffect(() => {
-    fetch(`${BACKEND_URL}/users?admin=${currentUser.username}`)
-      .then(res => res.json())
-      .then(data => setUsers(data.users))
+    if (!currentUser?.token) return loginAgain();
+    fetch(`${BACKEND_URL}/users`, {
+      headers: { Authorization: `Bearer ${currentUser.token}` }
+    })
+      .then(res => {
+        if (res.status === 401) {
+          loginAgain();
+          return null;
+        }
+        return res.json();
+      })
+      .then(data => data && setUsers(data.users))
       .catch(() => setMessage('❌ Failed to fetch users.'));
-  }, [currentUser.username]);
+  }, [currentUser?.token]);
 
   const handleRoleChange = async (username, role) => {
     const res = await fetch(`${BACKEND_URL}/update-role`, {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ admin: currentUser.username, username, role })
+      headers: {
+        'Content-Type': 'application/json',
+        Authorization: `Bearer ${currentUser.token}`
+      },
+      body: JSON.stringify({ username, role })
     });
+    if (res.status === 401) return loginAgain();
 
     const data = await res.json();
     if (res.ok) {
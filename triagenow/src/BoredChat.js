@@ -1,6 +1,6 @@
 import React, { useState } from 'react';
 import { useAuth } from './AuthContext';  // 👈 Make sure this exists
-import { BACKEND_URL } from './config';
+import { streamChat } from './streamChat';
 
 function BoredChat() {
   const { user } = useAuth();  // 👈 Pull logged-in user info
@@ -17,16 +17,16 @@ function BoredChat() {
     setLoading(true);
 
     try {
-      const res = await fetch(`${BACKEND_URL}/bored-chat`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          username: user?.username,   // 👈 Add this line
-          messages: newMessages
-        })
+      let partial = '';
+      const data = await streamChat('/bored-chat', {
+        username: user?.username,   // 👈 Add this line
+        messages: newMessages
+      }, delta => {
+        partial += delta;
+        setLoading(false);
+        setMessages([...newMessages, { role: 'assistant', content: partial }]);
       });
 
-      const data = await res.json();
       const reply = data.answer || '❌ No response.';
       setMessages([...newMessages, { role: 'assistant', content: reply }]);
     } catch (err) {
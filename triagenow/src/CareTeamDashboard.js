@@ -5,21 +5,43 @@ import NurseAssistantChat from './NurseAssistantChat'
 import { BACKEND_URL } from './config';
 
 export default function CareTeamDashboard() {
-  const { user } = useAuth()
+  const { user, logout } = useAuth()
   const [patients, setPatients]         = useState([])
   const [usernameInput, setUsernameInput] = useState('')
   const [triageUsername, setTriageUsername] = useState('')
   const [profile, setProfile]           = useState(null)
+  const [total, setTotal]               = useState(0)
 
   const navigate = useNavigate()
 
-  // load your patient list
-  useEffect(() => {
-    fetch(`${BACKEND_URL}/patients`)
-      .then(r => r.json())
-      .then(setPatients)
+  // load your worklist: every patient's alert / missing-field / chat state in one call
+  // a missing or expired session token (e.g. stored before tokens existed) means logging in again
+  const loginAgain = () => {
+    logout()
+    navigate('/login')
+  }
+
+  const loadWorklist = (offset = 0) => {
+    if (!user?.token) return loginAgain()
+    fetch(`${BACKEND_URL}/worklist?offset=${offset}&limit=50`, {
+      headers: { Authorization: `Bearer ${user.token}` }
+    })
+      .then(r => {
+        if (r.status === 401) {
+          loginAgain()
+          return null
+        }
+        return r.json()
+      })
+      .then(d => {
+        if (!d) return
+        setPatients(prev => offset ? [...prev, ...(d.patients || [])] : (d.patients || []))
+        setTotal(d.total || 0)
+      })
       .catch(console.error)
-  }, [])
+  }
+
+  useEffect(() => { loadWorklist(0) }, [])
 
   // when nurse enters a username, fetch that patient’s saved profile
   useEffect(() => {
@@ -72,10 +94,32 @@ export default function CareTeamDashboard() {
               onClick={() => navigate(`/care-team/patient/${p.username}`)}
               className="py-2 px-3 cursor-pointer hover:bg-gray-100"
             >
-              {p.name} ({p.username})
+              <span>{p.name} ({p.username})</span>
+              {p.alert_count > 0 && (
+                <span className="ml-2 text-xs text-red-700">
+                  ⚠️ {p.alert_count} alert{p.alert_count > 1 ? 's' : ''}
+                  {p.highest_severity ? ` (${p.highest_severity})` : ''}
+                </span>
+              )}
+              {p.missing_count > 0 && (
+                <span className="ml-2 text-xs text-gray-600">❓ {p.missing_count} missing</span>
+              )}
+              {p.last_message_at && (
+                <span className="ml-2 text-xs text-gray-500">
+                  💬 {new Date(p.last_message_at).toLocaleString()}
+                </span>
+              )}
             </li>
           ))}
         </ul>
+        {patients.length < total && (
+          <button
+            onClick={() => loadWorklist(patients.length)}
+            className="mt-3 text-sm text-blue-600"
+          >
+            Load more ({total - patients.length} remaining)
+          </button>
+        )}
       </div>
     </div>
   )
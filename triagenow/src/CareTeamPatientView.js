@@ -3,6 +3,8 @@ import ChatWithCareTeam from './ChatWithCareTeam';
 import NurseAIChat      from './NurseAIChat';
 import ProfileTable     from './ProfileTable';
 import { BACKEND_URL } from './config';
+import { runJob } from './runJob';
+import { subscribeToPatient, appendMessages } from './patientEvents';
 
 export default function CareTeamPatientView({ patient }) {
   const [vitals, setVitals]               = useState(null);
@@ -66,7 +68,8 @@ export default function CareTeamPatientView({ patient }) {
           (json.messages || []).map(m => ({
             role:      m.sender,
             content:   m.content,
-            timestamp: m.timestamp
+            timestamp: m.timestamp,
+            cursor:    m.cursor
           }))
         );
       } catch (err) {
@@ -76,17 +79,34 @@ export default function CareTeamPatientView({ patient }) {
     loadChat();
   }, [patient.username]);
 
+  /** 3️⃣b Live updates: new patient messages and alert changes **/
+  useEffect(() => {
+    if (!patient) return;
+    return subscribeToPatient(patient.username, {
+      onMessage: m => setMessages(prev => appendMessages(prev, [{
+        role:      m.sender,
+        content:   m.content,
+        timestamp: m.timestamp,
+        cursor:    m.cursor
+      }])),
+      onAlerts: list => setAlerts(
+        list.map(a => {
+          const refs = Array.isArray(a.guideline_ref)
+            ? a.guideline_ref.join(', ')
+            : a.guideline_ref || '';
+          return `${a.parameter}: ${a.value}` + (refs ? ` (Refs: ${refs})` : '');
+        })
+      ),
+      onCleared: () => setMessages([])
+    });
+  }, [patient.username]);
+
   /** 4️⃣ Parse & save + auto‐follow-up questions **/
   const handleParseAndSave = async () => {
     setLoading(true);
     try {
-      // parse
-      const res1 = await fetch(`${BACKEND_URL}/parse-profile`, {
-        method:  'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body:    JSON.stringify({ input: summary, username: patient.username })
-      });
-      const data = await res1.json();
+      // parse (runs as a background job on the server)
+      const data = await runJob('/parse-profile', { input: summary, username: patient.username });
       if (!data.parsed) {
         alert('⚠️ AI returned no structured data.');
         setLoading(false);
@@ -130,6 +150,8 @@ export default function CareTeamPatientView({ patient }) {
         })
       });
       if (res2.ok) {
+        const saved = await res2.json();
+        setMissingFields(saved.missing_fields || []);
         alert('✅ Patient profile updated successfully!');
       } else {
         alert('❌ Failed to save profile.');
@@ -154,16 +176,18 @@ export default function CareTeamPatientView({ patient }) {
           content
         })
       });
-      // reload chat
-      const res  = await fetch(`${BACKEND_URL}/patient-chat/${patient.username}`);
+      // fetch only what is newer than the last message we have
+      const last = messages[messages.length - 1];
+      const since = last?.cursor ? `?since=${encodeURIComponent(last.cursor)}` : '';
+      const res  = await fetch(`${BACKEND_URL}/patient-chat/${patient.username}${since}`);
       const json = await res.json();
-      setMessages(
-        (json.messages || []).map(m => ({
-          role:      m.sender,
-          content:   m.content,
-          timestamp: m.timestamp
-        }))
-      );
+      const fresh = (json.messages || []).map(m => ({
+        role:      m.sender,
+        content:   m.content,
+        timestamp: m.timestamp,
+        cursor:    m.cursor
+      }));
+      setMessages(prev => (since ? appendMessages(prev, fresh) : fresh));
     } catch (err) {
       console.error('Error sending message:', err);
     }
@@ -1,6 +1,6 @@
 // src/components/ChatWithSonar.js
 import React, { useState } from 'react';
-import {BACKEND_URL} from "./config";
+import { streamChat } from './streamChat';
 
 export default function ChatWithSonar({ username, profile }) {
   const [messages, setMessages] = useState([]);
@@ -24,13 +24,17 @@ export default function ChatWithSonar({ username, profile }) {
 
     console.log('📤 Sending to /sonar-chat:', payload);
 
+    // replace the (streaming) assistant bubble at the end of the chat
+    const showReply = content =>
+      setMessages([...convo, { role: 'assistant', content }]);
+
     try {
-      const res  = await fetch(`${BACKEND_URL}/sonar-chat`, {
-        method:  'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body:    JSON.stringify(payload)
+      let partial = '';
+      const data = await streamChat('/sonar-chat', payload, delta => {
+        partial += delta;
+        setLoading(false);
+        showReply(partial);
       });
-      const data = await res.json();
 
       let assistantText = data.answer;
       if (data.citations && data.citations.length) {
@@ -38,10 +42,10 @@ export default function ChatWithSonar({ username, profile }) {
           data.citations.map((c,i) => `${i+1}. ${c}`).join('\n');
       }
 
-      setMessages(prev => [...prev, { role: 'assistant', content: assistantText }]);
+      showReply(assistantText);
     } catch (err) {
       console.error(err);
-      setMessages(prev => [...prev, { role: 'assistant', content: '❌ Error. Please try again.' }]);
+      showReply('❌ Error. Please try again.');
     } finally {
       setLoading(false);
     }
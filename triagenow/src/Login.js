@@ -31,7 +31,7 @@ function Login() {
 
       const data = await res.json();
       if (res.ok) {
-        login(data.user);
+        login({ ...data.user, token: data.token });
         if (data.user.role === 'care_team') navigate('/care-dashboard');
         else if (data.user.role === 'admin') navigate('/admin-dashboard');
         else navigate('/dashboard');
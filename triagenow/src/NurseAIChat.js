@@ -1,5 +1,5 @@
 import React, { useState } from 'react';
-import {BACKEND_URL} from "./config";
+import { runJob } from './runJob';
 
 function NurseAIChat({ username, questions, onUpdate }) {
   const [responses, setResponses] = useState({});
@@ -13,23 +13,13 @@ function NurseAIChat({ username, questions, onUpdate }) {
     try {
       const payload = { username, updates: responses };
       console.log("🔁 Sending reprocess-profile request:", payload);
-      const res = await fetch(`${BACKEND_URL}/reprocess-profile`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(payload)
-      });
-
-      if (res.ok) {
-        const result = await res.json();
-        alert("✅ Profile updated with your responses.");
-        setSubmitted(true);
-        if (result.remaining?.length > 0) {
-          alert(`🔔 Still missing: ${result.remaining.map(f => f.parameter).join(', ')}`);
-        }
-        if (onUpdate) onUpdate();
-      } else {
-        alert("❌ Failed to update profile.");
+      const result = await runJob('/reprocess-profile', payload);
+      alert("✅ Profile updated with your responses.");
+      setSubmitted(true);
+      if (result.remaining?.length > 0) {
+        alert(`🔔 Still missing: ${result.remaining.map(f => f.parameter).join(', ')}`);
       }
+      if (onUpdate) onUpdate();
     } catch (error) {
       console.error("Update error:", error);
       alert("❌ Error sending responses.");
@@ -1,11 +1,12 @@
 // src/components/NurseAssistantChat.js
 import React, { useState } from 'react';
 import ChatWithCareTeam from './ChatWithCareTeam';
-import {BACKEND_URL} from "./config";
+import { streamChat } from './streamChat';
 
 export default function NurseAssistantChat({ patientUsername, profile }) {
   const [messages, setMessages] = useState([]);
   const [loading,  setLoading]  = useState(false);
+  const [missing,  setMissing]  = useState([]);
 
   const handleSend = async ({ role, content }) => {
     // 1) push the nurse’s question
@@ -18,26 +19,29 @@ export default function NurseAssistantChat({ patientUsername, profile }) {
     setMessages(convo);
     setLoading(true);
 
+    // the AI reply is shown as “assistant” and filled in as it streams
+    const timestamp = new Date().toISOString();
+    const showReply = content =>
+      setMessages([...convo, { role: 'assistant', content, timestamp }]);
+
     try {
       // 2) hit your new nurse-chat endpoint
-      const res = await fetch(`${BACKEND_URL}/nurse-chat`, {
-        method:  'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body:    JSON.stringify({
-          username: patientUsername,
-          messages: convo,
-          profile  // send the full JSON profile package
-        })
+      let partial = '';
+      const data = await streamChat('/nurse-chat', {
+        username: patientUsername,
+        messages: convo,
+        profile  // send the full JSON profile package
+      }, delta => {
+        partial += delta;
+        setLoading(false);
+        showReply(partial);
+      }, (event, payload) => {
+        // schema gaps arrive before the first token
+        if (event === 'context') setMissing(payload.missing_fields || []);
       });
-      const data = await res.json();
-
-      // 3) append the AI reply as “assistant”
-      const botMsg = {
-        role:      'assistant',
-        content:   data.answer,
-        timestamp: new Date().toISOString()
-      };
-      setMessages(prev => [...prev, botMsg]);
+
+      // 3) swap in the final cleaned answer
+      showReply(data.answer);
     } catch (err) {
       console.error("❌ NurseAssistantChat error", err);
     } finally {
@@ -47,6 +51,11 @@ export default function NurseAssistantChat({ patientUsername, profile }) {
 
   return (
     <div className="mt-4 border rounded bg-gray-50 p-4">
+      {missing.length > 0 && (
+        <div className="mb-2 text-sm text-yellow-800">
+          Missing: {missing.map(m => m.parameter).join(', ')}
+        </div>
+      )}
       <ChatWithCareTeam
         messages={messages}
         onSubmit={handleSend}
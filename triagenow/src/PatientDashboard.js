@@ -4,6 +4,7 @@ import { useAuth }            from './AuthContext';
 import ChatWithSonar          from './ChatWithSonar';
 import ChatWithCareTeam       from './ChatWithCareTeam';
 import {BACKEND_URL} from "./config";
+import { subscribeToPatient, appendMessages } from './patientEvents';
 
 export default function PatientDashboard() {
   const { user } = useAuth();
@@ -47,18 +48,20 @@ export default function PatientDashboard() {
   }, [user.username]);
 
   /** 2️⃣ Load persisted patient↔care chat **/
-  async function loadHistory() {
+  //    With a cursor, only messages newer than it are fetched and appended.
+  async function loadHistory(sinceCursor) {
     if (!user) return;
     try {
-      const res  = await fetch(`${BACKEND_URL}/patient-chat/${user.username}`);
+      const since = sinceCursor ? `?since=${encodeURIComponent(sinceCursor)}` : '';
+      const res  = await fetch(`${BACKEND_URL}/patient-chat/${user.username}${since}`);
       const json = await res.json();
-      setCareTeamMessages(
-        (json.messages || []).map(m => ({
-          role:      m.sender,    // 'user' or 'nurse'
-          content:   m.content,
-          timestamp: m.timestamp
-        }))
-      );
+      const fresh = (json.messages || []).map(m => ({
+        role:      m.sender,    // 'user' or 'nurse'
+        content:   m.content,
+        timestamp: m.timestamp,
+        cursor:    m.cursor
+      }));
+      setCareTeamMessages(prev => (sinceCursor ? appendMessages(prev, fresh) : fresh));
     } catch(err) {
       console.error("❌ Failed to load chat:", err);
     }
@@ -67,6 +70,28 @@ export default function PatientDashboard() {
     loadHistory();
   }, [user.username]);
 
+  /** 2️⃣b Live updates pushed by the server **/
+  useEffect(() => {
+    if (!user) return;
+    return subscribeToPatient(user.username, {
+      onMessage: m => setCareTeamMessages(prev => appendMessages(prev, [{
+        role:      m.sender,
+        content:   m.content,
+        timestamp: m.timestamp,
+        cursor:    m.cursor
+      }])),
+      onAlerts: list => setAlerts(
+        list.map(a => {
+          const refs = Array.isArray(a.guideline_ref)
+            ? a.guideline_ref.join(', ')
+            : a.guideline_ref || '';
+          return `${a.parameter}: ${a.value}` + (refs ? ` (Refs: ${refs})` : '');
+        })
+      ),
+      onCleared: () => setCareTeamMessages([])
+    });
+  }, [user.username]);
+
   /** 3️⃣ Send a new patient‐team message **/
   const handleCareTeamSubmit = async ({ role, content }) => {
     try {
@@ -79,7 +104,7 @@ export default function PatientDashboard() {
           content
         })
       });
-      await loadHistory();
+      await loadHistory(careTeamMessages[careTeamMessages.length - 1]?.cursor);
     } catch(err) {
       console.error("❌ Failed to send message:", err);
     }
@@ -0,0 +1,20 @@
+// src/patientEvents.js
+import { BACKEND_URL } from './config';
+
+// Subscribe to live events for one patient. handlers may define
+// onMessage(msg), onAlerts(alerts) and onCleared(). Returns an unsubscribe
+// function. EventSource reconnects on its own if the stream drops.
+export function subscribeToPatient(username, handlers) {
+  const source = new EventSource(`${BACKEND_URL}/events/${username}`);
+  source.addEventListener('patient_message', e => handlers.onMessage?.(JSON.parse(e.data)));
+  source.addEventListener('alerts', e => handlers.onAlerts?.(JSON.parse(e.data).alerts || []));
+  source.addEventListener('chat_cleared', () => handlers.onCleared?.());
+  return () => source.close();
+}
+
+// Append chat messages, skipping any we already have (a message can arrive
+// both from the push channel and from a ?since= fetch).
+export function appendMessages(prev, fresh) {
+  const seen = new Set(prev.map(m => m.cursor).filter(Boolean));
+  return [...prev, ...fresh.filter(m => !m.cursor || !seen.has(m.cursor))];
+}
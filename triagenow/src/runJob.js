@@ -0,0 +1,22 @@
+// src/runJob.js
+import { BACKEND_URL } from './config';
+
+// POST to a job-backed endpoint with async: true, then long-poll the job
+// until it finishes. Resolves with the job result, rejects on failure.
+export async function runJob(path, payload) {
+  const res = await fetch(`${BACKEND_URL}${path}`, {
+    method:  'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body:    JSON.stringify({ ...payload, async: true })
+  });
+  const queued = await res.json();
+  if (!res.ok) throw new Error(queued.error || `Request failed (${res.status})`);
+
+  while (true) {
+    const poll = await fetch(`${BACKEND_URL}${queued.status_url}?wait=25`);
+    const job  = await poll.json();
+    if (!poll.ok) throw new Error(job.error || `Job lookup failed (${poll.status})`);
+    if (job.status === 'succeeded') return job.result;
+    if (job.status === 'failed') throw new Error(job.error || 'Job failed');
+  }
+}
@@ -0,0 +1,49 @@
+// src/streamChat.js
+import { BACKEND_URL } from './config';
+
+// POST to a chat endpoint in streaming mode. onDelta(text) is called as
+// visible tokens arrive and onEvent(event, data) for other events (e.g. the
+// `context` sent before the answer); resolves with the final { answer, citations }.
+export async function streamChat(path, payload, onDelta, onEvent) {
+  const res = await fetch(`${BACKEND_URL}${path}`, {
+    method:  'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body:    JSON.stringify({ ...payload, stream: true })
+  });
+  if (!res.ok || !res.body) throw new Error(`Request failed (${res.status})`);
+
+  const reader  = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let final  = null;
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // SSE events are separated by a blank line
+    let sep;
+    while ((sep = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+
+      let event = 'message';
+      let data  = '';
+      raw.split('\n').forEach(line => {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      });
+      if (!data) continue;
+
+      const parsed = JSON.parse(data);
+      if (event === 'error') throw new Error(parsed.error);
+      if (event === 'done') final = parsed;
+      else if (parsed.delta) onDelta(parsed.delta);
+      else if (onEvent) onEvent(event, parsed);
+    }
+  }
+
+  if (!final) throw new Error('Stream ended before the answer was complete');
+  return final;
+}